@@ -86,7 +86,7 @@ VALUES
 (102, "20", "B0001", 1200, 0.3, "2026-12-15"),
 (106, "20", "B0005", 3000, 0.5, "2026-12-15"),
 (106, "20", "B0006", 750, 0.5, "2026-12-20"),
-(108, "20", "B0001", 1000, 0.25, "2026-9-28"),
+(108, "20", "B0001", 1000, 0.25, "2026-09-28"),
 (108, "20", "B0003", 6300, 0.25, "2026-12-31"),
 (201, "20", "B0001", 100, 2.5, "2026-11-30"),
 (201, "20", "B0002", 30, 2.5, "2026-12-30");
@@ -0,0 +1,428 @@
+-- SQLite translation of init.sql for the embedded backend.
+-- Keep this file in step with init.sql: same tables, keys, views and triggers.
+-- Stored procedures have no SQLite equivalent and are not translated.
+
+DROP VIEW IF EXISTS RecentHealthRiskViolationsView;
+DROP VIEW IF EXISTS ActiveSupplierFormulationsView;
+DROP VIEW IF EXISTS ProductBOMView;
+
+DROP TABLE IF EXISTS ProductIngredientBatch;
+DROP TABLE IF EXISTS SupplierSuppliesIngredient;
+DROP TABLE IF EXISTS ProductBatch;
+DROP TABLE IF EXISTS IngredientBatch;
+DROP TABLE IF EXISTS RecipeUsesIngredient;
+DROP TABLE IF EXISTS Recipe;
+DROP TABLE IF EXISTS FormulationIngredient;
+DROP TABLE IF EXISTS Formulation;
+DROP TABLE IF EXISTS Supplier;
+DROP TABLE IF EXISTS Product;
+DROP TABLE IF EXISTS Category;
+DROP TABLE IF EXISTS Inventory;
+DROP TABLE IF EXISTS Manufacturer;
+DROP TABLE IF EXISTS DoNotCombine;
+DROP TABLE IF EXISTS AtomicIngredient;
+DROP TABLE IF EXISTS CompoundIngredient;
+DROP TABLE IF EXISTS Ingredient;
+DROP TABLE IF EXISTS Viewer;
+DROP TABLE IF EXISTS HealthRiskLog;
+
+
+CREATE TABLE Manufacturer (
+    M_ID VARCHAR(10) PRIMARY KEY,
+    M_Name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE Category (
+    Category_ID INT PRIMARY KEY,
+    Cat_Name VARCHAR(10) NOT NULL CHECK (Cat_Name IN ('Dinner', 'Side', 'Dessert', 'Other'))
+);
+
+CREATE TABLE Product (
+    P_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    P_Name VARCHAR(255) NOT NULL,
+    Category_ID INT NOT NULL,
+    Standard_Batch_Size INT NOT NULL CHECK (Standard_Batch_Size > 0),
+    M_ID VARCHAR(10) NOT NULL,
+    UNIQUE (P_Name, Category_ID),
+    FOREIGN KEY (M_ID) REFERENCES Manufacturer(M_ID),
+    FOREIGN KEY (Category_ID) REFERENCES Category(Category_ID)
+);
+
+CREATE TABLE Recipe (
+    R_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    P_ID INT NOT NULL,
+    Creation_Date DATE NOT NULL,
+    FOREIGN KEY (P_ID) REFERENCES Product(P_ID)
+);
+
+CREATE TABLE Ingredient (
+    I_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    I_Name VARCHAR(255) UNIQUE NOT NULL,
+    I_Type VARCHAR(50) CHECK (I_Type IN ('Atomic', 'Compound'))
+);
+
+CREATE TABLE AtomicIngredient (
+    AI_ID INT PRIMARY KEY,
+    FOREIGN KEY (AI_ID) REFERENCES Ingredient(I_ID)
+);
+
+CREATE TABLE CompoundIngredient (
+    CI_ID INT PRIMARY KEY,
+    FOREIGN KEY (CI_ID) REFERENCES Ingredient(I_ID)
+);
+
+
+CREATE TABLE RecipeUsesIngredient (
+    R_ID INT NOT NULL,
+    I_ID INT NOT NULL,
+    Quantity DECIMAL(10,2) CHECK (Quantity >= 0),
+    PRIMARY KEY (R_ID, I_ID),
+    FOREIGN KEY (I_ID) REFERENCES Ingredient(I_ID)
+);
+
+CREATE TABLE Supplier (
+    S_ID VARCHAR(10) PRIMARY KEY,
+    S_Name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE SupplierSuppliesIngredient (
+    S_ID VARCHAR(10) NOT NULL,
+    I_ID INT NOT NULL,
+    PRIMARY KEY (S_ID, I_ID),
+    FOREIGN KEY (S_ID) REFERENCES Supplier(S_ID),
+    FOREIGN KEY (I_ID) REFERENCES Ingredient(I_ID)
+);
+
+CREATE TABLE Viewer (
+    V_ID VARCHAR(10) PRIMARY KEY,
+    V_Name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE Formulation (
+    F_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    CI_ID INT NOT NULL,
+    S_ID VARCHAR(10) NOT NULL,
+    Version_No INT NOT NULL,
+    Eff_Start_Date DATE NOT NULL,
+    Eff_End_Date DATE NOT NULL,
+    Unit_Price DECIMAL(10,2) NOT NULL CHECK (Unit_Price > 0),
+    Pack_Size DECIMAL(10,2) NOT NULL CHECK (Pack_Size > 0),
+    FOREIGN KEY (CI_ID) REFERENCES CompoundIngredient(CI_ID),
+    FOREIGN KEY (S_ID) REFERENCES Supplier(S_ID),
+    UNIQUE (CI_ID, Version_No)
+);
+
+CREATE TABLE DoNotCombine (
+    I_ID1 INT NOT NULL,
+    I_ID2 INT NOT NULL,
+    PRIMARY KEY (I_ID1, I_ID2),
+    FOREIGN KEY (I_ID1) REFERENCES Ingredient(I_ID),
+    FOREIGN KEY (I_ID2) REFERENCES Ingredient(I_ID),
+    CHECK (I_ID1 <> I_ID2)
+);
+
+CREATE TABLE FormulationIngredient (
+    F_ID INT NOT NULL,
+    AI_ID INT NOT NULL,
+    Quantity DECIMAL(10,2) NOT NULL CHECK (Quantity > 0),
+    PRIMARY KEY (F_ID, AI_ID),
+    FOREIGN KEY (F_ID) REFERENCES Formulation(F_ID),
+    FOREIGN KEY (AI_ID) REFERENCES AtomicIngredient(AI_ID)
+);
+
+CREATE TABLE ProductBatch (
+    P_ID INT NOT NULL,
+    M_ID VARCHAR(10) NOT NULL,
+    Batch_ID VARCHAR(10) NOT NULL,
+    R_ID INT NOT NULL,
+    Quantity INT NOT NULL CHECK (Quantity >= 0),
+    Production_Date DATE NOT NULL,
+    Expiration_Date DATE NOT NULL,
+
+    Product_Lot_Number VARCHAR(100) GENERATED ALWAYS AS
+        (CAST(P_ID AS TEXT) || '-' || M_ID || '-' || Batch_ID) STORED,
+    PRIMARY KEY (P_ID, M_ID, Batch_ID),
+    UNIQUE (Product_Lot_Number),
+    UNIQUE (Batch_ID, P_ID),
+
+    FOREIGN KEY (P_ID) REFERENCES Product(P_ID),
+    FOREIGN KEY (M_ID) REFERENCES Manufacturer(M_ID),
+    FOREIGN KEY (R_ID) REFERENCES Recipe(R_ID)
+);
+
+CREATE TABLE IngredientBatch (
+    I_ID INT NOT NULL,
+    S_ID VARCHAR(10) NOT NULL,
+    Batch_ID VARCHAR(10) NOT NULL,
+    Quantity INT NOT NULL CHECK (Quantity >= 0),
+    Cost DECIMAL(10,2) NOT NULL CHECK (Cost >= 0),
+    Expiration_Date DATE NOT NULL,
+
+    Ingredient_Lot_Number VARCHAR(100) GENERATED ALWAYS AS
+        (CAST(I_ID AS TEXT) || '-' || S_ID || '-' || Batch_ID) STORED,
+    PRIMARY KEY (I_ID, S_ID, Batch_ID),
+    UNIQUE (Ingredient_Lot_Number),
+
+    FOREIGN KEY (I_ID) REFERENCES Ingredient(I_ID),
+    FOREIGN KEY (S_ID) REFERENCES Supplier(S_ID)
+);
+
+CREATE TABLE ProductIngredientBatch (
+    Product_Lot_Number VARCHAR(100) NOT NULL,
+    Ingredient_Lot_Number VARCHAR(100) NOT NULL,
+    Quantity_Used INT NOT NULL CHECK (Quantity_Used > 0),
+    PRIMARY KEY (Product_Lot_Number, Ingredient_Lot_Number),
+    FOREIGN KEY (Product_Lot_Number) REFERENCES ProductBatch(Product_Lot_Number),
+    FOREIGN KEY (Ingredient_Lot_Number) REFERENCES IngredientBatch(Ingredient_Lot_Number)
+);
+
+CREATE TABLE Inventory (
+    Ingredient_Lot_Number VARCHAR(50) NOT NULL,
+    M_ID VARCHAR(10) NOT NULL,
+    Quantity INT NOT NULL,
+    Expiration_Date DATE,
+    PRIMARY KEY (Ingredient_Lot_Number, M_ID),
+    FOREIGN KEY (M_ID) REFERENCES Manufacturer(M_ID)
+);
+
+CREATE TABLE HealthRiskLog (
+    Log_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Product_Lot_Number VARCHAR(100) NOT NULL,
+    I_ID1 INT NOT NULL,
+    I_ID2 INT NOT NULL,
+    Violation_Date DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+
+
+
+
+
+
+
+
+CREATE VIEW RecentHealthRiskViolationsView AS
+SELECT
+    Product_Lot_Number,
+    I_ID1,
+    I_ID2,
+    Violation_Date
+FROM HealthRiskLog
+WHERE Violation_Date >= datetime('now', '-30 days')
+ORDER BY Violation_Date DESC;
+
+CREATE VIEW ActiveSupplierFormulationsView AS
+SELECT
+    s.S_Name AS Supplier_Name,
+    ci.I_Name AS Compound_Ingredient_Name,
+    GROUP_CONCAT(ai.I_Name || ' (' || fi.Quantity || ')', ', ') AS Ingredients,
+    f.Unit_Price,
+    f.Pack_Size,
+    f.Version_No AS Version
+FROM Formulation f
+JOIN Supplier s ON f.S_ID = s.S_ID
+JOIN Ingredient ci ON f.CI_ID = ci.I_ID
+LEFT JOIN FormulationIngredient fi ON f.F_ID = fi.F_ID
+LEFT JOIN Ingredient ai ON fi.AI_ID = ai.I_ID
+WHERE date('now', 'localtime') BETWEEN f.Eff_Start_Date AND f.Eff_End_Date
+  AND f.Version_No = (
+      SELECT MAX(f2.Version_No)
+      FROM Formulation f2
+      WHERE f2.CI_ID = f.CI_ID
+  )
+GROUP BY s.S_Name, ci.I_Name, f.Unit_Price, f.Pack_Size, f.Version_No;
+
+CREATE VIEW ProductBOMView AS
+SELECT
+    p.P_ID,
+    p.P_Name,
+    ai.I_ID,
+    ai.I_Name,
+    SUM(
+        CASE
+            WHEN i.I_Type = 'Compound' THEN fi.Quantity * rui.Quantity
+            ELSE rui.Quantity
+        END
+    ) AS Total_Quantity
+FROM Product p
+JOIN Recipe r ON p.P_ID = r.P_ID
+JOIN RecipeUsesIngredient rui ON r.R_ID = rui.R_ID
+JOIN Ingredient i ON rui.I_ID = i.I_ID
+LEFT JOIN Formulation f ON i.I_Type = 'Compound' AND f.CI_ID = i.I_ID
+    AND date('now', 'localtime') BETWEEN f.Eff_Start_Date AND f.Eff_End_Date
+    AND f.Version_No = (
+        SELECT MAX(f2.Version_No)
+        FROM Formulation f2
+        WHERE f2.CI_ID = f.CI_ID
+    )
+LEFT JOIN FormulationIngredient fi ON f.F_ID = fi.F_ID
+LEFT JOIN Ingredient ai ON fi.AI_ID = ai.I_ID
+GROUP BY p.P_ID, p.P_Name, ai.I_ID, ai.I_Name
+HAVING ai.I_ID IS NOT NULL
+UNION ALL
+SELECT
+    p.P_ID,
+    p.P_Name,
+    i.I_ID,
+    i.I_Name,
+    SUM(rui.Quantity) AS Total_Quantity
+FROM Product p
+JOIN Recipe r ON p.P_ID = r.P_ID
+JOIN RecipeUsesIngredient rui ON r.R_ID = rui.R_ID
+JOIN Ingredient i ON rui.I_ID = i.I_ID
+WHERE i.I_Type != 'Compound'
+GROUP BY p.P_ID, p.P_Name, i.I_ID, i.I_Name;
+
+
+
+
+
+
+
+CREATE TRIGGER check_overlap
+BEFORE INSERT ON Formulation
+FOR EACH ROW
+WHEN EXISTS (
+    SELECT 1
+    FROM Formulation
+    WHERE CI_ID = NEW.CI_ID
+      AND S_ID = NEW.S_ID
+      AND NEW.Eff_Start_Date <= Eff_End_Date
+      AND NEW.Eff_End_Date >= Eff_Start_Date
+)
+BEGIN
+    SELECT RAISE(ABORT, 'Error: Effective period overlaps with existing entry.');
+END;
+
+CREATE TRIGGER check_expiration_before_batch_insert
+BEFORE INSERT ON IngredientBatch
+FOR EACH ROW
+WHEN NEW.Expiration_Date < date('now', 'localtime', '+90 days')
+BEGIN
+    SELECT RAISE(ABORT, 'Error: Expiration date must be at least 90 days from today.');
+END;
+
+CREATE TRIGGER check_expiration_before_inventory_insert
+BEFORE INSERT ON Inventory
+FOR EACH ROW
+WHEN NEW.Expiration_Date < date('now', 'localtime', '+90 days')
+BEGIN
+    SELECT RAISE(ABORT, 'Error: Expiration date must be at least 90 days from today.');
+END;
+
+-- The owning manufacturer is looked up through ProductBatch rather than parsed
+-- out of the lot number.
+CREATE TRIGGER prevent_expired_consumption
+BEFORE INSERT ON ProductIngredientBatch
+FOR EACH ROW
+WHEN (SELECT Expiration_Date
+      FROM Inventory
+      WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+        AND M_ID = (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number)
+      LIMIT 1) < date('now', 'localtime')
+BEGIN
+    SELECT RAISE(ABORT, 'Error: Cannot consume from an expired ingredient batch.');
+END;
+
+CREATE TRIGGER update_batch_on_inventory_insert
+AFTER INSERT ON Inventory
+FOR EACH ROW
+BEGIN
+    -- If batch not found
+    SELECT RAISE(ABORT, 'Error: Ingredient batch not found when adding to inventory.')
+    WHERE NOT EXISTS (
+        SELECT 1 FROM IngredientBatch WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+    );
+
+    -- If insufficient batch quantity
+    SELECT RAISE(ABORT, 'Error: Insufficient quantity in ingredient batch to move to inventory.')
+    WHERE (SELECT Quantity FROM IngredientBatch WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number) < NEW.Quantity;
+
+    -- Deduct from IngredientBatch
+    UPDATE IngredientBatch
+    SET Quantity = Quantity - NEW.Quantity
+    WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number;
+END;
+
+-- Only adjust IngredientBatch if inventory increased
+CREATE TRIGGER update_batch_on_inventory_update
+AFTER UPDATE ON Inventory
+FOR EACH ROW
+WHEN NEW.Quantity > OLD.Quantity
+BEGIN
+    SELECT RAISE(ABORT, 'Error: Ingredient batch not found in inventory.')
+    WHERE NOT EXISTS (
+        SELECT 1 FROM IngredientBatch WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+    );
+
+    SELECT RAISE(ABORT, 'Error: Not enough ingredient quantity in inventory.')
+    WHERE (SELECT Quantity FROM IngredientBatch WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number)
+        < NEW.Quantity - OLD.Quantity;
+
+    UPDATE IngredientBatch
+    SET Quantity = Quantity - (NEW.Quantity - OLD.Quantity)
+    WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number;
+END;
+
+CREATE TRIGGER update_inventory_on_consumption
+AFTER INSERT ON ProductIngredientBatch
+FOR EACH ROW
+BEGIN
+    -- If not found, raise error
+    SELECT RAISE(ABORT, 'Error: Ingredient lot not found in inventory.')
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM Inventory
+        WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+          AND M_ID = (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number)
+    );
+
+    -- If insufficient quantity, raise error
+    SELECT RAISE(ABORT, 'Error: Insufficient ingredients in inventory.')
+    WHERE (SELECT Quantity
+           FROM Inventory
+           WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+             AND M_ID = (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number)
+          ) < NEW.Quantity_Used;
+
+    -- Otherwise, update the inventory
+    UPDATE Inventory
+    SET Quantity = Quantity - NEW.Quantity_Used
+    WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+      AND M_ID = (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number);
+END;
+
+CREATE TRIGGER insert_into_atomic_subclass
+AFTER INSERT ON Ingredient
+FOR EACH ROW
+WHEN NEW.I_Type = 'Atomic'
+BEGIN
+    INSERT INTO AtomicIngredient (AI_ID) VALUES (NEW.I_ID);
+END;
+
+CREATE TRIGGER insert_into_compound_subclass
+AFTER INSERT ON Ingredient
+FOR EACH ROW
+WHEN NEW.I_Type = 'Compound'
+BEGIN
+    INSERT INTO CompoundIngredient (CI_ID) VALUES (NEW.I_ID);
+END;
+
+-- SQLite can only RAISE a literal message, so the offending pair is not named.
+CREATE TRIGGER check_health_risk_before_batch
+BEFORE INSERT ON ProductBatch
+FOR EACH ROW
+WHEN EXISTS (
+    SELECT 1
+    FROM RecipeUsesIngredient r1
+    JOIN RecipeUsesIngredient r2
+      ON r1.R_ID = r2.R_ID
+     AND r1.I_ID < r2.I_ID
+    JOIN DoNotCombine d
+      ON (d.I_ID1 = r1.I_ID AND d.I_ID2 = r2.I_ID)
+      OR (d.I_ID1 = r2.I_ID AND d.I_ID2 = r1.I_ID)
+    WHERE r1.R_ID = NEW.R_ID
+)
+BEGIN
+    SELECT RAISE(ABORT, 'Health Risk Detected: Ingredients in this recipe must not be combined');
+END;
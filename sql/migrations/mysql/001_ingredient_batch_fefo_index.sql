@@ -0,0 +1,2 @@
+-- FEFO lookups by ingredient in expiration order.
+CREATE INDEX idx_ingredientbatch_fefo ON IngredientBatch (I_ID, Expiration_Date);
@@ -0,0 +1,144 @@
+-- Per-recipe health-risk verdict, so ProductBatch inserts do one keyed lookup
+-- instead of checking every ingredient pair. A row means the verdict is
+-- current; I_ID1/I_ID2 hold the first conflicting pair, or NULL if safe.
+-- Compound ingredients are expanded through FormulationIngredient.
+DROP TABLE IF EXISTS RecipeConflictCache;
+
+CREATE TABLE RecipeConflictCache (
+    R_ID INT PRIMARY KEY,
+    I_ID1 INT NULL,
+    I_ID2 INT NULL,
+    Computed_At DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+DROP TRIGGER IF EXISTS check_health_risk_before_batch;
+
+DELIMITER //
+CREATE TRIGGER check_health_risk_before_batch
+BEFORE INSERT ON ProductBatch
+FOR EACH ROW
+BEGIN
+    DECLARE cached INT;
+    DECLARE I1 INT;
+    DECLARE I2 INT;
+    DECLARE msg VARCHAR(255);
+
+    SELECT 1, I_ID1, I_ID2 INTO cached, I1, I2
+    FROM RecipeConflictCache
+    WHERE R_ID = NEW.R_ID;
+
+    -- Cache miss: compute the verdict once and store it
+    IF cached IS NULL THEN
+        SELECT d.I_ID1, d.I_ID2 INTO I1, I2
+        FROM DoNotCombine d
+        WHERE d.I_ID1 IN (
+                SELECT rui.I_ID FROM RecipeUsesIngredient rui WHERE rui.R_ID = NEW.R_ID
+                UNION
+                SELECT fi.AI_ID
+                FROM RecipeUsesIngredient rui
+                JOIN Formulation f ON f.CI_ID = rui.I_ID
+                JOIN FormulationIngredient fi ON fi.F_ID = f.F_ID
+                WHERE rui.R_ID = NEW.R_ID
+            )
+          AND d.I_ID2 IN (
+                SELECT rui.I_ID FROM RecipeUsesIngredient rui WHERE rui.R_ID = NEW.R_ID
+                UNION
+                SELECT fi.AI_ID
+                FROM RecipeUsesIngredient rui
+                JOIN Formulation f ON f.CI_ID = rui.I_ID
+                JOIN FormulationIngredient fi ON fi.F_ID = f.F_ID
+                WHERE rui.R_ID = NEW.R_ID
+            )
+        LIMIT 1;
+
+        INSERT INTO RecipeConflictCache (R_ID, I_ID1, I_ID2) VALUES (NEW.R_ID, I1, I2);
+    END IF;
+
+    IF I1 IS NOT NULL THEN
+        SET msg = CONCAT('Health Risk Detected: Ingredients ', I1, '&', I2);
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = msg;
+    END IF;
+END//
+DELIMITER ;
+
+-- Invalidation: drop verdicts whose inputs changed
+
+CREATE TRIGGER invalidate_conflict_on_recipe_insert
+AFTER INSERT ON RecipeUsesIngredient
+FOR EACH ROW
+DELETE FROM RecipeConflictCache WHERE R_ID = NEW.R_ID;
+
+DELIMITER //
+CREATE TRIGGER invalidate_conflict_on_recipe_update
+AFTER UPDATE ON RecipeUsesIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache WHERE R_ID = OLD.R_ID;
+    DELETE FROM RecipeConflictCache WHERE R_ID = NEW.R_ID;
+END//
+DELIMITER ;
+
+CREATE TRIGGER invalidate_conflict_on_recipe_delete
+AFTER DELETE ON RecipeUsesIngredient
+FOR EACH ROW
+DELETE FROM RecipeConflictCache WHERE R_ID = OLD.R_ID;
+
+CREATE TRIGGER invalidate_conflict_on_dnc_insert
+AFTER INSERT ON DoNotCombine
+FOR EACH ROW
+DELETE FROM RecipeConflictCache;
+
+CREATE TRIGGER invalidate_conflict_on_dnc_update
+AFTER UPDATE ON DoNotCombine
+FOR EACH ROW
+DELETE FROM RecipeConflictCache;
+
+CREATE TRIGGER invalidate_conflict_on_dnc_delete
+AFTER DELETE ON DoNotCombine
+FOR EACH ROW
+DELETE FROM RecipeConflictCache;
+
+CREATE TRIGGER invalidate_conflict_on_formulation_ingredient_insert
+AFTER INSERT ON FormulationIngredient
+FOR EACH ROW
+DELETE FROM RecipeConflictCache
+WHERE R_ID IN (
+    SELECT rui.R_ID
+    FROM RecipeUsesIngredient rui
+    JOIN Formulation f ON f.CI_ID = rui.I_ID
+    WHERE f.F_ID = NEW.F_ID
+);
+
+DELIMITER //
+CREATE TRIGGER invalidate_conflict_on_formulation_ingredient_update
+AFTER UPDATE ON FormulationIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache
+    WHERE R_ID IN (
+        SELECT rui.R_ID
+        FROM RecipeUsesIngredient rui
+        JOIN Formulation f ON f.CI_ID = rui.I_ID
+        WHERE f.F_ID IN (OLD.F_ID, NEW.F_ID)
+    );
+END//
+DELIMITER ;
+
+CREATE TRIGGER invalidate_conflict_on_formulation_ingredient_delete
+AFTER DELETE ON FormulationIngredient
+FOR EACH ROW
+DELETE FROM RecipeConflictCache
+WHERE R_ID IN (
+    SELECT rui.R_ID
+    FROM RecipeUsesIngredient rui
+    JOIN Formulation f ON f.CI_ID = rui.I_ID
+    WHERE f.F_ID = OLD.F_ID
+);
+
+CREATE TRIGGER invalidate_conflict_on_formulation_update
+AFTER UPDATE ON Formulation
+FOR EACH ROW
+DELETE FROM RecipeConflictCache
+WHERE R_ID IN (
+    SELECT R_ID FROM RecipeUsesIngredient WHERE I_ID IN (OLD.CI_ID, NEW.CI_ID)
+);
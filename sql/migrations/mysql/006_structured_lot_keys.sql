@@ -0,0 +1,90 @@
+-- Lot relationships as keyed columns. Inventory gains the I_ID of the lot
+-- it holds and ProductIngredientBatch the M_ID of the consuming batch, so
+-- the consumption triggers find the Inventory row by its primary key
+-- instead of parsing M_ID out of Product_Lot_Number. This also fixes
+-- prevent_expired_consumption, whose CAST(... AS UNSIGNED) never matched a
+-- manufacturer id like 'MFG001' and so never rejected anything.
+-- Writers that do not supply the new columns get them filled by trigger.
+DROP TRIGGER IF EXISTS fill_inventory_ingredient;
+DROP TRIGGER IF EXISTS prevent_expired_consumption;
+DROP TRIGGER IF EXISTS update_inventory_on_consumption;
+
+ALTER TABLE Inventory
+    ADD COLUMN I_ID INT NULL AFTER Ingredient_Lot_Number,
+    ADD CONSTRAINT fk_inventory_ingredient FOREIGN KEY (I_ID) REFERENCES Ingredient(I_ID);
+
+ALTER TABLE ProductIngredientBatch
+    ADD COLUMN M_ID VARCHAR(10) NULL AFTER Product_Lot_Number,
+    ADD CONSTRAINT fk_consumption_manufacturer FOREIGN KEY (M_ID) REFERENCES Manufacturer(M_ID);
+
+UPDATE Inventory inv
+JOIN IngredientBatch ib ON ib.Ingredient_Lot_Number = inv.Ingredient_Lot_Number
+SET inv.I_ID = ib.I_ID;
+
+UPDATE ProductIngredientBatch pib
+JOIN ProductBatch pb ON pb.Product_Lot_Number = pib.Product_Lot_Number
+SET pib.M_ID = pb.M_ID;
+
+-- FEFO access paths: a manufacturer's lots of one ingredient, and supplier
+-- lots of one ingredient (covering, for receipts). Quantity is left out of
+-- the Inventory index so the consumption UPDATE does not have to maintain
+-- it; consumption itself is a primary key lookup on Inventory.
+DROP INDEX idx_ingredientbatch_fefo ON IngredientBatch;
+CREATE INDEX idx_inventory_fefo ON Inventory (M_ID, I_ID, Expiration_Date);
+CREATE INDEX idx_ingredientbatch_fefo ON IngredientBatch (I_ID, Expiration_Date, Quantity, Ingredient_Lot_Number);
+
+DELIMITER //
+CREATE TRIGGER fill_inventory_ingredient
+BEFORE INSERT ON Inventory
+FOR EACH ROW
+BEGIN
+    IF NEW.I_ID IS NULL THEN
+        SET NEW.I_ID = (SELECT I_ID FROM IngredientBatch WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number);
+    END IF;
+END//
+
+CREATE TRIGGER prevent_expired_consumption
+BEFORE INSERT ON ProductIngredientBatch
+FOR EACH ROW
+BEGIN
+    IF NEW.M_ID IS NULL THEN
+        SET NEW.M_ID = (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number);
+    END IF;
+
+    IF (SELECT Expiration_Date
+        FROM Inventory
+        WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+          AND M_ID = NEW.M_ID) < CURDATE()
+    THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Error: Cannot consume from an expired ingredient batch.';
+    END IF;
+END//
+
+CREATE TRIGGER update_inventory_on_consumption
+AFTER INSERT ON ProductIngredientBatch
+FOR EACH ROW
+BEGIN
+    DECLARE current_qty INT;
+
+    -- Primary key lookup on (Ingredient_Lot_Number, M_ID)
+    SELECT Quantity INTO current_qty
+    FROM Inventory
+    WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+      AND M_ID = NEW.M_ID;
+
+    IF current_qty IS NULL THEN
+        SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Error: Ingredient lot not found in inventory.';
+    END IF;
+
+    IF current_qty < NEW.Quantity_Used THEN
+        SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Error: Insufficient ingredients in inventory.';
+    END IF;
+
+    UPDATE Inventory
+    SET Quantity = Quantity - NEW.Quantity_Used
+    WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+      AND M_ID = NEW.M_ID;
+END//
+DELIMITER ;
@@ -0,0 +1,133 @@
+-- ProductBOMView materialized. ProductBOM holds the view's product to
+-- ingredient quantities, summed per ingredient, and ProductBOMFreshness
+-- one row per product whose rows are current. A freshness row is good
+-- through Valid_Through, the day before a formulation of one of the
+-- product's compounds starts or ends (NULL: no such day ahead). The
+-- triggers below drop the freshness rows of the products a write affects;
+-- src/flat_bom.py refreshes just those.
+DROP TABLE IF EXISTS ProductBOM;
+DROP TABLE IF EXISTS ProductBOMFreshness;
+DROP TRIGGER IF EXISTS stale_bom_on_recipe_insert;
+DROP TRIGGER IF EXISTS stale_bom_on_recipe_update;
+DROP TRIGGER IF EXISTS stale_bom_on_recipe_delete;
+DROP TRIGGER IF EXISTS stale_bom_on_recipe_line_insert;
+DROP TRIGGER IF EXISTS stale_bom_on_recipe_line_update;
+DROP TRIGGER IF EXISTS stale_bom_on_recipe_line_delete;
+DROP TRIGGER IF EXISTS stale_bom_on_formulation_insert;
+DROP TRIGGER IF EXISTS stale_bom_on_formulation_update;
+DROP TRIGGER IF EXISTS stale_bom_on_formulation_delete;
+DROP TRIGGER IF EXISTS stale_bom_on_formulation_line_insert;
+DROP TRIGGER IF EXISTS stale_bom_on_formulation_line_update;
+DROP TRIGGER IF EXISTS stale_bom_on_formulation_line_delete;
+
+CREATE TABLE ProductBOM (
+    P_ID INT NOT NULL,
+    I_ID INT NOT NULL,
+    Total_Quantity DECIMAL(14,4) NOT NULL,
+    PRIMARY KEY (P_ID, I_ID)
+);
+
+CREATE TABLE ProductBOMFreshness (
+    P_ID INT PRIMARY KEY,
+    Refreshed_At DATETIME NOT NULL,
+    Valid_Through DATE NULL
+);
+
+-- Recipe lines by ingredient, to find the products using a compound.
+CREATE INDEX idx_recipeuses_ingredient ON RecipeUsesIngredient (I_ID, R_ID);
+
+CREATE TRIGGER stale_bom_on_recipe_insert
+AFTER INSERT ON Recipe
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness WHERE P_ID = NEW.P_ID;
+
+CREATE TRIGGER stale_bom_on_recipe_update
+AFTER UPDATE ON Recipe
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness WHERE P_ID IN (OLD.P_ID, NEW.P_ID);
+
+CREATE TRIGGER stale_bom_on_recipe_delete
+AFTER DELETE ON Recipe
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness WHERE P_ID = OLD.P_ID;
+
+CREATE TRIGGER stale_bom_on_recipe_line_insert
+AFTER INSERT ON RecipeUsesIngredient
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (SELECT P_ID FROM Recipe WHERE R_ID = NEW.R_ID);
+
+CREATE TRIGGER stale_bom_on_recipe_line_update
+AFTER UPDATE ON RecipeUsesIngredient
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (SELECT P_ID FROM Recipe WHERE R_ID IN (OLD.R_ID, NEW.R_ID));
+
+CREATE TRIGGER stale_bom_on_recipe_line_delete
+AFTER DELETE ON RecipeUsesIngredient
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (SELECT P_ID FROM Recipe WHERE R_ID = OLD.R_ID);
+
+CREATE TRIGGER stale_bom_on_formulation_insert
+AFTER INSERT ON Formulation
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (
+    SELECT r.P_ID FROM RecipeUsesIngredient rui JOIN Recipe r ON r.R_ID = rui.R_ID
+    WHERE rui.I_ID = NEW.CI_ID
+);
+
+CREATE TRIGGER stale_bom_on_formulation_update
+AFTER UPDATE ON Formulation
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (
+    SELECT r.P_ID FROM RecipeUsesIngredient rui JOIN Recipe r ON r.R_ID = rui.R_ID
+    WHERE rui.I_ID IN (OLD.CI_ID, NEW.CI_ID)
+);
+
+CREATE TRIGGER stale_bom_on_formulation_delete
+AFTER DELETE ON Formulation
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (
+    SELECT r.P_ID FROM RecipeUsesIngredient rui JOIN Recipe r ON r.R_ID = rui.R_ID
+    WHERE rui.I_ID = OLD.CI_ID
+);
+
+CREATE TRIGGER stale_bom_on_formulation_line_insert
+AFTER INSERT ON FormulationIngredient
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (
+    SELECT r.P_ID
+    FROM Formulation f
+    JOIN RecipeUsesIngredient rui ON rui.I_ID = f.CI_ID
+    JOIN Recipe r ON r.R_ID = rui.R_ID
+    WHERE f.F_ID = NEW.F_ID
+);
+
+CREATE TRIGGER stale_bom_on_formulation_line_update
+AFTER UPDATE ON FormulationIngredient
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (
+    SELECT r.P_ID
+    FROM Formulation f
+    JOIN RecipeUsesIngredient rui ON rui.I_ID = f.CI_ID
+    JOIN Recipe r ON r.R_ID = rui.R_ID
+    WHERE f.F_ID IN (OLD.F_ID, NEW.F_ID)
+);
+
+CREATE TRIGGER stale_bom_on_formulation_line_delete
+AFTER DELETE ON FormulationIngredient
+FOR EACH ROW
+DELETE FROM ProductBOMFreshness
+WHERE P_ID IN (
+    SELECT r.P_ID
+    FROM Formulation f
+    JOIN RecipeUsesIngredient rui ON rui.I_ID = f.CI_ID
+    JOIN Recipe r ON r.R_ID = rui.R_ID
+    WHERE f.F_ID = OLD.F_ID
+);
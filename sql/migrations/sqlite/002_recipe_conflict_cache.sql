@@ -0,0 +1,145 @@
+-- Per-recipe health-risk verdict, so ProductBatch inserts do one keyed lookup
+-- instead of checking every ingredient pair. A row means the verdict is
+-- current; I_ID1/I_ID2 hold the first conflicting pair, or NULL if safe.
+-- Compound ingredients are expanded through FormulationIngredient.
+DROP TABLE IF EXISTS RecipeConflictCache;
+
+CREATE TABLE RecipeConflictCache (
+    R_ID INT PRIMARY KEY,
+    I_ID1 INT NULL,
+    I_ID2 INT NULL,
+    Computed_At DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+DROP TRIGGER IF EXISTS check_health_risk_before_batch;
+
+CREATE TRIGGER check_health_risk_before_batch
+BEFORE INSERT ON ProductBatch
+FOR EACH ROW
+BEGIN
+    -- Cache miss: compute the verdict once and store it
+    INSERT INTO RecipeConflictCache (R_ID, I_ID1, I_ID2)
+    SELECT NEW.R_ID, c.I_ID1, c.I_ID2
+    FROM (SELECT 1 AS k) one
+    LEFT JOIN (
+        SELECT d.I_ID1, d.I_ID2
+        FROM DoNotCombine d
+        WHERE d.I_ID1 IN (
+                SELECT rui.I_ID FROM RecipeUsesIngredient rui WHERE rui.R_ID = NEW.R_ID
+                UNION
+                SELECT fi.AI_ID
+                FROM RecipeUsesIngredient rui
+                JOIN Formulation f ON f.CI_ID = rui.I_ID
+                JOIN FormulationIngredient fi ON fi.F_ID = f.F_ID
+                WHERE rui.R_ID = NEW.R_ID
+            )
+          AND d.I_ID2 IN (
+                SELECT rui.I_ID FROM RecipeUsesIngredient rui WHERE rui.R_ID = NEW.R_ID
+                UNION
+                SELECT fi.AI_ID
+                FROM RecipeUsesIngredient rui
+                JOIN Formulation f ON f.CI_ID = rui.I_ID
+                JOIN FormulationIngredient fi ON fi.F_ID = f.F_ID
+                WHERE rui.R_ID = NEW.R_ID
+            )
+        LIMIT 1
+    ) c ON 1 = 1
+    WHERE NOT EXISTS (SELECT 1 FROM RecipeConflictCache WHERE R_ID = NEW.R_ID);
+
+    -- SQLite can only RAISE a literal message, so the offending pair is not named.
+    SELECT RAISE(ABORT, 'Health Risk Detected: Ingredients in this recipe must not be combined')
+    WHERE (SELECT I_ID1 FROM RecipeConflictCache WHERE R_ID = NEW.R_ID) IS NOT NULL;
+END;
+
+-- Invalidation: drop verdicts whose inputs changed
+
+CREATE TRIGGER invalidate_conflict_on_recipe_insert
+AFTER INSERT ON RecipeUsesIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache WHERE R_ID = NEW.R_ID;
+END;
+
+CREATE TRIGGER invalidate_conflict_on_recipe_update
+AFTER UPDATE ON RecipeUsesIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache WHERE R_ID IN (OLD.R_ID, NEW.R_ID);
+END;
+
+CREATE TRIGGER invalidate_conflict_on_recipe_delete
+AFTER DELETE ON RecipeUsesIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache WHERE R_ID = OLD.R_ID;
+END;
+
+CREATE TRIGGER invalidate_conflict_on_dnc_insert
+AFTER INSERT ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache;
+END;
+
+CREATE TRIGGER invalidate_conflict_on_dnc_update
+AFTER UPDATE ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache;
+END;
+
+CREATE TRIGGER invalidate_conflict_on_dnc_delete
+AFTER DELETE ON DoNotCombine
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache;
+END;
+
+CREATE TRIGGER invalidate_conflict_on_formulation_ingredient_insert
+AFTER INSERT ON FormulationIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache
+    WHERE R_ID IN (
+        SELECT rui.R_ID
+        FROM RecipeUsesIngredient rui
+        JOIN Formulation f ON f.CI_ID = rui.I_ID
+        WHERE f.F_ID = NEW.F_ID
+    );
+END;
+
+CREATE TRIGGER invalidate_conflict_on_formulation_ingredient_update
+AFTER UPDATE ON FormulationIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache
+    WHERE R_ID IN (
+        SELECT rui.R_ID
+        FROM RecipeUsesIngredient rui
+        JOIN Formulation f ON f.CI_ID = rui.I_ID
+        WHERE f.F_ID IN (OLD.F_ID, NEW.F_ID)
+    );
+END;
+
+CREATE TRIGGER invalidate_conflict_on_formulation_ingredient_delete
+AFTER DELETE ON FormulationIngredient
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache
+    WHERE R_ID IN (
+        SELECT rui.R_ID
+        FROM RecipeUsesIngredient rui
+        JOIN Formulation f ON f.CI_ID = rui.I_ID
+        WHERE f.F_ID = OLD.F_ID
+    );
+END;
+
+CREATE TRIGGER invalidate_conflict_on_formulation_update
+AFTER UPDATE ON Formulation
+FOR EACH ROW
+BEGIN
+    DELETE FROM RecipeConflictCache
+    WHERE R_ID IN (
+        SELECT R_ID FROM RecipeUsesIngredient WHERE I_ID IN (OLD.CI_ID, NEW.CI_ID)
+    );
+END;
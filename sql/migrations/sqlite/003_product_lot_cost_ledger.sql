@@ -0,0 +1,75 @@
+-- Per-product-lot cost ledger. ProductLotCost gets a row when a batch is
+-- created and both tables are updated as ProductIngredientBatch rows are
+-- written, so cost reports are key lookups instead of join-and-sum scans.
+-- The MySQL and SQLite scripts round alike: line and total costs to cents,
+-- Unit_Cost to four places from the rounded total.
+DROP TRIGGER IF EXISTS cost_ledger_on_batch;
+DROP TRIGGER IF EXISTS cost_ledger_on_consumption;
+DROP TABLE IF EXISTS ProductLotSupplierCost;
+DROP TABLE IF EXISTS ProductLotCost;
+
+CREATE TABLE ProductLotCost (
+    Product_Lot_Number VARCHAR(100) PRIMARY KEY,
+    P_ID INT NOT NULL,
+    M_ID VARCHAR(10) NOT NULL,
+    Production_Date DATE NOT NULL,
+    Produced_Units INT NOT NULL,
+    Total_Cost DECIMAL(12,2) NOT NULL DEFAULT 0,
+    Unit_Cost DECIMAL(12,4) NULL
+);
+
+CREATE INDEX idx_productlotcost_date ON ProductLotCost (Production_Date);
+CREATE INDEX idx_productlotcost_mfg_date ON ProductLotCost (M_ID, Production_Date);
+
+CREATE TABLE ProductLotSupplierCost (
+    Product_Lot_Number VARCHAR(100) NOT NULL,
+    S_ID VARCHAR(10) NOT NULL,
+    Cost DECIMAL(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (Product_Lot_Number, S_ID)
+);
+
+-- Backfill existing history in one pass per table
+INSERT INTO ProductLotCost (Product_Lot_Number, P_ID, M_ID, Production_Date, Produced_Units, Total_Cost, Unit_Cost)
+SELECT pb.Product_Lot_Number, pb.P_ID, pb.M_ID, pb.Production_Date, pb.Quantity,
+       ROUND(COALESCE(SUM(pib.Quantity_Used * ib.Cost), 0), 2),
+       ROUND(COALESCE(SUM(pib.Quantity_Used * ib.Cost), 0) / NULLIF(pb.Quantity, 0), 4)
+FROM ProductBatch pb
+LEFT JOIN ProductIngredientBatch pib ON pib.Product_Lot_Number = pb.Product_Lot_Number
+LEFT JOIN IngredientBatch ib ON ib.Ingredient_Lot_Number = pib.Ingredient_Lot_Number
+GROUP BY pb.Product_Lot_Number, pb.P_ID, pb.M_ID, pb.Production_Date, pb.Quantity;
+
+INSERT INTO ProductLotSupplierCost (Product_Lot_Number, S_ID, Cost)
+SELECT pib.Product_Lot_Number, ib.S_ID, ROUND(SUM(pib.Quantity_Used * ib.Cost), 2)
+FROM ProductIngredientBatch pib
+JOIN IngredientBatch ib ON ib.Ingredient_Lot_Number = pib.Ingredient_Lot_Number
+GROUP BY pib.Product_Lot_Number, ib.S_ID;
+
+CREATE TRIGGER cost_ledger_on_batch
+AFTER INSERT ON ProductBatch
+FOR EACH ROW
+BEGIN
+    INSERT INTO ProductLotCost (Product_Lot_Number, P_ID, M_ID, Production_Date, Produced_Units, Total_Cost, Unit_Cost)
+    VALUES (NEW.Product_Lot_Number, NEW.P_ID, NEW.M_ID, NEW.Production_Date, NEW.Quantity, 0, 0);
+END;
+
+CREATE TRIGGER cost_ledger_on_consumption
+AFTER INSERT ON ProductIngredientBatch
+FOR EACH ROW
+BEGIN
+    UPDATE ProductLotCost
+    SET Unit_Cost = ROUND((Total_Cost + (
+            SELECT ROUND(Cost * NEW.Quantity_Used, 2) FROM IngredientBatch
+            WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+        )) / NULLIF(Produced_Units, 0), 4),
+        Total_Cost = ROUND(Total_Cost + (
+            SELECT ROUND(Cost * NEW.Quantity_Used, 2) FROM IngredientBatch
+            WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+        ), 2)
+    WHERE Product_Lot_Number = NEW.Product_Lot_Number;
+
+    INSERT INTO ProductLotSupplierCost (Product_Lot_Number, S_ID, Cost)
+    SELECT NEW.Product_Lot_Number, S_ID, ROUND(Cost * NEW.Quantity_Used, 2)
+    FROM IngredientBatch
+    WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+    ON CONFLICT (Product_Lot_Number, S_ID) DO UPDATE SET Cost = ROUND(Cost + excluded.Cost, 2);
+END;
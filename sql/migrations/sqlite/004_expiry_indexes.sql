@@ -0,0 +1,6 @@
+-- Expiry range scans (Expiration_Date <= horizon), per manufacturer and overall.
+CREATE INDEX idx_inventory_mfg_expiry ON Inventory (M_ID, Expiration_Date);
+CREATE INDEX idx_inventory_expiry ON Inventory (Expiration_Date);
+CREATE INDEX idx_ingredientbatch_expiry ON IngredientBatch (Expiration_Date);
+CREATE INDEX idx_productbatch_mfg_expiry ON ProductBatch (M_ID, Expiration_Date);
+CREATE INDEX idx_productbatch_expiry ON ProductBatch (Expiration_Date);
@@ -0,0 +1,51 @@
+-- Append-only product stock ledger. Every change to a product lot's stock
+-- is a ProductStockMovement row with a signed quantity: +produced by the
+-- trigger below, -shipped / -written_off and +/-adjusted by the
+-- manufacturer actions. ProductStockSnapshot holds one balance per product
+-- as of a movement id, so on-hand is the snapshot plus the movements after
+-- it and never needs a scan of all history.
+DROP TRIGGER IF EXISTS stock_ledger_on_batch;
+DROP TABLE IF EXISTS ProductStockSnapshot;
+DROP TABLE IF EXISTS ProductStockMovement;
+
+CREATE TABLE ProductStockMovement (
+    Movement_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Product_Lot_Number VARCHAR(100) NOT NULL,
+    P_ID INT NOT NULL,
+    M_ID VARCHAR(10) NOT NULL,
+    Movement_Type VARCHAR(20) NOT NULL CHECK (Movement_Type IN ('produced', 'shipped', 'written_off', 'adjusted')),
+    Quantity INT NOT NULL,
+    Moved_At DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    Note VARCHAR(255) NULL,
+    FOREIGN KEY (Product_Lot_Number) REFERENCES ProductBatch(Product_Lot_Number)
+);
+
+-- Deltas after a snapshot, per product; lot balances for shipment checks.
+CREATE INDEX idx_stockmovement_product ON ProductStockMovement (P_ID, Movement_ID, Quantity);
+CREATE INDEX idx_stockmovement_lot ON ProductStockMovement (Product_Lot_Number, Quantity);
+
+CREATE TABLE ProductStockSnapshot (
+    P_ID INT PRIMARY KEY,
+    On_Hand INT NOT NULL,
+    Last_Movement_ID INTEGER NOT NULL,
+    Taken_At DATETIME NOT NULL
+);
+
+-- Existing batches become their 'produced' movements, then one snapshot.
+INSERT INTO ProductStockMovement (Product_Lot_Number, P_ID, M_ID, Movement_Type, Quantity, Moved_At)
+SELECT Product_Lot_Number, P_ID, M_ID, 'produced', Quantity, Production_Date
+FROM ProductBatch
+ORDER BY Production_Date, Product_Lot_Number;
+
+INSERT INTO ProductStockSnapshot (P_ID, On_Hand, Last_Movement_ID, Taken_At)
+SELECT P_ID, SUM(Quantity), MAX(Movement_ID), datetime('now')
+FROM ProductStockMovement
+GROUP BY P_ID;
+
+CREATE TRIGGER stock_ledger_on_batch
+AFTER INSERT ON ProductBatch
+FOR EACH ROW
+BEGIN
+    INSERT INTO ProductStockMovement (Product_Lot_Number, P_ID, M_ID, Movement_Type, Quantity)
+    VALUES (NEW.Product_Lot_Number, NEW.P_ID, NEW.M_ID, 'produced', NEW.Quantity);
+END;
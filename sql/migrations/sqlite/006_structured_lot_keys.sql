@@ -0,0 +1,88 @@
+-- Lot relationships as keyed columns. Inventory gains the I_ID of the lot
+-- it holds and ProductIngredientBatch the M_ID of the consuming batch, so
+-- the consumption triggers find the Inventory row by its primary key
+-- instead of looking the manufacturer up through ProductBatch per row.
+-- Writers that do not supply the new columns get them filled by trigger;
+-- SQLite cannot assign NEW, so the fill happens after the insert and the
+-- consumption triggers fall back to the ProductBatch lookup for that row.
+DROP TRIGGER IF EXISTS fill_inventory_ingredient;
+DROP TRIGGER IF EXISTS fill_consumption_manufacturer;
+DROP TRIGGER IF EXISTS prevent_expired_consumption;
+DROP TRIGGER IF EXISTS update_inventory_on_consumption;
+
+ALTER TABLE Inventory ADD COLUMN I_ID INT NULL REFERENCES Ingredient(I_ID);
+ALTER TABLE ProductIngredientBatch ADD COLUMN M_ID VARCHAR(10) NULL REFERENCES Manufacturer(M_ID);
+
+UPDATE Inventory
+SET I_ID = (SELECT I_ID FROM IngredientBatch ib WHERE ib.Ingredient_Lot_Number = Inventory.Ingredient_Lot_Number);
+
+UPDATE ProductIngredientBatch
+SET M_ID = (SELECT M_ID FROM ProductBatch pb WHERE pb.Product_Lot_Number = ProductIngredientBatch.Product_Lot_Number);
+
+-- FEFO access paths: a manufacturer's lots of one ingredient, and supplier
+-- lots of one ingredient (covering, for receipts). Quantity is left out of
+-- the Inventory index so the consumption UPDATE does not have to maintain
+-- it; consumption itself is a primary key lookup on Inventory.
+DROP INDEX IF EXISTS idx_ingredientbatch_fefo;
+CREATE INDEX idx_inventory_fefo ON Inventory (M_ID, I_ID, Expiration_Date);
+CREATE INDEX idx_ingredientbatch_fefo ON IngredientBatch (I_ID, Expiration_Date, Quantity, Ingredient_Lot_Number);
+
+CREATE TRIGGER fill_inventory_ingredient
+AFTER INSERT ON Inventory
+FOR EACH ROW
+WHEN NEW.I_ID IS NULL
+BEGIN
+    UPDATE Inventory
+    SET I_ID = (SELECT I_ID FROM IngredientBatch WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number)
+    WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+      AND M_ID = NEW.M_ID;
+END;
+
+CREATE TRIGGER fill_consumption_manufacturer
+AFTER INSERT ON ProductIngredientBatch
+FOR EACH ROW
+WHEN NEW.M_ID IS NULL
+BEGIN
+    UPDATE ProductIngredientBatch
+    SET M_ID = (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number)
+    WHERE Product_Lot_Number = NEW.Product_Lot_Number
+      AND Ingredient_Lot_Number = NEW.Ingredient_Lot_Number;
+END;
+
+CREATE TRIGGER prevent_expired_consumption
+BEFORE INSERT ON ProductIngredientBatch
+FOR EACH ROW
+WHEN (SELECT Expiration_Date
+      FROM Inventory
+      WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+        AND M_ID = COALESCE(NEW.M_ID, (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number))
+     ) < date('now', 'localtime')
+BEGIN
+    SELECT RAISE(ABORT, 'Error: Cannot consume from an expired ingredient batch.');
+END;
+
+CREATE TRIGGER update_inventory_on_consumption
+AFTER INSERT ON ProductIngredientBatch
+FOR EACH ROW
+BEGIN
+    -- Primary key lookups on (Ingredient_Lot_Number, M_ID)
+    SELECT RAISE(ABORT, 'Error: Ingredient lot not found in inventory.')
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM Inventory
+        WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+          AND M_ID = COALESCE(NEW.M_ID, (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number))
+    );
+
+    SELECT RAISE(ABORT, 'Error: Insufficient ingredients in inventory.')
+    WHERE (SELECT Quantity
+           FROM Inventory
+           WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+             AND M_ID = COALESCE(NEW.M_ID, (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number))
+          ) < NEW.Quantity_Used;
+
+    UPDATE Inventory
+    SET Quantity = Quantity - NEW.Quantity_Used
+    WHERE Ingredient_Lot_Number = NEW.Ingredient_Lot_Number
+      AND M_ID = COALESCE(NEW.M_ID, (SELECT M_ID FROM ProductBatch WHERE Product_Lot_Number = NEW.Product_Lot_Number));
+END;
@@ -0,0 +1,87 @@
+-- Formulation validity ranges as an interval index. Each (CI_ID, S_ID)
+-- holds disjoint [Eff_Start_Date, Eff_End_Date] ranges, so the only range a
+-- new one can overlap is the last one starting on or before its end:
+-- check_overlap now probes that single row through the index instead of
+-- scanning every version. The views join the latest version per compound
+-- once instead of running a correlated MAX(Version_No) per row.
+DROP TRIGGER IF EXISTS check_overlap;
+DROP VIEW IF EXISTS ActiveSupplierFormulationsView;
+DROP VIEW IF EXISTS ProductBOMView;
+
+CREATE INDEX idx_formulation_validity ON Formulation (CI_ID, S_ID, Eff_Start_Date, Eff_End_Date);
+
+CREATE TRIGGER check_overlap
+BEFORE INSERT ON Formulation
+FOR EACH ROW
+BEGIN
+    SELECT RAISE(ABORT, 'Error: Effective period ends before it starts.')
+    WHERE NEW.Eff_Start_Date > NEW.Eff_End_Date;
+
+    SELECT RAISE(ABORT, 'Error: Effective period overlaps with existing entry.')
+    WHERE (SELECT Eff_End_Date
+           FROM Formulation
+           WHERE CI_ID = NEW.CI_ID
+             AND S_ID = NEW.S_ID
+             AND Eff_Start_Date <= NEW.Eff_End_Date
+           ORDER BY Eff_Start_Date DESC
+           LIMIT 1) >= NEW.Eff_Start_Date;
+END;
+
+CREATE VIEW ActiveSupplierFormulationsView AS
+SELECT
+    s.S_Name AS Supplier_Name,
+    ci.I_Name AS Compound_Ingredient_Name,
+    GROUP_CONCAT(ai.I_Name || ' (' || fi.Quantity || ')', ', ') AS Ingredients,
+    f.Unit_Price,
+    f.Pack_Size,
+    f.Version_No AS Version
+FROM (
+    SELECT CI_ID, MAX(Version_No) AS Version_No FROM Formulation GROUP BY CI_ID
+) latest
+JOIN Formulation f ON f.CI_ID = latest.CI_ID AND f.Version_No = latest.Version_No
+JOIN Supplier s ON f.S_ID = s.S_ID
+JOIN Ingredient ci ON f.CI_ID = ci.I_ID
+LEFT JOIN FormulationIngredient fi ON f.F_ID = fi.F_ID
+LEFT JOIN Ingredient ai ON fi.AI_ID = ai.I_ID
+WHERE date('now', 'localtime') BETWEEN f.Eff_Start_Date AND f.Eff_End_Date
+GROUP BY s.S_Name, ci.I_Name, f.Unit_Price, f.Pack_Size, f.Version_No;
+
+CREATE VIEW ProductBOMView AS
+SELECT
+    p.P_ID,
+    p.P_Name,
+    ai.I_ID,
+    ai.I_Name,
+    SUM(
+        CASE
+            WHEN i.I_Type = 'Compound' THEN fi.Quantity * rui.Quantity
+            ELSE rui.Quantity
+        END
+    ) AS Total_Quantity
+FROM Product p
+JOIN Recipe r ON p.P_ID = r.P_ID
+JOIN RecipeUsesIngredient rui ON r.R_ID = rui.R_ID
+JOIN Ingredient i ON rui.I_ID = i.I_ID
+LEFT JOIN (
+    SELECT f.F_ID, f.CI_ID
+    FROM (SELECT CI_ID, MAX(Version_No) AS Version_No FROM Formulation GROUP BY CI_ID) latest
+    JOIN Formulation f ON f.CI_ID = latest.CI_ID AND f.Version_No = latest.Version_No
+    WHERE date('now', 'localtime') BETWEEN f.Eff_Start_Date AND f.Eff_End_Date
+) f ON i.I_Type = 'Compound' AND f.CI_ID = i.I_ID
+LEFT JOIN FormulationIngredient fi ON f.F_ID = fi.F_ID
+LEFT JOIN Ingredient ai ON fi.AI_ID = ai.I_ID
+GROUP BY p.P_ID, p.P_Name, ai.I_ID, ai.I_Name
+HAVING ai.I_ID IS NOT NULL
+UNION ALL
+SELECT
+    p.P_ID,
+    p.P_Name,
+    i.I_ID,
+    i.I_Name,
+    SUM(rui.Quantity) AS Total_Quantity
+FROM Product p
+JOIN Recipe r ON p.P_ID = r.P_ID
+JOIN RecipeUsesIngredient rui ON r.R_ID = rui.R_ID
+JOIN Ingredient i ON rui.I_ID = i.I_ID
+WHERE i.I_Type != 'Compound'
+GROUP BY p.P_ID, p.P_Name, i.I_ID, i.I_Name;
@@ -0,0 +1,260 @@
+import math
+from datetime import date, datetime
+from collections import defaultdict
+
+from expiry import expiry_calendar
+from lineage import lineage_index
+from lot_index import fefo_index
+from query_cache import query_cache
+
+
+def product_lot_number(pid, mid, bid):
+    """Same value as the generated ProductBatch.Product_Lot_Number column."""
+    return f"{pid}-{mid}-{bid}"
+
+
+def load_recipe_lots(cursor, mid, rid):
+    """
+    Reads the recipe and looks up the manufacturer's usable lots for each
+    ingredient in the FEFO index. Returns ({I_ID: qty per batch},
+    {I_ID: [(lot, qty, exp), ...]}) with each lot list in FEFO order.
+    """
+    index = fefo_index.ensure_loaded(cursor)
+    cursor.execute("SELECT I_ID, Quantity FROM RecipeUsesIngredient WHERE R_ID=%s ORDER BY I_ID", (rid,))
+    requirements = dict(cursor.fetchall())
+    lots = {}
+    for iid in requirements:
+        candidates = [(lotno, qty, exp) for lotno, qty, exp, _ in index.inventory_lots(mid, iid)]
+        if candidates:
+            lots[iid] = candidates
+    return requirements, lots
+
+
+def plan_allocation(requirements, lots, multiplier, explicit_lots=None):
+    """
+    Plans consumption for a batch in memory without touching the database.
+
+    Lots named in explicit_lots[I_ID] are used first, in the order given; the
+    rest of the need is covered FEFO. Needs are rounded up to whole units since
+    Inventory and ProductIngredientBatch hold integer quantities.
+
+    Returns (plan, shortages): plan is [(I_ID, lot, qty, exp)], shortages is
+    [(I_ID, needed, available)]. The plan is only usable if shortages is empty.
+    """
+    explicit_lots = explicit_lots or {}
+    plan = []
+    shortages = []
+    for iid, per_batch in requirements.items():
+        needed = math.ceil(per_batch * multiplier)
+        candidates = lots.get(iid, [])
+        preferred = explicit_lots.get(iid, [])
+        if preferred:
+            by_lot = {lot[0]: lot for lot in candidates}
+            chosen = [by_lot[l] for l in preferred if l in by_lot]
+            candidates = chosen + [lot for lot in candidates if lot[0] not in preferred]
+        remaining = needed
+        for lotno, qty, exp in candidates:
+            if remaining <= 0:
+                break
+            take = min(qty, remaining)
+            plan.append((iid, lotno, take, exp))
+            remaining -= take
+        if remaining > 0:
+            shortages.append((iid, needed, needed - remaining))
+    return plan, shortages
+
+
+# MySQL error raised on the transaction it rolls back to break a deadlock.
+DEADLOCK = 1213
+
+_LOCK_LOTS = """
+    SELECT I_ID, Ingredient_Lot_Number, Quantity, Expiration_Date
+    FROM Inventory
+    WHERE M_ID = %s AND {where} AND Quantity > 0 AND Expiration_Date >= %s
+    ORDER BY {order}
+    {limit} FOR UPDATE{skip}
+"""
+
+
+def lock_lots(cursor, mid, today, skip_locked, lot_numbers=None, iid=None, exclude=(), limit=None):
+    """
+    Locks and reads mid's usable Inventory lots: either the given lot
+    numbers, or up to `limit` lots of one ingredient in FEFO order, leaving
+    out `exclude`. With skip_locked, lots another transaction holds are
+    skipped instead of waited for. Returns [(I_ID, lot, qty, exp)].
+
+    The reads are locking reads, so they see the latest committed
+    quantities, not the transaction's snapshot. On SQLite, FOR UPDATE is
+    dropped and BEGIN IMMEDIATE already holds the only write lock.
+    """
+    if lot_numbers is not None:
+        where, args, order = "Ingredient_Lot_Number IN %s", [tuple(lot_numbers)], "I_ID, Expiration_Date, Ingredient_Lot_Number"
+    else:
+        where, args, order = "I_ID = %s", [iid], "Expiration_Date, Ingredient_Lot_Number"
+        if exclude:
+            where += " AND Ingredient_Lot_Number NOT IN %s"
+            args.append(tuple(exclude))
+    sql = _LOCK_LOTS.format(where=where, order=order, limit="LIMIT %s" if limit else "",
+                            skip=" SKIP LOCKED" if skip_locked else "")
+    cursor.execute(sql, [mid] + args + [today] + ([limit] if limit else []))
+    return cursor.fetchall()
+
+
+def _lock_and_plan(cursor, mid, requirements, multiplier, explicit_lots, expected, skip_locked, today):
+    """
+    One allocation attempt inside an open transaction. Requested lots, then
+    the lots the in-memory plan expects, are locked in one statement each;
+    an ingredient they do not cover is topped up a chunk of lots at a time
+    in FEFO order. Returns (plan, shortages) over the locked lots only.
+    """
+    locked = {}
+    requested = {lotno for lots in explicit_lots.values() for lotno in lots}
+    # Lots the caller asked for by name are waited for, never skipped.
+    if requested:
+        for iid, lotno, qty, exp in lock_lots(cursor, mid, today, False, lot_numbers=requested):
+            locked.setdefault(iid, []).append((lotno, qty, exp))
+    expected = [lotno for lotno in expected or () if lotno not in requested]
+    if skip_locked and expected:
+        for iid, lotno, qty, exp in lock_lots(cursor, mid, today, True, lot_numbers=expected):
+            locked.setdefault(iid, []).append((lotno, qty, exp))
+
+    plan, shortages = [], []
+    for iid, per_batch in sorted(requirements.items()):
+        needed = math.ceil(per_batch * multiplier)
+        preferred = explicit_lots.get(iid, [])
+        candidates = locked.get(iid, [])
+        by_lot = {lot[0]: lot for lot in candidates}
+        ordered = [by_lot[l] for l in preferred if l in by_lot]
+        ordered += sorted((lot for lot in candidates if lot[0] not in preferred), key=lambda lot: (lot[2], lot[0]))
+        remaining = needed
+        for lotno, qty, exp in ordered:
+            if remaining <= 0:
+                break
+            take = min(qty, remaining)
+            plan.append((iid, lotno, take, exp))
+            remaining -= take
+        seen = set(by_lot) | set(preferred)
+        chunk = 2
+        while remaining > 0:
+            rows = lock_lots(cursor, mid, today, skip_locked, iid=iid, exclude=seen, limit=chunk)
+            for _, lotno, qty, exp in rows:
+                seen.add(lotno)
+                if remaining > 0:
+                    take = min(qty, remaining)
+                    plan.append((iid, lotno, take, exp))
+                    remaining -= take
+            if len(rows) < chunk:
+                break
+            chunk *= 2
+        if remaining > 0:
+            shortages.append((iid, needed, needed - remaining))
+    return plan, shortages
+
+
+def _write_batch(cursor, pid, mid, bid, rid, quantity, prod_date, exp_date, plan):
+    lot = product_lot_number(pid, mid, bid)
+    cursor.execute(
+        "INSERT INTO ProductBatch (P_ID, M_ID, Batch_ID, R_ID, Quantity, Production_Date, Expiration_Date) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        (pid, mid, bid, rid, quantity, prod_date, exp_date)
+    )
+    if plan:
+        cursor.executemany(
+            "INSERT INTO ProductIngredientBatch (Product_Lot_Number, M_ID, Ingredient_Lot_Number, Quantity_Used) VALUES (%s, %s, %s, %s)",
+            [(lot, mid, lotno, qty) for _, lotno, qty, _ in plan]
+        )
+    return lot
+
+
+def allocate_batch(conn, cursor, pid, mid, bid, rid, quantity, multiplier, prod_date, exp_date,
+                   requirements, explicit_lots=None, expected=None, retries=3):
+    """
+    Locks the lots a batch consumes, plans against their current quantities
+    and writes the batch and its consumption rows in one transaction, so
+    concurrent batches never pick the same units and a batch is written
+    whole or not at all. The update_inventory_on_consumption trigger
+    deducts Inventory per row, keyed by the M_ID written with each row.
+
+    expected lists the lot numbers an in-memory plan (plan_allocation over
+    the FEFO index) would use; they are locked first with SKIP LOCKED, so
+    parallel batches spread over the next lots instead of queueing on the
+    earliest one. If the lots left unlocked cannot cover the batch, the
+    attempt is rolled back and redone with blocking locks taken in FEFO
+    order, which waits for the other batches instead of reporting a false
+    shortage. Deadlocks are retried up to `retries` times.
+
+    Returns (lot, plan, shortages); lot is None when nothing was written.
+    """
+    explicit_lots = explicit_lots or {}
+    today = date.today()
+    attempt = 0
+    skip_locked = True
+    while True:
+        conn.begin()
+        try:
+            plan, shortages = _lock_and_plan(cursor, mid, requirements, multiplier, explicit_lots,
+                                             expected, skip_locked, today)
+            if shortages:
+                conn.rollback()
+                if skip_locked:
+                    skip_locked = False
+                    continue
+                return None, plan, shortages
+            lot = _write_batch(cursor, pid, mid, bid, rid, quantity, prod_date, exp_date, plan)
+            conn.commit()
+            break
+        except Exception as e:
+            conn.rollback()
+            if e.args and e.args[0] == DEADLOCK and attempt < retries:
+                attempt += 1
+                continue
+            fefo_index.reset()
+            lineage_index.reset()
+            expiry_calendar.reset()
+            raise
+    fefo_index.record_consumption(mid, plan)
+    lineage_index.record_consumption(lot, pid, mid, quantity, prod_date, exp_date, plan)
+    expiry_calendar.record_consumption(mid, lot, quantity, exp_date, plan)
+    query_cache.invalidate("ProductBatch", "ProductIngredientBatch")
+    return lot, plan, shortages
+
+
+def explicit_lots_by_ingredient(lots, lot_numbers):
+    """Groups requested ingredient lot numbers by the recipe ingredient they belong to."""
+    owner = {lot[0]: iid for iid, candidates in lots.items() for lot in candidates}
+    explicit = defaultdict(list)
+    for lotno in lot_numbers:
+        if lotno not in owner:
+            raise ValueError(f"Lot {lotno} is not usable inventory for this recipe")
+        explicit[owner[lotno]].append(lotno)
+    return dict(explicit)
+
+
+def produce_batch(conn, cursor, mid, pid, bid, multiplier, exp_date, lot_numbers=None, prod_date=None):
+    """
+    Validates and creates one product batch without prompting.
+    Returns (lot, plan, shortages); lot is None when nothing was written.
+    Raises ValueError for an invalid order.
+    """
+    if int(multiplier) != multiplier or multiplier <= 0:
+        raise ValueError("Multiplier must be a positive whole number")
+    if isinstance(exp_date, str):
+        exp_date = datetime.strptime(exp_date, "%Y-%m-%d").date()
+    prod_date = prod_date or date.today()
+
+    cursor.execute("SELECT Standard_Batch_Size FROM Product WHERE P_ID=%s AND M_ID=%s", (pid, mid))
+    row = cursor.fetchone()
+    if not row:
+        raise ValueError(f"Product {pid} does not belong to manufacturer {mid}")
+    quantity = int(multiplier) * row[0]
+
+    cursor.execute("SELECT R_ID FROM Recipe WHERE P_ID=%s ORDER BY Creation_Date DESC LIMIT 1", (pid,))
+    row = cursor.fetchone()
+    if not row:
+        raise ValueError(f"No recipes available for product {pid}")
+    rid = row[0]
+
+    requirements, lots = load_recipe_lots(cursor, mid, rid)
+    explicit = explicit_lots_by_ingredient(lots, lot_numbers) if lot_numbers else None
+    preview, _ = plan_allocation(requirements, lots, int(multiplier), explicit)
+    return allocate_batch(conn, cursor, pid, mid, bid, rid, quantity, int(multiplier), prod_date, exp_date,
+                          requirements, explicit, [lotno for _, lotno, _, _ in preview])
@@ -0,0 +1,445 @@
+import os
+import re
+import json
+import sqlite3
+import itertools
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+base_dir = os.path.dirname(os.path.dirname(__file__))
+config_path = os.path.join(base_dir, "config", "config.json")
+sql_folder = os.path.join(os.path.dirname(__file__), "..", "sql")
+init_file = os.path.join(sql_folder, "init.sql")
+sqlite_init_file = os.path.join(sql_folder, "init_sqlite.sql")
+data_file = os.path.join(sql_folder, "data.sql")
+migrations_folder = os.path.join(sql_folder, "migrations")
+
+BACKENDS = ("mysql", "sqlite")
+
+
+def split_init_script(sql_script):
+    """Splits a MySQL script into CREATE/DROP statements (trigger bodies contain ';')."""
+    parts = re.split(r'\b(CREATE|DROP)\b', sql_script, flags=re.IGNORECASE)
+    stmts = []
+    i = 1
+    while i < len(parts):
+        keyword = parts[i].upper()
+        statement = parts[i + 1].strip()
+        if statement:
+            stmts.append(f"{keyword} {statement}")
+        i += 2
+    return stmts
+
+
+def split_data_script(sql_script):
+    return [stmt.strip() + ";" for stmt in sql_script.split(";") if stmt.strip()]
+
+
+def _is_blank(stmt):
+    return all(not line.strip() or line.strip().startswith("--") for line in stmt.splitlines())
+
+
+def split_delimited_script(sql_script):
+    """Splits a script on ';', honouring mysql-client style DELIMITER lines."""
+    stmts = []
+    delimiter = ";"
+    current = []
+    for line in sql_script.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        current.append(line)
+        if stripped.endswith(delimiter):
+            stmt = "\n".join(current).strip()[:-len(delimiter)].strip()
+            if not _is_blank(stmt):
+                stmts.append(stmt)
+            current = []
+    tail = "\n".join(current).strip()
+    if not _is_blank(tail):
+        stmts.append(tail)
+    return stmts
+
+
+class MySQLBackend:
+    """Remote MySQL reached through an SSH tunnel (the original deployment)."""
+    name = "mysql"
+    concurrent = True
+    init_file = init_file
+    migrations_folder = os.path.join(migrations_folder, "mysql")
+
+    def __init__(self, config):
+        import pymysql
+        self.config = config
+        self.tunnel = None
+        self.Error = pymysql.MySQLError
+
+    def open(self):
+        from sshtunnel import SSHTunnelForwarder
+        self.tunnel = SSHTunnelForwarder(
+            (self.config["ssh_host"], 22),
+            ssh_username=self.config["ssh_user"],
+            ssh_password=self.config["ssh_password"],
+            remote_bind_address=(self.config["mysql_host"], 3306)
+        )
+        self.tunnel.start()
+        return self
+
+    def connect(self):
+        import pymysql
+        return pymysql.connect(
+            host="127.0.0.1",
+            port=self.tunnel.local_bind_port,
+            user=self.config["ssh_user"],
+            password=self.config["mysql_password"],
+            database=self.config["ssh_user"],
+            autocommit=True
+        )
+
+    def close(self):
+        if self.tunnel is not None:
+            self.tunnel.stop()
+            self.tunnel = None
+
+    def reconnect(self):
+        """Re-establishes the SSH tunnel if it dropped."""
+        if self.tunnel is not None and self.tunnel.is_active:
+            return
+        self.close()
+        self.open()
+
+    def load_schema(self, cursor):
+        with open(init_file, "r") as f:
+            sql_script = f.read()
+        for part in split_init_script(sql_script):
+            try:
+                cursor.execute(part)
+            except self.Error as e:
+                print("Error executing statement:")
+                print(part)
+                print(e)
+                break
+
+    def load_data(self, cursor):
+        with open(data_file, "r") as f:
+            sql_script = f.read()
+        for stmt in split_data_script(sql_script):
+            cursor.execute(stmt)
+
+    def run_script(self, cursor, path):
+        with open(path, "r") as f:
+            sql_script = f.read()
+        for stmt in split_delimited_script(sql_script):
+            cursor.execute(stmt)
+
+    def set_foreign_key_checks(self, cursor, enabled):
+        cursor.execute(f"SET FOREIGN_KEY_CHECKS = {1 if enabled else 0}")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- SQLite -----------------------------------------------------------------
+# The role modules are written against pymysql: "%s" placeholders, tuple
+# expansion for "IN %s", and a handful of MySQL functions. The wrappers below
+# accept the same calls so the modules run unchanged on either backend.
+
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter("DATE", lambda b: datetime.strptime(b.decode()[:10], "%Y-%m-%d").date())
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("DECIMAL", lambda b: Decimal(b.decode()))
+
+_MYSQL_REWRITES = [
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE), "INSERT OR IGNORE"),
+    (re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE), "ON CONFLICT DO UPDATE SET"),
+    # SQLite has no row locks; BEGIN IMMEDIATE already holds the database write lock.
+    (re.compile(r"\s+FOR\s+UPDATE(?:\s+SKIP\s+LOCKED|\s+NOWAIT)?\b", re.IGNORECASE), ""),
+]
+# VALUES(col) in an upsert's update list is SQLite's excluded.col.
+_UPSERT_VALUE = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+_PLACEHOLDER = re.compile(r"%([s%])")
+_SEQUENCE_TYPES = (tuple, list, set, frozenset)
+
+
+@lru_cache(maxsize=1024)
+def _rewrite(query):
+    for pattern, replacement in _MYSQL_REWRITES:
+        query = pattern.sub(replacement, query)
+    head, upsert, updates = query.partition("ON CONFLICT DO UPDATE SET")
+    if upsert:
+        query = head + upsert + _UPSERT_VALUE.sub(r"excluded.\1", updates)
+    return query
+
+
+@lru_cache(maxsize=1024)
+def _with_qmarks(query):
+    return _PLACEHOLDER.sub(lambda m: "?" if m.group(1) == "s" else "%", _rewrite(query))
+
+
+def translate(query, args=None):
+    """Returns (sql, params) for sqlite3 from a pymysql-style query and args."""
+    if args is None:
+        return _rewrite(query), ()
+    args = tuple(args)
+    if not any(isinstance(a, _SEQUENCE_TYPES) for a in args):
+        return _with_qmarks(query), args
+
+    values = iter(args)
+    params = []
+
+    def expand(match):
+        if match.group(1) == "%":
+            return "%"
+        value = next(values)
+        if isinstance(value, _SEQUENCE_TYPES):
+            value = list(value)
+            params.extend(value)
+            return "(" + ", ".join("?" * len(value)) + ")"
+        params.append(value)
+        return "?"
+
+    return _PLACEHOLDER.sub(expand, _rewrite(query)), tuple(params)
+
+
+def _datediff(end, start):
+    if end is None or start is None:
+        return None
+    end = datetime.strptime(str(end)[:10], "%Y-%m-%d").date()
+    start = datetime.strptime(str(start)[:10], "%Y-%m-%d").date()
+    return (end - start).days
+
+
+def _concat(*args):
+    if any(a is None for a in args):
+        return None
+    return "".join(str(a) for a in args)
+
+
+class SQLiteCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection._conn.cursor()
+        self.lastrowid = None
+
+    def execute(self, query, args=None):
+        sql, params = translate(query, args)
+        self.connection._insert_id_override = None
+        self._cursor.execute(sql, params)
+        override = self.connection._insert_id_override
+        self.lastrowid = override if override is not None else self._cursor.lastrowid
+        if self._cursor.rowcount > 0 and self.lastrowid:
+            self.connection.last_insert_id = self.lastrowid
+        return self._cursor.rowcount
+
+    def executemany(self, query, args):
+        self._cursor.executemany(_with_qmarks(query), args)
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size if size is not None else self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection exposing the subset of the pymysql API the app uses."""
+
+    def __init__(self, database, uri=False):
+        self._conn = sqlite3.connect(
+            database,
+            uri=uri,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self.last_insert_id = 0
+        self._insert_id_override = None
+        self._conn.create_function("CURDATE", 0, lambda: date.today().isoformat())
+        self._conn.create_function("NOW", 0, lambda: datetime.now().isoformat(" ", "seconds"))
+        self._conn.create_function("DATEDIFF", 2, _datediff)
+        self._conn.create_function("CONCAT", -1, _concat)
+        self._conn.create_function("LAST_INSERT_ID", 0, lambda: self.last_insert_id)
+        self._conn.create_function("LAST_INSERT_ID", 1, self._set_insert_id)
+
+    def _set_insert_id(self, value):
+        # MySQL's LAST_INSERT_ID(expr) makes expr the statement's insert id.
+        self._insert_id_override = value
+        return value
+
+    def cursor(self):
+        return SQLiteCursor(self)
+
+    def executescript(self, sql_script):
+        self._conn.executescript(sql_script)
+
+    def begin(self):
+        # IMMEDIATE takes the write lock up front so two writers queue on the
+        # busy timeout instead of failing when a read lock is upgraded.
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteBackend:
+    """Embedded SQLite database, file-backed or in-memory (":memory:")."""
+    name = "sqlite"
+    Error = sqlite3.Error
+    init_file = sqlite_init_file
+    migrations_folder = os.path.join(migrations_folder, "sqlite")
+    _memory_ids = itertools.count(1)
+
+    def __init__(self, database=":memory:"):
+        self.database = database
+        self._anchor = None
+        # Shared-cache in-memory databases fail immediately on lock conflicts
+        # instead of waiting, so parallel writers need a file-backed database.
+        self.concurrent = database != ":memory:"
+        if database == ":memory:":
+            # A named shared-cache database lets every connection from this
+            # backend see the same in-memory tables.
+            self._uri = f"file:inventory-{next(self._memory_ids)}?mode=memory&cache=shared"
+        else:
+            self._uri = None
+
+    def open(self):
+        if self._uri is not None and self._anchor is None:
+            # The in-memory database lives as long as one connection is open.
+            self._anchor = self.connect()
+        return self
+
+    def connect(self):
+        if self._uri is not None:
+            return SQLiteConnection(self._uri, uri=True)
+        conn = SQLiteConnection(self.database)
+        # WAL lets pooled readers proceed while another connection writes.
+        conn._conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def reconnect(self):
+        self.open()
+
+    def close(self):
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+
+    def load_schema(self, cursor):
+        self.run_script(cursor, sqlite_init_file)
+
+    def load_data(self, cursor):
+        self.run_script(cursor, data_file)
+
+    def run_script(self, cursor, path):
+        with open(path, "r") as f:
+            cursor.connection.executescript(f.read())
+
+    def set_foreign_key_checks(self, cursor, enabled):
+        cursor.execute(f"PRAGMA foreign_keys = {'ON' if enabled else 'OFF'}")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def streaming_cursor(conn):
+    """
+    Cursor that hands out rows as they are fetched instead of buffering the
+    whole result. On MySQL this is an unbuffered SSCursor: the connection can
+    run nothing else until the result is read to the end or the cursor is
+    closed. sqlite3 cursors already step through results lazily.
+    Connection wrappers can provide their own streaming_cursor().
+    """
+    if hasattr(conn, "streaming_cursor"):
+        return conn.streaming_cursor()
+    if isinstance(conn, SQLiteConnection):
+        return conn.cursor()
+    from pymysql.cursors import SSCursor
+    return conn.cursor(SSCursor)
+
+
+def load_config(path=config_path):
+    # The SQLite backend runs without credentials, so a missing config is allowed.
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def add_backend_arguments(parser, config, pool=False):
+    """--backend and --db, plus --pool-size for tools that build a ConnectionPool."""
+    parser.add_argument("--backend", choices=BACKENDS, default=config.get("backend", "mysql"),
+                        help="database backend (default: mysql over the SSH tunnel)")
+    parser.add_argument("--db", default=None,
+                        help="SQLite database file, or :memory: (sqlite backend only)")
+    if pool:
+        parser.add_argument("--pool-size", type=int, default=config.get("pool_size", 4),
+                            help="maximum number of pooled database connections")
+
+
+def require_scratch(parser, args, config, action):
+    """
+    Stops a tool that wipes its database unless the target is clearly a
+    scratch one: --reset, an explicit --db, or an in-memory SQLite database.
+    The configured MySQL database and sqlite_path are never wiped by default.
+    """
+    if getattr(args, "reset", False):
+        return
+    if args.backend == "mysql":
+        parser.error(f"{action}; pass --reset to run it against a scratch MySQL database")
+    if args.db is None and config.get("sqlite_path", ":memory:") != ":memory:":
+        parser.error(f"{action}; pass --db with a scratch SQLite file, "
+                     f"or --reset to wipe the configured {config['sqlite_path']}")
+
+
+def create_backend(name, config, database=None):
+    if name == "mysql":
+        return MySQLBackend(config)
+    if name == "sqlite":
+        return SQLiteBackend(database or config.get("sqlite_path", ":memory:"))
+    raise ValueError(f"Unknown backend '{name}'. Choose from: {', '.join(BACKENDS)}")
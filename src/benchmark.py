@@ -0,0 +1,293 @@
+"""
+Benchmark harness for the role entry points.
+
+Drives each menu action the way inventory_management does, on a pooled
+connection, with its prompts answered from a script and its output
+captured. Every call is timed and its database round trips (execute and
+executemany calls) are counted through src/instrumentation.py. The
+results are latency percentiles and round trips per call for each entry
+point. They can be saved as a baseline and compared against it on a
+later run; --statements also writes the per-statement breakdown.
+
+Every call starts cold by default: the in-process indexes and the query
+cache are dropped first, so the numbers show what each entry point costs
+against the database. --warm keeps them between calls and measures cache
+hits instead.
+
+create_product_batch writes a new batch on every call, so run the
+benchmark on a generated scratch database (see src/datagen.py); like the
+generator it refuses the configured database without --reset. It goes
+through allocation.produce_batch, the menu action's path without the
+prompts, and counts a batch it could not make for want of stock as a
+failed call.
+
+Usage:
+    python src/datagen.py --backend sqlite --db bench.db
+    python src/benchmark.py --backend sqlite --db bench.db --save-baseline baseline.json
+    python src/benchmark.py --backend sqlite --db bench.db --baseline baseline.json --iterations 50
+    python src/benchmark.py --db bench.db --entry view_report --entry compare_products --warm
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import builtins
+from datetime import date, timedelta
+from contextlib import contextmanager, redirect_stdout
+
+import manufacturer as m
+import queries as q
+import viewer as v
+from allocation import produce_batch
+from backend import add_backend_arguments, create_backend, load_config, require_scratch
+from bom import bom_engine
+from expiry import expiry_calendar
+from formulation_index import formulation_index
+from instrumentation import InstrumentedBackend, instruments
+from lineage import lineage_index
+from lot_index import fefo_index
+from migrations import bootstrap
+from pool import ConnectionPool
+from query_cache import query_cache
+
+
+@contextmanager
+def scripted_input(answers):
+    """Answers input() prompts from a list, failing loudly if the script runs out."""
+    answers = iter(answers)
+
+    def answer(prompt=""):
+        try:
+            return next(answers)
+        except StopIteration:
+            raise RuntimeError(f"no scripted answer for prompt {prompt!r}") from None
+
+    original = builtins.input
+    builtins.input = answer
+    try:
+        yield
+    finally:
+        builtins.input = original
+
+
+def reset_caches():
+    """Drops every in-process index and cache, so the next call starts cold."""
+    bom_engine.invalidate()
+    fefo_index.reset()
+    lineage_index.reset()
+    expiry_calendar.reset()
+    formulation_index.reset()
+    query_cache.clear()
+
+
+class Context:
+    """What the scripted entry points need to pick their inputs."""
+
+    def __init__(self, pool, seed):
+        self.pool = pool
+        self.rng = random.Random(seed)
+        with pool.cursor() as (_, cursor):
+            cursor.execute("SELECT M_ID, P_ID FROM Product ORDER BY M_ID, P_ID")
+            self.products_by_mid = {}
+            for mid, pid in cursor.fetchall():
+                self.products_by_mid.setdefault(mid, []).append(pid)
+            cursor.execute("SELECT COUNT(*) FROM Product")
+            self.products = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM ProductBatch WHERE Batch_ID LIKE 'X%'")
+            self.next_batch = cursor.fetchone()[0]
+        self.mids = sorted(self.products_by_mid)
+
+    def mid(self):
+        return self.rng.choice(self.mids)
+
+    def batch_id(self):
+        self.next_batch += 1
+        return f"X{self.next_batch:08d}"
+
+
+def with_cursor(action, answers=lambda ctx: []):
+    """Entry point run like a menu choice: scripted prompts, one pooled cursor, commit after."""
+    def run(ctx):
+        with scripted_input(answers(ctx)), ctx.pool.cursor() as (conn, cursor):
+            action(ctx, conn, cursor)
+            conn.commit()
+    return run
+
+
+def run_create_product_batch(ctx):
+    mid = ctx.mid()
+    pid = ctx.rng.choice(ctx.products_by_mid[mid])
+    expires = date.today() + timedelta(days=60)
+    with ctx.pool.cursor() as (conn, cursor):
+        lot, _, shortages = produce_batch(conn, cursor, mid, pid, ctx.batch_id(), 1, expires)
+    if lot is None:
+        raise RuntimeError(f"not enough inventory for product {pid}: {shortages}")
+
+
+def run_view_report(ctx):
+    m.view_report(ctx.pool, ctx.mid())
+
+
+ENTRY_POINTS = {
+    "create_product_batch": run_create_product_batch,
+    "view_report": run_view_report,
+    "view_product_ingredient_list": with_cursor(
+        lambda ctx, conn, cursor: v.view_product_ingredient_list(cursor), lambda ctx: ["e", os.devnull]),
+    "compare_products": with_cursor(
+        lambda ctx, conn, cursor: v.compare_products(cursor),
+        lambda ctx: [str(ctx.rng.randint(1, ctx.products)), str(ctx.rng.randint(1, ctx.products))]),
+    "view_flattened_bom": with_cursor(
+        lambda ctx, conn, cursor: v.view_flattened_bom(cursor), lambda ctx: ["a", "a"]),
+    "view_incompatibility_matrix": with_cursor(
+        lambda ctx, conn, cursor: v.view_incompatibility_matrix(cursor), lambda ctx: [""]),
+    "last_batch_ingredients": with_cursor(lambda ctx, conn, cursor: q.last_batch_ingredients(cursor)),
+    "manufacturer_supplier_spending": with_cursor(lambda ctx, conn, cursor: q.manufacturer_supplier_spending(cursor)),
+    "product_unit_cost": with_cursor(lambda ctx, conn, cursor: q.product_unit_cost(cursor)),
+    "conflicting_ingredients_for_batch": with_cursor(
+        lambda ctx, conn, cursor: q.conflicting_ingredients_for_batch(cursor)),
+    "manufacturers_not_supplied_by": with_cursor(lambda ctx, conn, cursor: q.manufacturers_not_supplied_by(cursor)),
+    "expiring_soon": with_cursor(lambda ctx, conn, cursor: q.expiring_soon(cursor), lambda ctx: ["10"]),
+}
+
+# Entry points that write to the database.
+WRITE_ENTRY_POINTS = {"create_product_batch"}
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def measure(name, ctx, iterations, warmup, cold):
+    """Runs one entry point and returns its latency and round-trip summary."""
+    run = ENTRY_POINTS[name]
+    timings, trips, errors = [], [], 0
+    for i in range(warmup + iterations):
+        if cold:
+            reset_caches()
+        out = io.StringIO()
+        before = instruments.round_trips
+        start = time.perf_counter()
+        try:
+            with redirect_stdout(out), instruments.action(name):
+                run(ctx)
+            # The role functions report failures by printing them.
+            failed = "Error" in out.getvalue()
+        except Exception:
+            failed = True
+        elapsed = time.perf_counter() - start
+        if i < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        trips.append(instruments.round_trips - before)
+        errors += failed
+    timings.sort()
+    return {
+        "calls": iterations,
+        "errors": errors,
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p90_ms": round(percentile(timings, 90), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "max_ms": round(timings[-1], 3),
+        "round_trips": round(sum(trips) / len(trips), 2),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Prints each entry point against the baseline. Returns the names that regressed."""
+    regressed = []
+    print(f"\n{'entry point':<34} {'p50 ms':>18} {'p95 ms':>18} {'round trips':>20}")
+    for name, now in results.items():
+        then = baseline.get(name)
+        if then is None:
+            print(f"{name:<34} (not in baseline)")
+            continue
+        cells = []
+        worse = False
+        for key in ("p50_ms", "p95_ms", "round_trips"):
+            if then[key]:
+                change = (now[key] - then[key]) / then[key]
+            else:
+                change = 0.0 if now[key] == then[key] else float("inf")
+            worse |= change > threshold
+            cells.append(f"{now[key]:>9} {change:>+7.0%}")
+        print(f"{name:<34} {cells[0]:>18} {cells[1]:>18} {cells[2]:>20}{'  REGRESSED' if worse else ''}")
+        if worse:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Benchmark the role entry points without interactive input")
+    add_backend_arguments(parser, config, pool=True)
+    parser.add_argument("--entry", action="append", choices=sorted(ENTRY_POINTS), default=[],
+                        help="entry point to run (repeatable; default: all)")
+    parser.add_argument("--iterations", type=int, default=20, help="timed calls per entry point")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed calls before timing")
+    parser.add_argument("--warm", action="store_true",
+                        help="keep the in-process caches between calls (default: drop them before every call)")
+    parser.add_argument("--reset", action="store_true",
+                        help="allow the write entry points on the configured database (MySQL, or sqlite_path without --db)")
+    parser.add_argument("--seed", type=int, default=540, help="seed for the scripted answers")
+    parser.add_argument("--results", default=None, help="write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="compare against a saved results file")
+    parser.add_argument("--save-baseline", default=None, help="write the results as a new baseline file")
+    parser.add_argument("--statements", default=None,
+                        help="write per-statement timing statistics (see src/instrumentation.py) as JSON")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown that counts as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    names = args.entry or list(ENTRY_POINTS)
+    writes = sorted(WRITE_ENTRY_POINTS.intersection(names))
+    if writes:
+        require_scratch(parser, args, config, f"{', '.join(writes)} writes to the database")
+    cold = not args.warm
+    results = {}
+    with create_backend(args.backend, config, args.db) as raw:
+        backend = InstrumentedBackend(raw)
+        pool = ConnectionPool(backend, size=args.pool_size)
+        try:
+            with pool.cursor() as (_, cursor), redirect_stdout(sys.stderr):
+                bootstrap(backend, cursor)
+            ctx = Context(pool, args.seed)
+            instruments.reset()
+            for name in names:
+                results[name] = measure(name, ctx, args.iterations, args.warmup, cold)
+                r = results[name]
+                print(f"{name:<34} p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  "
+                      f"max {r['max_ms']:>9.2f} ms  {r['round_trips']:>7.1f} trips  {r['errors']} errors")
+        finally:
+            pool.close()
+
+    run = {"backend": args.backend, "cold": cold, "iterations": args.iterations, "entries": results}
+    for path in filter(None, [args.results, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(run, f, indent=2)
+    if args.statements:
+        instruments.dump(args.statements)
+
+    regressed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("cold") != cold or baseline.get("backend") != args.backend:
+            print(f"⚠ Baseline was a {'cold' if baseline.get('cold') else 'warm'} {baseline.get('backend')} run; "
+                  f"comparing it with a {'cold' if cold else 'warm'} {args.backend} run.")
+        regressed = compare(results, baseline["entries"], args.threshold)
+    errors = sum(r["errors"] for r in results.values())
+    print(f"✅ {len(results)} entry points, {errors} failed calls, {len(regressed)} regressions", file=sys.stderr)
+    return 0 if not regressed and not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Bill-of-materials expansion.
+
+Recipe, RecipeUsesIngredient, Formulation, FormulationIngredient, Ingredient
+and DoNotCombine are loaded in bulk (one query each) and compounds are
+expanded recursively in memory, with cycle detection. Expansions of a
+compound are memoized, so a sub-assembly shared by many products is only
+expanded once.
+
+The engine answers two questions for the viewer: which ingredients a
+product can contain (for conflict checks) and how its compounds break
+down (for the ingredient tree). Totals of atomic ingredients per batch
+come from ProductBOM (src/flat_bom.py); recipe conflict verdicts and lot
+costs are kept by the database (src/conflicts.py, src/costs.py).
+
+Expansion follows ProductBOMView, so the ingredient tree and the
+Flattened BOM agree for the same product: a product covers every one of
+its recipe versions, and a compound is expanded through its highest
+formulation version only if that version is in effect today (otherwise
+it is listed without parts). Ingredient *sets*, used for conflict checks,
+include every formulation version of a compound so that no possible
+ingredient is missed.
+"""
+import threading
+from datetime import date
+from collections import defaultdict
+
+
+class BomCycleError(ValueError):
+    pass
+
+
+class BomEngine:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.recipes_loaded = False
+
+    def invalidate(self):
+        """Drops the snapshot; call after writing recipes or formulations."""
+        with self._lock:
+            self.loaded = False
+            self.recipes_loaded = False
+
+    def ensure_loaded(self, cursor, recipes=True):
+        """
+        Loads ingredients and formulations, plus every product's recipe
+        unless recipes is False (callers that stream recipe lines themselves
+        keep memory bounded by the number of compounds, not products).
+        """
+        with self._lock:
+            if not self.loaded:
+                self._load(cursor)
+            if recipes and not self.recipes_loaded:
+                self._load_recipes(cursor)
+            return self
+
+    def _load(self, cursor):
+        cursor.execute("SELECT I_ID, I_Name, I_Type FROM Ingredient")
+        self.names = {}
+        self.compounds = set()
+        for iid, name, itype in cursor.fetchall():
+            self.names[iid] = name
+            if itype == 'Compound':
+                self.compounds.add(iid)
+
+        cursor.execute("SELECT F_ID, CI_ID, Version_No, Eff_Start_Date, Eff_End_Date FROM Formulation")
+        self.formulations = defaultdict(list)
+        for fid, ci, version, start, end in cursor.fetchall():
+            self.formulations[ci].append((version, start, end, fid))
+        for versions in self.formulations.values():
+            versions.sort()
+
+        cursor.execute("SELECT F_ID, AI_ID, Quantity FROM FormulationIngredient")
+        self.formulation_lines = defaultdict(list)
+        for fid, ai, qty in cursor.fetchall():
+            self.formulation_lines[fid].append((ai, qty))
+
+        cursor.execute("SELECT I_ID1, I_ID2 FROM DoNotCombine")
+        self.do_not_combine = set(cursor.fetchall())
+
+        self._all_parts = {}
+        self._subtrees = {}
+        self.recipes_loaded = False
+        self.loaded = True
+
+    def _load_recipes(self, cursor):
+        # Every recipe version per product, as ProductBOMView reads them
+        cursor.execute("SELECT P_ID, R_ID FROM Recipe ORDER BY P_ID, Creation_Date, R_ID")
+        self.recipes_of = defaultdict(list)
+        for pid, rid in cursor.fetchall():
+            self.recipes_of[pid].append(rid)
+
+        cursor.execute("SELECT R_ID, I_ID, Quantity FROM RecipeUsesIngredient")
+        self.recipe_lines = defaultdict(list)
+        for rid, iid, qty in cursor.fetchall():
+            self.recipe_lines[rid].append((iid, qty))
+        self.recipes_loaded = True
+
+    # --- formulations ---
+
+    def formulation_for(self, ci, as_of=None):
+        """F_ID used to expand a compound: its highest version, if in effect on as_of; else None."""
+        versions = self.formulations.get(ci)
+        if not versions:
+            return None
+        as_of = as_of or date.today()
+        _, start, end, fid = versions[-1]
+        return fid if start <= as_of <= end else None
+
+    def _children(self, iid):
+        if iid not in self.compounds:
+            return []
+        fid = self.formulation_for(iid)
+        return self.formulation_lines.get(fid, []) if fid is not None else []
+
+    # --- expansion ---
+
+    def all_parts(self, iid, _path=()):
+        """Every ingredient an ingredient can contain, across all formulation versions."""
+        if iid in self._all_parts:
+            return self._all_parts[iid]
+        if iid in _path:
+            raise BomCycleError(f"Cycle in BOM: {' -> '.join(map(str, _path + (iid,)))}")
+        parts = {iid}
+        for _, _, _, fid in self.formulations.get(iid, []):
+            for child, _ in self.formulation_lines.get(fid, []):
+                parts |= self.all_parts(child, _path + (iid,))
+        parts = frozenset(parts)
+        self._all_parts[iid] = parts
+        return parts
+
+    def recipe_ingredients(self, rid):
+        """Set of every ingredient ID in a recipe, compounds and their parts included."""
+        result = set()
+        for iid, _ in self.recipe_lines.get(rid, []):
+            result |= self.all_parts(iid)
+        return result
+
+    def product_ingredients(self, pid):
+        result = set()
+        for rid in self.recipes_of.get(pid, []):
+            result |= self.recipe_ingredients(rid)
+        return result
+
+    def subtree(self, iid, _path=()):
+        """Children of an ingredient as (I_ID, quantity, children), largest quantity first."""
+        if iid in self._subtrees:
+            return self._subtrees[iid]
+        if iid in _path:
+            raise BomCycleError(f"Cycle in BOM: {' -> '.join(map(str, _path + (iid,)))}")
+        children = sorted(self._children(iid), key=lambda c: c[1], reverse=True)
+        result = [(child, qty, self.subtree(child, _path + (iid,))) for child, qty in children]
+        self._subtrees[iid] = result
+        return result
+
+    def tree(self, iid, qty):
+        return iid, qty, self.subtree(iid)
+
+    # --- conflicts ---
+
+    def conflicts_within(self, ingredient_ids):
+        """DoNotCombine pairs whose two ingredients are both in the set."""
+        ids = set(ingredient_ids)
+        return sorted((a, b) for a, b in self.do_not_combine if a in ids and b in ids)
+
+
+# One engine per process; role actions invalidate it after BOM writes.
+bom_engine = BomEngine()
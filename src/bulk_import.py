@@ -0,0 +1,332 @@
+"""
+Bulk loader for seed and historical data.
+
+Each input file is named after its table (IngredientBatch.csv,
+ProductIngredientBatch.jsonl, ...). Rows are streamed from disk and written
+with executemany in batches, one transaction per batch, in foreign-key order.
+Rows still go through the table triggers, exactly as data.sql does.
+Every row of a file must have the same columns as its first row; a file
+with a row that differs is reported, with its line, before anything is
+written.
+Formulation files are first checked in one pass against the formulation
+interval index (src/formulation_index.py), so an upload with overlapping
+effective dates or reused versions is rejected before any row is written;
+--check stops after that.
+
+Usage:
+    python src/bulk_import.py --backend sqlite --db pmim.db --batch-size 5000 data/history/
+    python src/bulk_import.py --db pmim.db --check data/history/Formulation.csv
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+
+from backend import add_backend_arguments, create_backend, load_config
+from formulation_index import formulation_index
+from migrations import bootstrap
+
+# Parents before children, following the FOREIGN KEYs in init.sql.
+TABLE_ORDER = [
+    "Manufacturer",
+    "Category",
+    "Supplier",
+    "Viewer",
+    "Ingredient",
+    "Product",
+    "Recipe",
+    "RecipeUsesIngredient",
+    "SupplierSuppliesIngredient",
+    "DoNotCombine",
+    "Formulation",
+    "FormulationIngredient",
+    "IngredientBatch",
+    "Inventory",
+    "ProductBatch",
+    "ProductIngredientBatch",
+    "HealthRiskLog",
+]
+
+# Computed by the database; values present in the input are ignored.
+GENERATED_COLUMNS = {
+    "IngredientBatch": {"Ingredient_Lot_Number"},
+    "ProductBatch": {"Product_Lot_Number"},
+}
+
+class ImportRejected(ValueError):
+    """The inputs failed validation; nothing was written."""
+
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def numbered_csv(path):
+    """Yields (line number, row) pairs; a row with extra values has a None key."""
+    with open(path, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, {k: (v if v != "" else None) for k, v in row.items()}
+
+
+def numbered_jsonl(path):
+    with open(path, "r") as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield line_num, json.loads(line)
+
+
+def read_csv(path):
+    return (row for _, row in numbered_csv(path))
+
+
+def read_jsonl(path):
+    return (row for _, row in numbered_jsonl(path))
+
+
+READERS = {".csv": read_csv, ".jsonl": read_jsonl}
+NUMBERED_READERS = {".csv": numbered_csv, ".jsonl": numbered_jsonl}
+
+# Column mismatches reported per file before the rest are only counted.
+MAX_REPORTED = 10
+
+
+def find_inputs(paths):
+    """Returns [(table, path)] for the given files/directories in load order."""
+    found = {}
+    for path in paths:
+        files = [os.path.join(path, n) for n in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for file in files:
+            table, ext = os.path.splitext(os.path.basename(file))
+            if ext not in READERS:
+                continue
+            if table not in TABLE_ORDER:
+                raise ValueError(f"{file}: unknown table '{table}'")
+            found.setdefault(table, []).append(file)
+    return [(table, file) for table in TABLE_ORDER for file in found.get(table, [])]
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save_checkpoint(path, checkpoint):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def build_insert(table, columns):
+    for col in columns:
+        if not _IDENTIFIER.match(col):
+            raise ValueError(f"Invalid column name '{col}' for {table}")
+    placeholders = ", ".join(["%s"] * len(columns))
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+def import_file(conn, table, path, batch_size, checkpoint, checkpoint_path):
+    """Loads one file, resuming after the rows already recorded in the checkpoint."""
+    key = os.path.abspath(path)
+    state = checkpoint.get(key)
+    signature = file_signature(path)
+    if state and state["signature"] != signature:
+        print(f"  {path} changed since the last run; starting it from the beginning.")
+        state = None
+    if state is None:
+        state = {"signature": signature, "rows": 0, "done": False}
+        checkpoint[key] = state
+    if state["done"]:
+        print(f"  {table}: {path} already imported, skipping.")
+        return 0, 0.0
+
+    skip = state["rows"]
+    if skip:
+        print(f"  {table}: resuming {path} after row {skip}.")
+
+    rows = READERS[os.path.splitext(path)[1]](path)
+    columns = None
+    sql = None
+    batch = []
+    loaded = 0
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal loaded
+        cursor = conn.cursor()
+        conn.begin()
+        try:
+            cursor.executemany(sql, batch)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        loaded += len(batch)
+        state["rows"] += len(batch)
+        save_checkpoint(checkpoint_path, checkpoint)
+        batch.clear()
+
+    for index, row in enumerate(rows):
+        if columns is None:
+            generated = GENERATED_COLUMNS.get(table, set())
+            columns = [c for c in row if c not in generated]
+            sql = build_insert(table, columns)
+        if index < skip:
+            continue
+        batch.append(tuple(row.get(c) for c in columns))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    state["done"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    rate = loaded / elapsed if elapsed > 0 else 0
+    print(f"  {table}: {loaded} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    return loaded, elapsed
+
+
+def check_columns(inputs):
+    """
+    Every row of a file must have the first row's columns: later JSONL keys
+    would otherwise be dropped and missing ones loaded as NULL. Prints each
+    mismatch with its file and line; returns the number found.
+    """
+    problems = 0
+    for table, path in inputs:
+        columns = None
+        found = 0
+        for line_num, row in NUMBERED_READERS[os.path.splitext(path)[1]](path):
+            keys = set(row)
+            if columns is None:
+                columns = keys
+                continue
+            if keys == columns:
+                continue
+            found += 1
+            if found <= MAX_REPORTED:
+                missing = ", ".join(sorted(columns - keys)) or "none"
+                extra = ", ".join(sorted(str(k) if k is not None else "(unnamed values)" for k in keys - columns)) or "none"
+                print(f"  {path} line {line_num}: columns differ from the first row's (missing: {missing}; unexpected: {extra})")
+        if found > MAX_REPORTED:
+            print(f"  {path}: {found - MAX_REPORTED} more row(s) with different columns")
+        problems += found
+    return problems
+
+
+def check_formulations(conn, inputs, checkpoint):
+    """
+    Validates the Formulation rows not yet imported against the database and
+    each other. Prints each problem; returns the number found.
+    """
+    rows = []
+    for table, path in inputs:
+        if table != "Formulation":
+            continue
+        state = checkpoint.get(os.path.abspath(path))
+        if state and state["signature"] == file_signature(path):
+            if state["done"]:
+                continue
+            skip = state["rows"]
+        else:
+            skip = 0
+        for index, row in enumerate(READERS[os.path.splitext(path)[1]](path)):
+            if index >= skip:
+                rows.append((path, index + 1, row))
+    if not rows:
+        return 0
+    cursor = conn.cursor()
+    try:
+        formulation_index.ensure_loaded(cursor)
+    finally:
+        cursor.close()
+    errors = formulation_index.validate(row for _, _, row in rows)
+    for n, message in errors:
+        path, line, _ = rows[n - 1]
+        print(f"  {path} row {line}: {message}")
+    return len(errors)
+
+
+def run_import(conn, inputs, batch_size=1000, checkpoint_path=None, check_only=False):
+    checkpoint = load_checkpoint(checkpoint_path)
+    problems = check_columns(inputs)
+    if problems:
+        raise ImportRejected(f"{problems} row(s) have columns different from their file's first row; nothing was imported")
+    problems = check_formulations(conn, inputs, checkpoint)
+    if problems:
+        raise ImportRejected(f"{problems} Formulation row(s) failed validation; nothing was imported")
+    if check_only:
+        print("✅ Formulation rows have no overlapping ranges or duplicate versions.")
+        return 0
+    total_rows = 0
+    total_time = 0.0
+    for table, path in inputs:
+        rows, elapsed = import_file(conn, table, path, batch_size, checkpoint, checkpoint_path)
+        total_rows += rows
+        total_time += elapsed
+    formulation_index.reset()
+    rate = total_rows / total_time if total_time > 0 else 0
+    print(f"✅ Imported {total_rows} rows in {total_time:.2f}s ({rate:,.0f} rows/s)")
+    return total_rows
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Bulk import CSV/JSONL files named after their tables")
+    add_backend_arguments(parser, config)
+    parser.add_argument("paths", nargs="+", help="input files or directories")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per executemany batch")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file (default: .import_checkpoint.json next to the first input)")
+    parser.add_argument("--restart", action="store_true", help="ignore any existing checkpoint")
+    parser.add_argument("--check", action="store_true",
+                        help="only validate Formulation files (overlapping dates, reused versions)")
+    args = parser.parse_args(argv)
+
+    inputs = find_inputs(args.paths)
+    if not inputs:
+        print("No CSV/JSONL files found.")
+        return 1
+    checkpoint_path = args.checkpoint
+    if checkpoint_path is None:
+        first = args.paths[0]
+        folder = first if os.path.isdir(first) else os.path.dirname(os.path.abspath(first))
+        checkpoint_path = os.path.join(folder, ".import_checkpoint.json")
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        bootstrap(backend, conn.cursor())
+        try:
+            run_import(conn, inputs, args.batch_size, checkpoint_path, args.check)
+        except ImportRejected as e:
+            print(f"Import rejected: {e}")
+            return 1
+        except Exception as e:
+            print(f"Import stopped: {e}")
+            print(f"Progress saved to {checkpoint_path}; rerun the same command to resume.")
+            return 1
+        finally:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Recipe health-risk verdicts stored in RecipeConflictCache (migration 002).
+
+The database fills the cache on a ProductBatch insert if the verdict is
+missing and the invalidation triggers clear it when RecipeUsesIngredient,
+DoNotCombine or FormulationIngredient change. Saving a recipe refreshes it
+up front so the first batch of a new recipe is also a single lookup.
+"""
+
+# Every ingredient of the recipe plus the atomic ingredients of its compounds.
+_RECIPE_INGREDIENTS = """
+    SELECT rui.I_ID FROM RecipeUsesIngredient rui WHERE rui.R_ID = %s
+    UNION
+    SELECT fi.AI_ID
+    FROM RecipeUsesIngredient rui
+    JOIN Formulation f ON f.CI_ID = rui.I_ID
+    JOIN FormulationIngredient fi ON fi.F_ID = f.F_ID
+    WHERE rui.R_ID = %s
+"""
+
+CONFLICT_SQL = f"""
+    SELECT d.I_ID1, d.I_ID2
+    FROM DoNotCombine d
+    WHERE d.I_ID1 IN ({_RECIPE_INGREDIENTS})
+      AND d.I_ID2 IN ({_RECIPE_INGREDIENTS})
+    LIMIT 1
+"""
+
+
+def refresh_recipe_conflict(cursor, rid):
+    """Recomputes and stores the verdict for one recipe. Returns the conflicting pair or None."""
+    cursor.execute(CONFLICT_SQL, (rid, rid, rid, rid))
+    pair = cursor.fetchone()
+    i1, i2 = pair if pair else (None, None)
+    cursor.execute(
+        "REPLACE INTO RecipeConflictCache (R_ID, I_ID1, I_ID2) VALUES (%s, %s, %s)",
+        (rid, i1, i2)
+    )
+    return pair
+
@@ -0,0 +1,117 @@
+"""
+Product lot cost ledger (migration 003).
+
+ProductLotCost and ProductLotSupplierCost are kept current by triggers on
+ProductBatch and ProductIngredientBatch, so these reads are key or index
+lookups. rebuild_cost_ledger recomputes both tables from history with two
+set-based statements, for repairing the ledger or backfilling rows that
+were loaded outside the triggers.
+
+Usage:
+    python src/costs.py --backend sqlite --db pmim.db --rebuild
+"""
+import sys
+import argparse
+
+from backend import add_backend_arguments, create_backend, load_config
+from migrations import bootstrap
+from query_cache import query_cache
+
+_LEDGER_COLUMNS = "Product_Lot_Number, P_ID, M_ID, Production_Date, Produced_Units, Total_Cost, Unit_Cost"
+
+
+def lot_cost(cursor, lot):
+    """(lot, P_ID, M_ID, production date, units, total cost, unit cost) or None."""
+    return query_cache.fetchone(
+        cursor, f"SELECT {_LEDGER_COLUMNS} FROM ProductLotCost WHERE Product_Lot_Number = %s", (lot,)
+    )
+
+
+def lot_supplier_costs(cursor, lot):
+    """[(S_ID, cost)] for one product lot, largest first."""
+    return query_cache.fetchall(
+        cursor, "SELECT S_ID, Cost FROM ProductLotSupplierCost WHERE Product_Lot_Number = %s ORDER BY Cost DESC",
+        (lot,)
+    )
+
+
+def lot_costs_between(cursor, start, end, mid=None):
+    """Ledger rows for lots produced between start and end (inclusive), optionally for one manufacturer."""
+    query = f"SELECT {_LEDGER_COLUMNS} FROM ProductLotCost WHERE Production_Date BETWEEN %s AND %s"
+    args = [start, end]
+    if mid is not None:
+        query += " AND M_ID = %s"
+        args.append(mid)
+    return query_cache.fetchall(cursor, query + " ORDER BY Production_Date, Product_Lot_Number", args)
+
+
+def supplier_spending(cursor, mid, start=None, end=None):
+    """[(S_Name, total spent)] for a manufacturer's lots, optionally within a production date range."""
+    query = """
+        SELECT s.S_Name, SUM(psc.Cost) AS Total_Spent
+        FROM ProductLotCost plc
+        JOIN ProductLotSupplierCost psc ON psc.Product_Lot_Number = plc.Product_Lot_Number
+        JOIN Supplier s ON s.S_ID = psc.S_ID
+        WHERE plc.M_ID = %s
+    """
+    args = [mid]
+    if start is not None and end is not None:
+        query += " AND plc.Production_Date BETWEEN %s AND %s"
+        args += [start, end]
+    return query_cache.fetchall(cursor, query + " GROUP BY s.S_ID, s.S_Name ORDER BY Total_Spent DESC", args)
+
+
+def rebuild_cost_ledger(conn, cursor):
+    """Recomputes the whole ledger from ProductIngredientBatch. Returns the number of lots."""
+    conn.begin()
+    try:
+        cursor.execute("DELETE FROM ProductLotSupplierCost")
+        cursor.execute("DELETE FROM ProductLotCost")
+        cursor.execute(f"""
+            INSERT INTO ProductLotCost ({_LEDGER_COLUMNS})
+            SELECT pb.Product_Lot_Number, pb.P_ID, pb.M_ID, pb.Production_Date, pb.Quantity,
+                   ROUND(COALESCE(SUM(pib.Quantity_Used * ib.Cost), 0), 2),
+                   ROUND(COALESCE(SUM(pib.Quantity_Used * ib.Cost), 0) / NULLIF(pb.Quantity, 0), 4)
+            FROM ProductBatch pb
+            LEFT JOIN ProductIngredientBatch pib ON pib.Product_Lot_Number = pb.Product_Lot_Number
+            LEFT JOIN IngredientBatch ib ON ib.Ingredient_Lot_Number = pib.Ingredient_Lot_Number
+            GROUP BY pb.Product_Lot_Number, pb.P_ID, pb.M_ID, pb.Production_Date, pb.Quantity
+        """)
+        lots = cursor.rowcount
+        cursor.execute("""
+            INSERT INTO ProductLotSupplierCost (Product_Lot_Number, S_ID, Cost)
+            SELECT pib.Product_Lot_Number, ib.S_ID, ROUND(SUM(pib.Quantity_Used * ib.Cost), 2)
+            FROM ProductIngredientBatch pib
+            JOIN IngredientBatch ib ON ib.Ingredient_Lot_Number = pib.Ingredient_Lot_Number
+            GROUP BY pib.Product_Lot_Number, ib.S_ID
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    query_cache.invalidate("ProductLotCost", "ProductLotSupplierCost")
+    return lots
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Maintain the product lot cost ledger")
+    add_backend_arguments(parser, config)
+    parser.add_argument("--rebuild", action="store_true", help="recompute the ledger from consumption history")
+    args = parser.parse_args(argv)
+
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            bootstrap(backend, cursor)
+            if args.rebuild:
+                lots = rebuild_cost_ledger(conn, cursor)
+                print(f"✅ Cost ledger rebuilt for {lots} product lots.")
+        finally:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Seeded synthetic data generator.
+
+Reloads an empty schema and fills it with a reproducible dataset scaled by
+the options below: manufacturers, suppliers, products per manufacturer,
+atomic and compound ingredients, formulation versions, recipe versions,
+ingredient lots and days of production history. Everything is written
+through the normal tables so the schema triggers run as they do in use:
+Inventory receipts draw down IngredientBatch, consumption rows draw down
+Inventory, and the conflict cache, cost ledger and stock ledger fill
+themselves.
+
+The generated data keeps to the rules those triggers enforce:
+  - ingredient lots expire at least 91 days out, so the whole history
+    consumes lots that are still in date;
+  - no recipe combines a DoNotCombine pair, counting the atomic
+    ingredients of every formulation version of its compounds;
+  - formulation versions of a compound never overlap;
+  - consumption is planned FEFO from what each manufacturer received.
+Compound ingredients nest one level, as FormulationIngredient only
+references atomic ingredients.
+
+The database is reloaded first, so only point it at a scratch database.
+
+Usage:
+    python src/datagen.py --backend sqlite --db bench.db --manufacturers 10 --history-days 730
+    python src/datagen.py --backend mysql --reset --seed 7
+"""
+import sys
+import random
+import argparse
+from datetime import date, timedelta
+from collections import defaultdict
+
+from allocation import plan_allocation
+from backend import add_backend_arguments, create_backend, load_config, require_scratch
+from migrations import full_reload
+from stock import take_snapshot
+
+CATEGORIES = [(1, "Dinner"), (2, "Side"), (3, "Dessert"), (4, "Other")]
+BATCH_SIZES = [50, 100, 200, 300, 500]
+
+
+class Dataset:
+    """The generated rows, built in memory before anything is written."""
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.args = args
+        self.today = date.today()
+        self.start = self.today - timedelta(days=args.history_days)
+
+    def build(self):
+        self.build_parties()
+        self.build_ingredients()
+        self.build_formulations()
+        self.build_products()
+        self.build_history()
+        self.build_lots()
+        return self
+
+    def build_parties(self):
+        a = self.args
+        self.manufacturers = [f"MFG{m:03d}" for m in range(1, a.manufacturers + 1)]
+        # Numbered from 20 like data.sql, so the fixed View Queries still find supplier 21.
+        self.suppliers = [str(20 + s) for s in range(a.suppliers)]
+        self.viewers = [f"VIEW{v:03d}" for v in range(1, a.viewers + 1)]
+
+    def build_ingredients(self):
+        a, rng = self.args, self.rng
+        self.atomics = list(range(101, 101 + a.atomic))
+        self.compounds = list(range(101 + a.atomic, 101 + a.atomic + a.compounds))
+        pairs = set()
+        while len(pairs) < min(a.conflicts, len(self.atomics) * (len(self.atomics) - 1) // 2):
+            i1, i2 = sorted(rng.sample(self.atomics, 2))
+            pairs.add((i1, i2))
+        self.do_not_combine = sorted(pairs)
+        self.conflicts_with = defaultdict(set)
+        for i1, i2 in pairs:
+            self.conflicts_with[i1].add(i2)
+            self.conflicts_with[i2].add(i1)
+        self.supplied_by = {
+            iid: rng.sample(self.suppliers, rng.randint(1, min(3, len(self.suppliers))))
+            for iid in self.atomics + self.compounds
+        }
+
+    def build_formulations(self):
+        """Consecutive, non-overlapping versions per compound; the last one is active today."""
+        a, rng = self.args, self.rng
+        self.formulations = []   # (F_ID, CI_ID, S_ID, version, start, end, price, pack)
+        self.formulation_lines = []
+        self.compound_atoms = {}
+        span = max(a.history_days // a.versions, 1)
+        f_id = 0
+        for ci in self.compounds:
+            atoms = set()
+            for version in range(1, a.versions + 1):
+                chosen = set()
+                for atom in rng.sample(self.atomics, len(self.atomics)):
+                    if len(chosen) == a.formulation_size:
+                        break
+                    if not self.conflicts_with[atom] & (chosen | atoms):
+                        chosen.add(atom)
+                f_id += 1
+                start = self.start + timedelta(days=span * (version - 1))
+                end = self.today + timedelta(days=365) if version == a.versions else start + timedelta(days=span - 1)
+                sid = rng.choice(self.supplied_by[ci])
+                self.formulations.append((f_id, ci, sid, version, start, end,
+                                          round(rng.uniform(2, 40), 2), rng.choice([1, 5, 10, 25])))
+                self.formulation_lines += [(f_id, atom, round(rng.uniform(0.1, 2.0), 2)) for atom in sorted(chosen)]
+                atoms |= chosen
+            # Conflict checks expand every version of a compound.
+            self.compound_atoms[ci] = atoms
+
+    def expand(self, iid):
+        return self.compound_atoms.get(iid, {iid})
+
+    def build_products(self):
+        a, rng = self.args, self.rng
+        self.products = []       # (P_ID, name, category, batch size, M_ID)
+        self.recipes = []        # (R_ID, P_ID, creation date)
+        self.recipe_lines = {}   # R_ID -> {I_ID: quantity per batch}
+        self.recipes_of = defaultdict(list)   # P_ID -> [(creation date, R_ID)] oldest first
+        pool = self.atomics + self.compounds
+        pid = 100
+        rid = 0
+        span = max(a.history_days // a.recipe_versions, 1)
+        for mid in self.manufacturers:
+            for _ in range(a.products):
+                self.products.append((pid, f"Product {pid}", rng.choice(CATEGORIES)[0], rng.choice(BATCH_SIZES), mid))
+                for version in range(a.recipe_versions):
+                    rid += 1
+                    lines, atoms = {}, set()
+                    for iid in rng.sample(pool, len(pool)):
+                        if len(lines) == a.recipe_size:
+                            break
+                        parts = self.expand(iid)
+                        if not any(self.conflicts_with[p] & atoms for p in parts):
+                            lines[iid] = rng.randint(1, 5)
+                            atoms |= parts
+                    created = self.start + timedelta(days=span * version)
+                    self.recipes.append((rid, pid, created))
+                    self.recipes_of[pid].append((created, rid))
+                    self.recipe_lines[rid] = lines
+                pid += 1
+
+    def recipe_on(self, pid, day):
+        """The product's latest recipe created on or before day."""
+        current = None
+        for created, rid in self.recipes_of[pid]:
+            if created > day:
+                break
+            current = rid
+        return current
+
+    def build_history(self):
+        """Product batches over the history, spread evenly with a random product each."""
+        a, rng = self.args, self.rng
+        self.batches = []        # (P_ID, M_ID, Batch_ID, R_ID, multiplier, quantity, production date, expiration)
+        self.needs = defaultdict(int)   # (M_ID, I_ID) -> units consumed over the history
+        seq = 0
+        for day_offset in range(a.history_days):
+            day = self.start + timedelta(days=day_offset)
+            for _ in range(a.batches_per_day):
+                pid, _, _, size, mid = rng.choice(self.products)
+                rid = self.recipe_on(pid, day)
+                mul = rng.randint(1, 3)
+                seq += 1
+                self.batches.append((pid, mid, f"B{seq:06d}", rid, mul, mul * size, day,
+                                     day + timedelta(days=rng.randint(30, 120))))
+                for iid, qty in self.recipe_lines[rid].items():
+                    self.needs[(mid, iid)] += qty * mul
+
+    def build_lots(self):
+        """
+        Supplier lots sized to cover what the manufacturers receive, and
+        receipts covering the history's consumption plus spare stock,
+        including --spare-batches standard batches of each product's latest
+        recipe so new batches can be made after the history.
+        """
+        a, rng = self.args, self.rng
+        needs = defaultdict(int, self.needs)
+        for pid, _, _, _, mid in self.products:
+            for iid, qty in self.recipe_lines[self.recipes_of[pid][-1][1]].items():
+                needs[(mid, iid)] += qty * a.spare_batches
+        self.ingredient_batches = []   # (I_ID, S_ID, Batch_ID, quantity, cost, expiration)
+        self.receipts = []             # (lot, I_ID, M_ID, quantity, expiration)
+        lots_of = {}
+        n = 0
+        for iid, suppliers in self.supplied_by.items():
+            lots = []
+            for sid in suppliers:
+                for _ in range(a.lots):
+                    n += 1
+                    exp = self.today + timedelta(days=rng.randint(91, 540))
+                    lots.append([f"{iid}-{sid}-L{n:06d}", sid, f"L{n:06d}", 0, round(rng.uniform(0.2, 15), 2), exp])
+            lots_of[iid] = lots
+        for (mid, iid), need in sorted(needs.items()):
+            total = int(need * rng.uniform(1.1, 1.5)) + 10
+            lots = rng.sample(lots_of[iid], min(len(lots_of[iid]), rng.randint(1, 3)))
+            shares = [total // len(lots)] * len(lots)
+            shares[0] += total - sum(shares)
+            for lot, qty in zip(lots, shares):
+                lot[3] += qty
+                self.receipts.append((lot[0], iid, mid, qty, lot[5]))
+        for iid, lots in lots_of.items():
+            for lotno, sid, bid, received, cost, exp in lots:
+                spare = rng.randint(0, 500)
+                self.ingredient_batches.append((iid, sid, bid, received + spare, cost, exp))
+
+
+def write(conn, cursor, data, chunk=500):
+    """Writes the dataset parents-first, one transaction per table or history chunk."""
+
+    def insert(sql, rows):
+        conn.begin()
+        try:
+            for i in range(0, len(rows), chunk):
+                cursor.executemany(sql, rows[i:i + chunk])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    insert("INSERT INTO Category (Category_ID, Cat_Name) VALUES (%s, %s)", CATEGORIES)
+    insert("INSERT INTO Manufacturer (M_ID, M_Name) VALUES (%s, %s)", [(m, f"Manufacturer {m}") for m in data.manufacturers])
+    insert("INSERT INTO Supplier (S_ID, S_Name) VALUES (%s, %s)", [(s, f"Supplier {s}") for s in data.suppliers])
+    insert("INSERT INTO Viewer (V_ID, V_Name) VALUES (%s, %s)", [(v, f"Viewer {v}") for v in data.viewers])
+    insert("INSERT INTO Ingredient (I_ID, I_Name, I_Type) VALUES (%s, %s, %s)",
+           [(i, f"Atomic {i}", "Atomic") for i in data.atomics] + [(i, f"Compound {i}", "Compound") for i in data.compounds])
+    insert("INSERT INTO SupplierSuppliesIngredient (S_ID, I_ID) VALUES (%s, %s)",
+           [(sid, iid) for iid, sids in data.supplied_by.items() for sid in sids])
+    insert("INSERT INTO DoNotCombine (I_ID1, I_ID2) VALUES (%s, %s)", data.do_not_combine)
+    insert("INSERT INTO Formulation (F_ID, CI_ID, S_ID, Version_No, Eff_Start_Date, Eff_End_Date, Unit_Price, Pack_Size) "
+           "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", data.formulations)
+    insert("INSERT INTO FormulationIngredient (F_ID, AI_ID, Quantity) VALUES (%s, %s, %s)", data.formulation_lines)
+    insert("INSERT INTO Product (P_ID, P_Name, Category_ID, Standard_Batch_Size, M_ID) VALUES (%s, %s, %s, %s, %s)",
+           data.products)
+    insert("INSERT INTO Recipe (R_ID, P_ID, Creation_Date) VALUES (%s, %s, %s)", data.recipes)
+    insert("INSERT INTO RecipeUsesIngredient (R_ID, I_ID, Quantity) VALUES (%s, %s, %s)",
+           [(rid, iid, qty) for rid, lines in data.recipe_lines.items() for iid, qty in lines.items()])
+    insert("INSERT INTO IngredientBatch (I_ID, S_ID, Batch_ID, Quantity, Cost, Expiration_Date) VALUES (%s, %s, %s, %s, %s, %s)",
+           data.ingredient_batches)
+    insert("INSERT INTO Inventory (Ingredient_Lot_Number, I_ID, M_ID, Quantity, Expiration_Date) VALUES (%s, %s, %s, %s, %s)",
+           data.receipts)
+
+    # Consumption is planned FEFO from the receipts, batch by batch.
+    lots = defaultdict(list)
+    for lotno, iid, mid, qty, exp in data.receipts:
+        lots[(mid, iid)].append([lotno, qty, exp])
+    for held in lots.values():
+        held.sort(key=lambda lot: lot[2])
+    consumed = 0
+    for i in range(0, len(data.batches), chunk):
+        batches, consumption = [], []
+        for pid, mid, bid, rid, mul, quantity, made, expires in data.batches[i:i + chunk]:
+            requirements = data.recipe_lines[rid]
+            held = {iid: [tuple(lot) for lot in lots[(mid, iid)] if lot[1] > 0] for iid in requirements}
+            plan, shortages = plan_allocation(requirements, held, mul)
+            if shortages:
+                raise RuntimeError(f"generator under-supplied {mid} for batch {bid}: {shortages}")
+            plot = f"{pid}-{mid}-{bid}"
+            for iid, lotno, qty, _ in plan:
+                consumption.append((plot, mid, lotno, qty))
+                for lot in lots[(mid, iid)]:
+                    if lot[0] == lotno:
+                        lot[1] -= qty
+            batches.append((pid, mid, bid, rid, quantity, made, expires))
+        conn.begin()
+        try:
+            cursor.executemany(
+                "INSERT INTO ProductBatch (P_ID, M_ID, Batch_ID, R_ID, Quantity, Production_Date, Expiration_Date) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)", batches)
+            cursor.executemany(
+                "INSERT INTO ProductIngredientBatch (Product_Lot_Number, M_ID, Ingredient_Lot_Number, Quantity_Used) "
+                "VALUES (%s, %s, %s, %s)", consumption)
+            conn.commit()
+            consumed += len(consumption)
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Ship most of every batch older than a week, then snapshot the balances.
+    shipments = [
+        (f"{pid}-{mid}-{bid}", pid, mid, -int(quantity * data.rng.uniform(0.6, 1.0)), made + timedelta(days=7))
+        for pid, mid, bid, _, _, quantity, made, _ in data.batches
+        if made <= data.today - timedelta(days=7)
+    ]
+    insert("INSERT INTO ProductStockMovement (Product_Lot_Number, P_ID, M_ID, Movement_Type, Quantity, Moved_At) "
+           "VALUES (%s, %s, %s, 'shipped', %s, %s)", shipments)
+    take_snapshot(conn, cursor)
+    return {
+        "manufacturers": len(data.manufacturers),
+        "suppliers": len(data.suppliers),
+        "ingredients": len(data.atomics) + len(data.compounds),
+        "products": len(data.products),
+        "recipes": len(data.recipes),
+        "ingredient lots": len(data.ingredient_batches),
+        "inventory rows": len(data.receipts),
+        "product batches": len(data.batches),
+        "consumption rows": consumed,
+    }
+
+
+def add_scale_arguments(parser):
+    parser.add_argument("--seed", type=int, default=540, help="random seed (same seed, same data)")
+    parser.add_argument("--manufacturers", type=int, default=5)
+    parser.add_argument("--suppliers", type=int, default=10)
+    parser.add_argument("--viewers", type=int, default=3)
+    parser.add_argument("--products", type=int, default=20, help="products per manufacturer")
+    parser.add_argument("--atomic", type=int, default=200, help="atomic ingredients")
+    parser.add_argument("--compounds", type=int, default=40, help="compound ingredients")
+    parser.add_argument("--formulation-size", type=int, default=6, help="atomic ingredients per formulation version")
+    parser.add_argument("--versions", type=int, default=3, help="formulation versions per compound")
+    parser.add_argument("--recipe-size", type=int, default=8, help="ingredients per recipe")
+    parser.add_argument("--recipe-versions", type=int, default=2, help="recipes per product over the history")
+    parser.add_argument("--conflicts", type=int, default=30, help="DoNotCombine pairs")
+    parser.add_argument("--lots", type=int, default=4, help="lots per supplied ingredient and supplier")
+    parser.add_argument("--history-days", type=int, default=365)
+    parser.add_argument("--batches-per-day", type=int, default=10)
+    parser.add_argument("--spare-batches", type=int, default=50,
+                        help="standard batches of each product's latest recipe left in stock after the history")
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Fill a scratch database with seeded synthetic data")
+    add_backend_arguments(parser, config)
+    add_scale_arguments(parser)
+    parser.add_argument("--reset", action="store_true",
+                        help="allow reloading the configured database (MySQL, or sqlite_path without --db)")
+    args = parser.parse_args(argv)
+    require_scratch(parser, args, config, "the generator reloads the schema")
+
+    data = Dataset(args).build()
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            full_reload(backend, cursor, data=False)
+            counts = write(conn, cursor, data)
+        finally:
+            conn.close()
+
+    print(", ".join(f"{n} {name}" for name, n in counts.items()))
+    print(f"✅ Generated seed {args.seed} over {args.history_days} days of history.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
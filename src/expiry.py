@@ -0,0 +1,174 @@
+"""
+Expiry calendar.
+
+Keeps every stocked lot in a bucket per expiration day, with the bucket
+days in a sorted list, so "what expires within N days" is a bisect plus a
+scan over the buckets in range, for any horizon and any set of owners.
+Three kinds of lots are tracked:
+
+  - inventory:         ingredient lots held by a manufacturer (owner M_ID)
+  - ingredient_batch:  supplier IngredientBatch stock (owner S_ID)
+  - product_batch:     ProductBatch lots (owner M_ID)
+
+Like the FEFO index it loads once and is updated by the role actions after
+each successful write; a failed write resets it.
+
+Usage:
+    python src/expiry.py --backend sqlite --db pmim.db --days 30
+    python src/expiry.py --days 10 --owner MFG001 --owner MFG002 --kind inventory
+"""
+import sys
+import json
+import bisect
+import argparse
+import threading
+from datetime import date, timedelta
+from contextlib import redirect_stdout
+
+from backend import add_backend_arguments, create_backend, load_config
+from lot_index import as_date
+from migrations import bootstrap
+
+KINDS = ("inventory", "ingredient_batch", "product_batch")
+
+
+class ExpiryCalendar:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def reset(self):
+        with self._lock:
+            self.loaded = False
+
+    def ensure_loaded(self, cursor):
+        with self._lock:
+            if self.loaded:
+                return self
+            self._entries = {}   # (kind, lot, M_ID or None) -> [expiration, quantity, owner]
+            self._buckets = {}   # expiration -> set of entry keys
+            self._days = []      # sorted bucket days
+            cursor.execute("""
+                SELECT Ingredient_Lot_Number, M_ID, Quantity, Expiration_Date
+                FROM Inventory WHERE Expiration_Date IS NOT NULL
+            """)
+            for lotno, mid, qty, exp in cursor.fetchall():
+                self._add("inventory", lotno, mid, mid, qty, exp)
+            cursor.execute("SELECT Ingredient_Lot_Number, S_ID, Quantity, Expiration_Date FROM IngredientBatch")
+            for lotno, sid, qty, exp in cursor.fetchall():
+                self._add("ingredient_batch", lotno, None, sid, qty, exp)
+            # Product lots hold what the stock ledger says is left after shipments.
+            cursor.execute("""
+                SELECT pb.Product_Lot_Number, pb.M_ID, SUM(mv.Quantity), pb.Expiration_Date
+                FROM ProductBatch pb
+                JOIN ProductStockMovement mv ON mv.Product_Lot_Number = pb.Product_Lot_Number
+                GROUP BY pb.Product_Lot_Number, pb.M_ID, pb.Expiration_Date
+            """)
+            for plot, mid, qty, exp in cursor.fetchall():
+                self._add("product_batch", plot, None, mid, qty, exp)
+            self.loaded = True
+            return self
+
+    def _add(self, kind, lotno, holder, owner, qty, exp):
+        key = (kind, lotno, holder)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] += qty
+            return
+        exp = as_date(exp)
+        self._entries[key] = [exp, qty, owner]
+        bucket = self._buckets.get(exp)
+        if bucket is None:
+            bucket = self._buckets[exp] = set()
+            bisect.insort(self._days, exp)
+        bucket.add(key)
+
+    def _take(self, kind, lotno, holder, qty):
+        entry = self._entries.get((kind, lotno, holder))
+        if entry is not None:
+            entry[1] -= qty
+
+    def expiring(self, days, owners=None, kinds=KINDS, today=None, include_expired=False):
+        """
+        Stocked lots expiring on or before today + days, earliest first, as
+        (expiration, kind, lot, owner, quantity). owners limits the result
+        to those M_IDs/S_IDs; include_expired also returns lots already past.
+        """
+        today = today or date.today()
+        owners = set(owners) if owners else None
+        kinds = set(kinds)
+        with self._lock:
+            lo = 0 if include_expired else bisect.bisect_left(self._days, today)
+            hi = bisect.bisect_right(self._days, today + timedelta(days=days))
+            result = []
+            for day in self._days[lo:hi]:
+                for key in sorted(self._buckets[day]):
+                    kind, lotno, _ = key
+                    _, qty, owner = self._entries[key]
+                    if qty > 0 and kind in kinds and (owners is None or owner in owners):
+                        result.append((day, kind, lotno, owner, qty))
+            return result
+
+    # --- incremental maintenance, called after a successful commit ---
+
+    def record_new_batch(self, sid, lotno, qty, exp):
+        with self._lock:
+            if self.loaded:
+                self._add("ingredient_batch", lotno, None, sid, qty, exp)
+
+    def record_receipt(self, mid, lotno, qty, exp):
+        with self._lock:
+            if self.loaded:
+                self._take("ingredient_batch", lotno, None, qty)
+                self._add("inventory", lotno, mid, mid, qty, exp)
+
+    def record_consumption(self, mid, plot, quantity, exp_date, plan):
+        """plan rows are (I_ID, lot, qty, exp) as produced by allocation.plan_allocation."""
+        with self._lock:
+            if self.loaded:
+                self._add("product_batch", plot, None, mid, quantity, exp_date)
+                for _, lotno, qty, _ in plan:
+                    self._take("inventory", lotno, mid, qty)
+
+    def record_product_movement(self, plot, delta):
+        """delta is the signed quantity of a stock ledger movement."""
+        with self._lock:
+            if self.loaded:
+                self._take("product_batch", plot, None, -delta)
+
+
+# Reset with fefo_index when a receipt or allocation fails. Stock movements
+# and new ingredient batches only record after their commit succeeds.
+expiry_calendar = ExpiryCalendar()
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="List lots expiring within a horizon")
+    add_backend_arguments(parser, config)
+    parser.add_argument("--days", type=int, default=10, help="horizon in days (default: 10)")
+    parser.add_argument("--owner", action="append", default=[], help="M_ID or S_ID to include (repeatable; default: all)")
+    parser.add_argument("--kind", action="append", choices=KINDS, default=[], help="lot kind to include (repeatable; default: all)")
+    parser.add_argument("--include-expired", action="store_true", help="also list lots already past expiration")
+    args = parser.parse_args(argv)
+
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            # Keep stdout clean for the JSONL results.
+            with redirect_stdout(sys.stderr):
+                bootstrap(backend, cursor)
+            calendar = expiry_calendar.ensure_loaded(cursor)
+        finally:
+            conn.close()
+
+    rows = calendar.expiring(args.days, args.owner, args.kind or KINDS, include_expired=args.include_expired)
+    for exp, kind, lotno, owner, qty in rows:
+        print(json.dumps({"Expiration_Date": exp.isoformat(), "kind": kind, "lot": lotno, "owner": owner, "Quantity": qty}))
+    print(f"✅ {len(rows)} lots expire within {args.days} days", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
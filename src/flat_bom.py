@@ -0,0 +1,249 @@
+"""
+Materialized flattened BOM (migration 008).
+
+ProductBOM holds ProductBOMView's product to ingredient quantities, one
+row per ingredient (the view lists an atomic ingredient twice when a
+recipe uses it both directly and inside a compound; the table holds the
+sum). Like the view, quantities are per standard batch and summed over
+every recipe version of a product, the rule bom.py also follows for the
+Product Ingredient List. Planners read a keyed
+table instead of recomputing the view's grouped joins on every query. ProductBOMFreshness says which products'
+rows are current:
+
+  - The triggers on Recipe, RecipeUsesIngredient, Formulation and
+    FormulationIngredient delete the freshness rows of the products a
+    write affects.
+  - The view expands compounds through the formulation in effect today,
+    so a product's rows also go stale on their own when one of its
+    compounds' formulations starts or ends. Valid_Through records the
+    last day they hold.
+
+Readers call bom_rows(), which first refreshes the stale products it is
+asked for (one INSERT ... SELECT from the view per chunk) and then reads
+the table. rebuild() recomputes everything.
+
+Usage:
+    python src/flat_bom.py --backend sqlite --db pmim.db --status
+    python src/flat_bom.py --db pmim.db --refresh
+    python src/flat_bom.py --db pmim.db --rebuild
+    python src/flat_bom.py --db pmim.db --product 1 --product 2
+"""
+import sys
+import argparse
+from datetime import date, datetime, timedelta
+
+from backend import add_backend_arguments, create_backend, load_config
+from lot_index import as_date
+from migrations import bootstrap
+from render import render_table
+
+# Products refreshed per statement, keeping IN lists short.
+REFRESH_CHUNK = 500
+
+BOM_HEADERS = ["P_ID", "Product", "I_ID", "Ingredient", "Total Quantity"]
+
+_READ = """
+    SELECT b.P_ID, p.P_Name, b.I_ID, i.I_Name, b.Total_Quantity
+    FROM ProductBOM b
+    JOIN Product p ON p.P_ID = b.P_ID
+    JOIN Ingredient i ON i.I_ID = b.I_ID
+    {where}
+    ORDER BY b.P_ID, b.Total_Quantity DESC, b.I_ID
+"""
+
+# Next formulation start after today and earliest end from today on, per
+# product, over every formulation of the compounds in its recipes.
+_BOUNDARIES = """
+    SELECT r.P_ID,
+           MIN(CASE WHEN f.Eff_Start_Date > %s THEN f.Eff_Start_Date END),
+           MIN(CASE WHEN f.Eff_End_Date >= %s THEN f.Eff_End_Date END)
+    FROM Recipe r
+    JOIN RecipeUsesIngredient rui ON rui.R_ID = r.R_ID
+    JOIN Formulation f ON f.CI_ID = rui.I_ID
+    {where}
+    GROUP BY r.P_ID
+"""
+
+
+def _chunks(ids, size=REFRESH_CHUNK):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield tuple(ids[i:i + size])
+
+
+def _valid_through(next_start, first_end):
+    """Last day the view's rows stay the same without a write, or None."""
+    days = []
+    if next_start is not None:
+        days.append(as_date(next_start) - timedelta(days=1))
+    if first_end is not None:
+        days.append(as_date(first_end))
+    return min(days, default=None)
+
+
+def _write_freshness(cursor, pids, today, where, args):
+    cursor.execute(_BOUNDARIES.format(where=where), (today, today, *args))
+    bounds = {pid: _valid_through(start, end) for pid, start, end in cursor.fetchall()}
+    now = datetime.now().replace(microsecond=0)
+    cursor.executemany(
+        "INSERT INTO ProductBOMFreshness (P_ID, Refreshed_At, Valid_Through) VALUES (%s, %s, %s)",
+        [(pid, now, bounds.get(pid)) for pid in pids]
+    )
+
+
+def stale_products(cursor, pids=None, today=None):
+    """P_IDs, among pids or all products, whose ProductBOM rows are missing or out of date."""
+    today = today or date.today()
+    sql = """
+        SELECT p.P_ID
+        FROM Product p
+        LEFT JOIN ProductBOMFreshness fr ON fr.P_ID = p.P_ID
+        WHERE (fr.P_ID IS NULL OR fr.Valid_Through < %s)
+    """
+    if pids is None:
+        cursor.execute(sql, (today,))
+        return [row[0] for row in cursor.fetchall()]
+    stale = []
+    for chunk in _chunks(set(pids)):
+        cursor.execute(sql + " AND p.P_ID IN %s", (today, chunk))
+        stale.extend(row[0] for row in cursor.fetchall())
+    return stale
+
+
+def refresh_products(cursor, pids, today=None):
+    """Recomputes the ProductBOM rows of pids from the view, in one transaction. Returns the product count."""
+    today = today or date.today()
+    pids = sorted(set(pids))
+    if not pids:
+        return 0
+    conn = cursor.connection
+    conn.begin()
+    try:
+        for chunk in _chunks(pids):
+            # Freshness rows go first, so a concurrent trigger marking one of
+            # these products stale waits for this refresh and wins after it.
+            cursor.execute("DELETE FROM ProductBOMFreshness WHERE P_ID IN %s", (chunk,))
+            cursor.execute("DELETE FROM ProductBOM WHERE P_ID IN %s", (chunk,))
+            cursor.execute("""
+                INSERT INTO ProductBOM (P_ID, I_ID, Total_Quantity)
+                SELECT P_ID, I_ID, SUM(Total_Quantity) FROM ProductBOMView WHERE P_ID IN %s GROUP BY P_ID, I_ID
+            """, (chunk,))
+            _write_freshness(cursor, chunk, today, "WHERE r.P_ID IN %s", (chunk,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(pids)
+
+
+def refresh_stale(cursor, pids=None, today=None):
+    """Refreshes only the stale products among pids (default: all). Returns the number refreshed."""
+    return refresh_products(cursor, stale_products(cursor, pids, today), today)
+
+
+def rebuild(cursor, today=None):
+    """Recomputes the whole table from the view. Returns the product count."""
+    today = today or date.today()
+    conn = cursor.connection
+    conn.begin()
+    try:
+        cursor.execute("DELETE FROM ProductBOMFreshness")
+        cursor.execute("DELETE FROM ProductBOM")
+        cursor.execute("""
+            INSERT INTO ProductBOM (P_ID, I_ID, Total_Quantity)
+            SELECT P_ID, I_ID, SUM(Total_Quantity) FROM ProductBOMView GROUP BY P_ID, I_ID
+        """)
+        cursor.execute("SELECT P_ID FROM Product")
+        pids = [row[0] for row in cursor.fetchall()]
+        _write_freshness(cursor, pids, today, "", ())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(pids)
+
+
+def bom_rows(cursor, pids=None):
+    """
+    (P_ID, P_Name, I_ID, I_Name, Total_Quantity) rows, ProductBOMView's
+    columns, for pids or every product, largest quantity first within a
+    product. Stale products are refreshed before reading.
+    """
+    refresh_stale(cursor, pids)
+    if pids is None:
+        cursor.execute(_READ.format(where=""))
+        return cursor.fetchall()
+    rows = []
+    for chunk in _chunks(sorted(set(pids))):
+        cursor.execute(_READ.format(where="WHERE b.P_ID IN %s"), (chunk,))
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def product_bom(cursor, pid):
+    """{I_ID: Total_Quantity} for one product."""
+    return {iid: qty for _, _, iid, _, qty in bom_rows(cursor, [pid])}
+
+
+def manufacturer_bom_rows(cursor, mid):
+    """bom_rows for every product of one manufacturer."""
+    cursor.execute("SELECT P_ID FROM Product WHERE M_ID = %s", (mid,))
+    pids = [row[0] for row in cursor.fetchall()]
+    return bom_rows(cursor, pids) if pids else []
+
+
+def freshness(cursor, today=None):
+    """Counts of fresh, stale and never-built products, and the oldest refresh time."""
+    today = today or date.today()
+    cursor.execute("""
+        SELECT
+            COUNT(*),
+            SUM(CASE WHEN fr.P_ID IS NULL THEN 1 ELSE 0 END),
+            SUM(CASE WHEN fr.Valid_Through < %s THEN 1 ELSE 0 END),
+            MIN(fr.Refreshed_At)
+        FROM Product p
+        LEFT JOIN ProductBOMFreshness fr ON fr.P_ID = p.P_ID
+    """, (today,))
+    total, missing, expired, oldest = cursor.fetchone()
+    missing, expired = missing or 0, expired or 0
+    return {
+        "products": total,
+        "fresh": total - missing - expired,
+        "stale": missing + expired,
+        "expired": expired,
+        "oldest_refresh": oldest,
+    }
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Refresh, rebuild or read the materialized flattened BOM")
+    add_backend_arguments(parser, config)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="show how many products are fresh or stale (default)")
+    group.add_argument("--refresh", action="store_true", help="refresh the stale products only")
+    group.add_argument("--rebuild", action="store_true", help="recompute every product from ProductBOMView")
+    group.add_argument("--product", type=int, action="append", default=[], help="print one product's BOM (repeatable)")
+    args = parser.parse_args(argv)
+
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            bootstrap(backend, cursor)
+            if args.rebuild:
+                print(f"✅ Rebuilt the flattened BOM for {rebuild(cursor)} products.")
+            elif args.refresh:
+                print(f"✅ Refreshed {refresh_stale(cursor)} stale products.")
+            elif args.product:
+                render_table(bom_rows(cursor, args.product), BOM_HEADERS, empty="No BOM rows for those products.")
+            status = freshness(cursor)
+            print(f"{status['products']} products: {status['fresh']} fresh, {status['stale']} stale "
+                  f"({status['expired']} past their formulation dates); oldest refresh {status['oldest_refresh']}")
+        finally:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Interval index of formulation effective dates.
+
+Each (CI_ID, S_ID) holds disjoint [Eff_Start_Date, Eff_End_Date] ranges
+(check_overlap enforces that). They are kept sorted by start date, so the
+formulation in effect at a date, and the range a new one would overlap,
+are each found by one bisect: the only candidate is the last range
+starting on or before the date (or the new range's end). As-of lookups
+work for any date, past or future.
+
+The index loads once (one query) and is then updated by the supplier
+actions after each successful write. If a write fails, callers reset it.
+validate() checks a whole upload of new formulations against the index
+and against each other in one sorted pass, before anything is written.
+
+bulk_import.py runs validate() over Formulation files before loading them
+(--check validates without loading).
+
+Usage:
+    python src/formulation_index.py --backend sqlite --db pmim.db --as-of 2024-06-01
+    python src/formulation_index.py --db pmim.db --as-of 2023-01-15 --supplier 21
+"""
+import sys
+import argparse
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+
+from backend import add_backend_arguments, create_backend, load_config
+from lot_index import as_date
+from migrations import bootstrap
+from render import render_table
+
+Formulation = namedtuple("Formulation", "F_ID CI_ID S_ID Version_No start end Unit_Price Pack_Size")
+
+
+class Ranges:
+    """Disjoint ranges of one (CI_ID, S_ID), sorted by start date."""
+
+    def __init__(self):
+        self.starts = []
+        self.entries = []
+
+    def add(self, entry):
+        i = bisect_right(self.starts, entry.start)
+        self.starts.insert(i, entry.start)
+        self.entries.insert(i, entry)
+
+    def at(self, day):
+        """Range containing day, or None."""
+        i = bisect_right(self.starts, day) - 1
+        if i >= 0 and self.entries[i].end >= day:
+            return self.entries[i]
+        return None
+
+    def overlapping(self, start, end):
+        """A range sharing a day with [start, end], or None."""
+        i = bisect_right(self.starts, end) - 1
+        if i >= 0 and self.entries[i].end >= start:
+            return self.entries[i]
+        return None
+
+
+class FormulationIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self._ranges = {}      # (CI_ID, S_ID) -> Ranges
+        self._versions = {}    # CI_ID -> set of Version_No (unique per compound)
+
+    def reset(self):
+        with self._lock:
+            self.loaded = False
+            self._ranges = {}
+            self._versions = {}
+
+    def ensure_loaded(self, cursor):
+        with self._lock:
+            if self.loaded:
+                return self
+            cursor.execute("""
+                SELECT F_ID, CI_ID, S_ID, Version_No, Eff_Start_Date, Eff_End_Date, Unit_Price, Pack_Size
+                FROM Formulation
+            """)
+            for row in cursor.fetchall():
+                self._add(Formulation(row[0], row[1], str(row[2]), row[3], as_date(row[4]), as_date(row[5]),
+                                      row[6], row[7]))
+            self.loaded = True
+            return self
+
+    def _add(self, entry):
+        self._ranges.setdefault((entry.CI_ID, entry.S_ID), Ranges()).add(entry)
+        self._versions.setdefault(entry.CI_ID, set()).add(entry.Version_No)
+
+    # --- lookups ---
+
+    def active(self, ci, sid, as_of):
+        """The supplier's formulation of a compound in effect on as_of, or None."""
+        with self._lock:
+            ranges = self._ranges.get((int(ci), str(sid)))
+            return ranges.at(as_date(as_of)) if ranges else None
+
+    def active_for(self, sid=None, as_of=None):
+        """Formulations in effect on as_of, for one supplier or all, ordered by (CI_ID, S_ID)."""
+        day = as_date(as_of)
+        with self._lock:
+            found = [ranges.at(day) for (ci, s), ranges in self._ranges.items() if sid is None or s == str(sid)]
+        return sorted((f for f in found if f is not None), key=lambda f: (f.CI_ID, f.S_ID))
+
+    def overlapping(self, ci, sid, start, end):
+        """The existing formulation whose range shares a day with [start, end], or None."""
+        with self._lock:
+            ranges = self._ranges.get((int(ci), str(sid)))
+            return ranges.overlapping(as_date(start), as_date(end)) if ranges else None
+
+    def versions(self, ci, sid):
+        """The supplier's formulations of a compound, newest version first."""
+        with self._lock:
+            ranges = self._ranges.get((int(ci), str(sid)))
+            return sorted(ranges.entries if ranges else [], key=lambda f: -f.Version_No)
+
+    def next_version(self, ci):
+        """Version_No for a new formulation of ci; versions are unique per compound across suppliers."""
+        with self._lock:
+            return max(self._versions.get(int(ci), ()), default=0) + 1
+
+    def validate(self, rows):
+        """
+        Checks new formulations before they are written. rows are mappings
+        with CI_ID, S_ID, Eff_Start_Date, Eff_End_Date and optionally
+        Version_No. The rows are sorted once by (CI_ID, S_ID, start); each
+        is then checked against the previous new row of the same pair and
+        against the index by bisect. Returns [(row number, message)], empty
+        if the whole upload can be written.
+        """
+        errors = []
+        parsed = []
+        for n, row in enumerate(rows, 1):
+            try:
+                start, end = as_date(row["Eff_Start_Date"]), as_date(row["Eff_End_Date"])
+                key = (int(row["CI_ID"]), str(row["S_ID"]))
+                version = int(row["Version_No"]) if row.get("Version_No") not in (None, "") else None
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append((n, f"unreadable row: {e}"))
+                continue
+            if start > end:
+                errors.append((n, f"ends ({end}) before it starts ({start})"))
+                continue
+            parsed.append((key, start, end, version, n))
+
+        seen_versions = {}
+        previous = {}
+        with self._lock:
+            for key, start, end, version, n in sorted(parsed):
+                ci, sid = key
+                existing = self._ranges.get(key)
+                clash = existing.overlapping(start, end) if existing else None
+                if clash is not None:
+                    errors.append((n, f"overlaps F_ID {clash.F_ID} ({clash.start} to {clash.end}) "
+                                      f"for compound {ci}, supplier {sid}"))
+                prior = previous.get(key)
+                if prior is not None and prior[1] >= start:
+                    errors.append((n, f"overlaps row {prior[2]} ({prior[0]} to {prior[1]}) in this upload"))
+                if prior is None or end > prior[1]:
+                    previous[key] = (start, end, n)
+                if version is not None:
+                    if version in self._versions.get(ci, ()):
+                        errors.append((n, f"version {version} already exists for compound {ci}"))
+                    elif (ci, version) in seen_versions:
+                        errors.append((n, f"version {version} repeats row {seen_versions[(ci, version)]}"))
+                    seen_versions.setdefault((ci, version), n)
+        return sorted(errors)
+
+    # --- incremental maintenance, called after a successful write ---
+
+    def record_formulation(self, fid, ci, sid, version, start, end, price, pack):
+        with self._lock:
+            if self.loaded:
+                self._add(Formulation(fid, int(ci), str(sid), int(version), as_date(start), as_date(end), price, pack))
+
+
+# A failed formulation write resets it. bulk_import also resets it after a
+# load, as imported rows bypass record_formulation.
+formulation_index = FormulationIndex()
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="List the formulations in effect on a date")
+    add_backend_arguments(parser, config)
+    parser.add_argument("--as-of", required=True, metavar="YYYY-MM-DD", help="any date, past or future")
+    parser.add_argument("--supplier", default=None, help="only this S_ID")
+    args = parser.parse_args(argv)
+
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            bootstrap(backend, cursor)
+            index = formulation_index.ensure_loaded(cursor)
+        finally:
+            conn.close()
+
+    render_table(
+        ((f.CI_ID, f.S_ID, f.Version_No, f.start, f.end, f.Unit_Price, f.Pack_Size, f.F_ID)
+         for f in index.active_for(args.supplier, args.as_of)),
+        ["CI_ID", "S_ID", "Version", "Start", "End", "Price", "Pack Size", "F_ID"],
+        empty=f"No formulations in effect on {args.as_of}."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
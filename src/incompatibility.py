@@ -0,0 +1,105 @@
+"""
+All-pairs product incompatibility matrix.
+
+Every ingredient that appears in DoNotCombine gets a bit. A product is the
+bitset of those ingredients in its flattened BOM, and DoNotCombine is kept
+as a symmetric adjacency row per ingredient. For each ingredient there is
+also a bitset of the products that contain it, so a product's conflicting
+partners come from OR-ing those rows instead of comparing every pair.
+"""
+from render import export_rows
+
+
+def bits(mask):
+    """Indexes of the set bits of an int, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class IncompatibilityMatrix:
+    def __init__(self, engine, product_ids):
+        self.engine = engine
+        self.products = list(product_ids)
+
+        self.ingredients = sorted({i for pair in engine.do_not_combine for i in pair})
+        bit_of = {iid: b for b, iid in enumerate(self.ingredients)}
+
+        # Symmetric adjacency: conflicts[b] has a bit for every ingredient b must not meet.
+        self.conflicts = [0] * len(self.ingredients)
+        for a, b in engine.do_not_combine:
+            self.conflicts[bit_of[a]] |= 1 << bit_of[b]
+            self.conflicts[bit_of[b]] |= 1 << bit_of[a]
+
+        # Product rows and, per ingredient, the products that contain it.
+        self.masks = []
+        self.holders = [0] * len(self.ingredients)
+        for p, pid in enumerate(self.products):
+            mask = 0
+            for iid in engine.product_ingredients(pid):
+                b = bit_of.get(iid)
+                if b is not None:
+                    mask |= 1 << b
+                    self.holders[b] |= 1 << p
+            self.masks.append(mask)
+
+    def reach(self, mask):
+        """Every ingredient that conflicts with some ingredient in mask."""
+        result = 0
+        for b in bits(mask):
+            result |= self.conflicts[b]
+        return result
+
+    def offending_pairs(self, mask1, mask2):
+        """(I_ID from the first product, I_ID from the second) pairs that must not be combined."""
+        pairs = []
+        for b in bits(mask1):
+            for c in bits(self.conflicts[b] & mask2):
+                pairs.append((self.ingredients[b], self.ingredients[c]))
+        return pairs
+
+    def internal_conflicts(self):
+        """[(P_ID, [(I_ID1, I_ID2)])] for products that conflict with themselves."""
+        result = []
+        for pid, mask in zip(self.products, self.masks):
+            pairs = [(a, b) for a, b in self.offending_pairs(mask, mask) if a < b]
+            if pairs:
+                result.append((pid, pairs))
+        return result
+
+    def conflicting_pairs(self):
+        """
+        [(P_ID1, P_ID2, [(I_ID1, I_ID2)])] for every pair of distinct products
+        whose ingredients conflict with each other, in catalog order.
+        """
+        result = []
+        for p, mask in enumerate(self.masks):
+            partners = 0
+            for b in bits(self.reach(mask)):
+                partners |= self.holders[b]
+            partners >>= p + 1
+            for offset in bits(partners):
+                q = p + 1 + offset
+                result.append((self.products[p], self.products[q],
+                               self.offending_pairs(mask, self.masks[q])))
+        return result
+
+
+def build_matrix(cursor, engine):
+    """Matrix over every product that has a recipe."""
+    engine.ensure_loaded(cursor)
+    return IncompatibilityMatrix(engine, sorted(engine.recipes_of))
+
+
+EXPORT_FIELDS = ["P_ID1", "P_ID2", "I_ID1", "I_Name1", "I_ID2", "I_Name2"]
+
+
+def export_pairs(pairs, names, path):
+    """Writes one row per offending ingredient pair as .csv or .jsonl. Returns the row count."""
+    rows = (
+        [p1, p2, i1, names[i1], i2, names[i2]]
+        for p1, p2, ingredient_pairs in pairs
+        for i1, i2 in ingredient_pairs
+    )
+    return export_rows(rows, EXPORT_FIELDS, path)
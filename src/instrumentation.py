@@ -0,0 +1,369 @@
+"""
+Statement instrumentation.
+
+InstrumentedBackend wraps a backend so every connection it hands out, and
+every cursor on those connections, reports to the process-wide
+`instruments`. Statements are normalized (literals and placeholders become
+?, IN lists collapse to one ?, whitespace is folded) and, for each one, it
+keeps:
+  - calls and errors;
+  - a latency histogram of the execute calls;
+  - total time, including the fetches that follow (unbuffered cursors do
+    their network reads there);
+  - rows fetched, or rows affected for writes;
+  - estimated bytes sent (statement plus parameters) and received (result values).
+
+Work done inside `instruments.action(name)` is also counted per action:
+runs, round trips and calls per statement. A statement called many times
+in one run of an action is the N+1 pattern this is meant to find.
+Query cache hits never reach a cursor and are not counted.
+"""
+import re
+import json
+import time
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Calls per action run at which a statement is reported as a likely N+1.
+N_PLUS_ONE_CALLS = 10
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize(sql):
+    """Statement text with literals and parameters replaced by ?."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def _value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    return 8
+
+
+def _args_size(args):
+    if args is None:
+        return 0
+    if isinstance(args, dict):
+        args = args.values()
+    elif not isinstance(args, (tuple, list)):
+        return _value_size(args)
+    return sum(_args_size(a) if isinstance(a, (tuple, list, set, frozenset)) else _value_size(a) for a in args)
+
+
+def _rows_size(rows):
+    return sum(_value_size(cell) for row in rows for cell in row)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (inf for the open bucket)."""
+        total = sum(self.counts)
+        if not total:
+            return 0.0
+        rank = total * p / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+    def as_dict(self):
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {label: n for label, n in zip(labels, self.counts) if n}
+
+
+class StatementStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.histogram = Histogram()
+        self.rows = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": self.histogram.percentile(50),
+            "p95_ms": self.histogram.percentile(95),
+            "p99_ms": self.histogram.percentile(99),
+            "histogram": self.histogram.as_dict(),
+            "rows": self.rows,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+class ActionStats:
+    def __init__(self):
+        self.runs = 0
+        self.round_trips = 0
+        self.total_ms = 0.0
+        self.statements = {}   # normalized statement -> calls
+
+    def as_dict(self):
+        return {
+            "runs": self.runs,
+            "round_trips": self.round_trips,
+            "round_trips_per_run": round(self.round_trips / self.runs, 2) if self.runs else 0.0,
+            "total_ms": round(self.total_ms, 3),
+            "statements": dict(sorted(self.statements.items(), key=lambda kv: -kv[1])),
+        }
+
+
+class Instruments:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statements = {}   # normalized statement -> StatementStats
+        self.actions = {}      # action name -> ActionStats
+        self.round_trips = 0
+        # Not thread-local: an action's worker threads (the concurrent
+        # reports) count towards it too.
+        self._action = None
+
+    def record(self, sql, elapsed, error=False, rows=0, sent=0):
+        """One execute/executemany round trip for `sql`; returns its normalized key."""
+        key = normalize(sql)
+        ms = elapsed * 1000
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = StatementStats()
+            stats.calls += 1
+            stats.errors += error
+            stats.total_ms += ms
+            stats.histogram.add(ms)
+            stats.rows += rows
+            stats.bytes_sent += sent
+            self.round_trips += 1
+            action = self._action
+            if action is not None:
+                action.round_trips += 1
+                action.statements[key] = action.statements.get(key, 0) + 1
+        return key
+
+    def record_fetch(self, key, elapsed, rows, size):
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:   # reset() ran between the execute and the fetch
+                return
+            stats.total_ms += elapsed * 1000
+            stats.rows += rows
+            stats.bytes_received += size
+
+    @contextmanager
+    def action(self, name):
+        """Counts the statements run inside the block towards menu action `name`."""
+        with self._lock:
+            stats = self.actions.get(name)
+            if stats is None:
+                stats = self.actions[name] = ActionStats()
+            outer, self._action = self._action, stats
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            with self._lock:
+                stats.runs += 1
+                stats.total_ms += (time.perf_counter() - start) * 1000
+                self._action = outer
+
+    def top(self, n=10, key="total_ms"):
+        """[(statement, stats dict)] for the n statements with the highest `key`."""
+        with self._lock:
+            rows = [(sql, stats.as_dict()) for sql, stats in self.statements.items()]
+        return sorted(rows, key=lambda row: -row[1][key])[:n]
+
+    def suspects(self, threshold=N_PLUS_ONE_CALLS):
+        """[(action, statement, calls per run)] for statements repeated within one action run."""
+        with self._lock:
+            found = [
+                (name, sql, calls / action.runs)
+                for name, action in self.actions.items() if action.runs
+                for sql, calls in action.statements.items()
+                if calls / action.runs >= threshold
+            ]
+        return sorted(found, key=lambda row: -row[2])
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "round_trips": self.round_trips,
+                "statements": {sql: stats.as_dict() for sql, stats in self.statements.items()},
+                "actions": {name: action.as_dict() for name, action in self.actions.items()},
+            }
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, default=str)
+
+    def reset(self):
+        with self._lock:
+            self.statements.clear()
+            self.actions.clear()
+            self.round_trips = 0
+
+
+# One set of instruments per process, shared by every connection and worker thread.
+instruments = Instruments()
+
+
+class InstrumentedCursor:
+    """Cursor proxy that reports each statement and its fetched rows to `instruments`."""
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self.connection = connection
+        self._key = None
+
+    def _run(self, method, query, args, sent):
+        start = time.perf_counter()
+        try:
+            result = method(query, args)
+        except Exception:
+            self._key = instruments.record(query, time.perf_counter() - start, error=True, sent=sent)
+            raise
+        elapsed = time.perf_counter() - start
+        # Reads count the rows as they are fetched; writes count rows affected.
+        rows = max(self._cursor.rowcount, 0) if self._cursor.description is None else 0
+        self._key = instruments.record(query, elapsed, rows=rows, sent=sent)
+        return result
+
+    def execute(self, query, args=None):
+        return self._run(self._cursor.execute, query, args, len(query) + _args_size(args))
+
+    def executemany(self, query, args):
+        args = list(args)
+        return self._run(self._cursor.executemany, query, args, len(query) + sum(_args_size(a) for a in args))
+
+    def _fetched(self, start, rows):
+        if self._key is not None:
+            instruments.record_fetch(self._key, time.perf_counter() - start, len(rows), _rows_size(rows))
+        return rows
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(start, [row] if row is not None else [])
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        return self._fetched(start, rows)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        return self._fetched(start, self._cursor.fetchall())
+
+    def __iter__(self):
+        # Streamed results are recorded once, when iteration stops, and only
+        # the time spent fetching counts, not the caller's work between rows.
+        rows = iter(self._cursor)
+        elapsed, count, size = 0.0, 0, 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                count += 1
+                size += sum(_value_size(cell) for cell in row)
+                yield row
+        finally:
+            if self._key is not None:
+                instruments.record_fetch(self._key, elapsed, count, size)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args):
+        return InstrumentedCursor(self._conn.cursor(*args), self)
+
+    def streaming_cursor(self):
+        from backend import streaming_cursor
+        return InstrumentedCursor(streaming_cursor(self._conn), self)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class InstrumentedBackend:
+    """Backend proxy whose connections report to `instruments`."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def connect(self):
+        return InstrumentedConnection(self._backend.connect())
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+
+def print_top(n=10, key="total_ms"):
+    top = instruments.top(n, key)
+    if not top:
+        print("\nNo statements recorded yet.")
+        return
+    print(f"\n{'calls':>7} {'errors':>6} {'total ms':>10} {'p50':>7} {'p95':>7} {'rows':>8} {'KiB in':>8}  statement")
+    for sql, s in top:
+        print(f"{s['calls']:>7} {s['errors']:>6} {s['total_ms']:>10.1f} {s['p50_ms']:>7} {s['p95_ms']:>7} "
+              f"{s['rows']:>8} {s['bytes_received'] / 1024:>8.1f}  {sql[:100]}")
+
+
+def print_actions():
+    snapshot = instruments.snapshot()
+    if not snapshot["actions"]:
+        print("\nNo menu actions recorded yet.")
+        return
+    print(f"\n{'runs':>5} {'trips/run':>10} {'ms/run':>9}  action")
+    for name, a in sorted(snapshot["actions"].items(), key=lambda kv: -kv[1]["round_trips_per_run"]):
+        print(f"{a['runs']:>5} {a['round_trips_per_run']:>10} {a['total_ms'] / a['runs']:>9.1f}  {name}")
+    suspects = instruments.suspects()
+    if suspects:
+        print(f"\nStatements run {N_PLUS_ONE_CALLS}+ times per action run (likely N+1):")
+        for name, sql, per_run in suspects:
+            print(f"{per_run:>8.1f}x  {name}: {sql[:90]}")
@@ -1,28 +1,17 @@
 import sys
-import os
-import pymysql
-import json
-import re
+import argparse
 
 import manufacturer as m
 import supplier as s
 import viewer as v
 import queries as q
 
-from pathlib import Path
-from sshtunnel import SSHTunnelForwarder
-from datetime import date
+from backend import add_backend_arguments, create_backend, load_config
+from instrumentation import InstrumentedBackend, instruments, print_actions, print_top
+from migrations import bootstrap
+from pool import ConnectionPool
 
-base_dir = os.path.dirname(os.path.dirname(__file__))
-config_path = os.path.join(base_dir, "config", "config.json")
-
-with open(config_path, "r") as f:
-    config = json.load(f)
-
-sql_folder = os.path.join(os.path.dirname(__file__), "..", "sql")
-init_file = os.path.join(sql_folder, "init.sql")
-trigger_file = os.path.join(sql_folder, "triggers.sql")
-data_file = os.path.join(sql_folder, "data.sql")
+config = load_config()
 
 roles = {
     "Manufacturer": [
@@ -31,35 +20,53 @@ roles = {
         "Record Ingredient Receipt",
         "Create Product Batch",
         "Reports: On-hand | Nearly-out-of-stock | Almost-expired",
-        "(Grad) Recall/Traceability"
+        "(Grad) Recall/Traceability",
+        "Record Stock Movement (ship | write off | adjust)",
+        "Browse/Export a Report (paged | .csv | .jsonl)"
     ],
     "Supplier": [
         "Declare Ingredients Supplied",
         "Maintain Formulations (materials, price, pack, effective dates)",
-        "Create Ingredient Batch (for supplied ingredients)"
+        "Create Ingredient Batch (for supplied ingredients)",
+        "View Formulations (active now | as of a date)"
     ],
     "General (Viewer)": [
         "Product Ingredient List (with nested materials, ordered by quantity)",
-        "Compare Products for Incompatibilities"
+        "Compare Products for Incompatibilities",
+        "Incompatibility Matrix (all product pairs)",
+        "Flattened BOM (per standard batch, all recipe versions)"
     ],
     "View Queries": [
         "Last Batch Ingredients for P_ID 100",
         "Supplier Spending for Manufacturer MFG002",
         "Product Unit Cost for Lot Number 100-MFG001-B0901",
         "Conflicting Ingredients for Product Lot 100-MFG001-B0901",
-        "Manufacturers Not Supplied by Supplier 21"
+        "Manufacturers Not Supplied by Supplier 21",
+        "Expiring Soon Across All Manufacturers",
+        "Query Cache Statistics"
+    ],
+    "Diagnostics": [
+        "Top Statements by Total Time",
+        "Top Statements by Calls",
+        "Round Trips per Menu Action (with likely N+1 statements)",
+        "Dump Statistics to JSON",
+        "Reset Statistics"
     ]
 }
 
+def action_name(role, choice):
+    return f"{role}: {roles[role][int(choice) - 1]}"
+
 def show_menu(options):
     for idx, option in enumerate(options, 1):
         print(f"[{idx}] {option}")
     print("[0] Back/Exit")
 
-def manufacturer_actions(conn, cursor):
+def manufacturer_actions(pool):
     mid = input("Enter user id: ").strip()
-    cursor.execute("SELECT M_Name FROM Manufacturer WHERE M_ID = %s", (mid,))
-    result = cursor.fetchone()
+    with pool.cursor() as (conn, cursor):
+        cursor.execute("SELECT M_Name FROM Manufacturer WHERE M_ID = %s", (mid,))
+        result = cursor.fetchone()
     if result:
         print(f"Welcome {result[0]}")
     else:
@@ -72,30 +79,38 @@ def manufacturer_actions(conn, cursor):
         choice = input("Select an action: ").strip()
         if choice == "0":
             break
+        elif choice == "5":
+            # Reports take their own pooled connections
+            with instruments.action(action_name("Manufacturer", choice)):
+                m.view_report(pool, mid)
         elif choice in map(str, range(1, len(roles["Manufacturer"]) + 1)):
-            match choice:
-                case "1":
-                    m.define_update_product(conn, cursor, mid)
-                case "2":
-                    m.define_update_recipe(conn, cursor, mid)
-                case "3":
-                    m.record_ingredient_receipt(conn, cursor, mid)
-                case "4":
-                    m.create_product_batch(conn, cursor, mid)
-                case "5":
-                    m.view_report(cursor, mid)
-                case "6":
-                    m.recall_traceability(cursor, mid)
-                case _:
-                    print("Invalid choice. Try again.")
-            conn.commit()
+            with instruments.action(action_name("Manufacturer", choice)), pool.cursor() as (conn, cursor):
+                match choice:
+                    case "1":
+                        m.define_update_product(conn, cursor, mid)
+                    case "2":
+                        m.define_update_recipe(conn, cursor, mid)
+                    case "3":
+                        m.record_ingredient_receipt(conn, cursor, mid)
+                    case "4":
+                        m.create_product_batch(conn, cursor, mid)
+                    case "6":
+                        m.recall_traceability(cursor, mid)
+                    case "7":
+                        m.record_stock_movement(conn, cursor, mid)
+                    case "8":
+                        m.browse_report(cursor, mid)
+                    case _:
+                        print("Invalid choice. Try again.")
+                conn.commit()
         else:
             print("Invalid choice. Try again.")
 
-def supplier_actions(conn, cursor):
+def supplier_actions(pool):
     sid = input("Enter user id: ").strip()
-    cursor.execute("SELECT S_Name FROM Supplier WHERE S_ID = %s", (sid,))
-    result = cursor.fetchone()
+    with pool.cursor() as (conn, cursor):
+        cursor.execute("SELECT S_Name FROM Supplier WHERE S_ID = %s", (sid,))
+        result = cursor.fetchone()
     if result:
         print(f"Welcome {result[0]}")
     else:
@@ -109,23 +124,27 @@ def supplier_actions(conn, cursor):
         if choice == "0":
             break
         elif choice in map(str, range(1, len(roles["Supplier"]) + 1)):
-            match choice:
-                case "1":
-                    s.declare_ingredient_supplied(conn, cursor, sid)
-                case "2":
-                    s.maintain_formulations(conn, cursor, sid)
-                case "3":
-                    s.create_ingredient_batch(conn, cursor, sid)
-                case _:
-                    print("Invalid choice. Try again.")
-            conn.commit()
+            with instruments.action(action_name("Supplier", choice)), pool.cursor() as (conn, cursor):
+                match choice:
+                    case "1":
+                        s.declare_ingredient_supplied(conn, cursor, sid)
+                    case "2":
+                        s.maintain_formulations(conn, cursor, sid)
+                    case "3":
+                        s.create_ingredient_batch(conn, cursor, sid)
+                    case "4":
+                        s.view_active_formulations(conn, cursor, sid)
+                    case _:
+                        print("Invalid choice. Try again.")
+                conn.commit()
         else:
             print("Invalid choice. Try again.")
 
-def viewer_actions(cursor):
+def viewer_actions(pool):
     vid = input("Enter user id: ").strip()
-    cursor.execute("SELECT V_Name FROM Viewer WHERE V_ID = %s", (vid,))
-    result = cursor.fetchone()
+    with pool.cursor() as (conn, cursor):
+        cursor.execute("SELECT V_Name FROM Viewer WHERE V_ID = %s", (vid,))
+        result = cursor.fetchone()
     if result:
         print(f"Welcome {result[0]}")
     else:
@@ -140,17 +159,22 @@ def viewer_actions(cursor):
             break
         elif choice in map(str, range(1, len(roles["General (Viewer)"]) + 1)):
             try:
-                match choice:
-                    case "1":
-                        v.view_product_ingredient_list(cursor)
-                    case "2":
-                        v.compare_products(cursor)
+                with instruments.action(action_name("General (Viewer)", choice)), pool.cursor() as (conn, cursor):
+                    match choice:
+                        case "1":
+                            v.view_product_ingredient_list(cursor)
+                        case "2":
+                            v.compare_products(cursor)
+                        case "3":
+                            v.view_incompatibility_matrix(cursor)
+                        case "4":
+                            v.view_flattened_bom(cursor)
             except Exception as e:
                 print(f"\nError while executing query: {e}")
         else:
             print("Invalid choice. Try again.")
 
-def view_queries(cursor):
+def view_queries(pool):
     while True:
         print("\n[View Queries]")
         show_menu(roles["View Queries"])
@@ -159,89 +183,90 @@ def view_queries(cursor):
             break
         elif choice in map(str, range(1, len(roles["View Queries"]) + 1)):
             try:
-                match choice:
-                    case "1":
-                        q.last_batch_ingredients(cursor)
-                    case "2":
-                        q.manufacturer_supplier_spending(cursor)
-                    case "3":
-                        q.product_unit_cost(cursor)
-                    case "4":
-                        q.conflicting_ingredients_for_batch(cursor)
-                    case "5":
-                        q.manufacturers_not_supplied_by(cursor)
+                with instruments.action(action_name("View Queries", choice)), pool.cursor() as (conn, cursor):
+                    match choice:
+                        case "1":
+                            q.last_batch_ingredients(cursor)
+                        case "2":
+                            q.manufacturer_supplier_spending(cursor)
+                        case "3":
+                            q.product_unit_cost(cursor)
+                        case "4":
+                            q.conflicting_ingredients_for_batch(cursor)
+                        case "5":
+                            q.manufacturers_not_supplied_by(cursor)
+                        case "6":
+                            q.expiring_soon(cursor)
+                        case "7":
+                            q.cache_statistics(cursor)
             except Exception as e:
                 print(f"\nError while executing query: {e}")
         else:
             print("Invalid choice. Try again.")
 
-def main():
-    with SSHTunnelForwarder(
-        (config["ssh_host"], 22),
-        ssh_username=config["ssh_user"],
-        ssh_password=config["ssh_password"],
-        remote_bind_address=(config["mysql_host"], 3306)
-    ) as tunnel:
-        connection = pymysql.connect(
-            host="127.0.0.1",
-            port=tunnel.local_bind_port,
-            user=config["ssh_user"],
-            password=config["mysql_password"],
-            database=config["ssh_user"],
-            autocommit=True
-        )
-        cursor = connection.cursor()
-
-        print(f"Executing init.sql...")
-        with open(init_file, "r") as f:
-            sql_script = f.read()
-        parts = re.split(r'\b(CREATE|DROP)\b', sql_script, flags=re.IGNORECASE)
-        stmts = []
-        i = 1
-        while i < len(parts):
-            keyword = parts[i].upper()
-            statement = parts[i + 1].strip()
-            if statement:
-                stmts.append(f"{keyword} {statement}")
-            i += 2
-        for part in stmts:
-            part = part.strip()
-            if not part:
-                continue
-            try:
-                cursor.execute(part)
-            except pymysql.MySQLError as e:
-                print("Error executing statement:")
-                print(part)
-                print(e)
+def diagnostics(stats_path):
+    while True:
+        print("\n[Diagnostics]")
+        show_menu(roles["Diagnostics"])
+        choice = input("Select an action: ").strip()
+        match choice:
+            case "0":
                 break
-        print("✅ init.sql executed successfully.")
+            case "1":
+                print_top(15, "total_ms")
+            case "2":
+                print_top(15, "calls")
+            case "3":
+                print_actions()
+            case "4":
+                path = input(f"Output file [{stats_path or 'query_stats.json'}]: ").strip() or stats_path or "query_stats.json"
+                try:
+                    instruments.dump(path)
+                    print(f"✅ Statement statistics written to {path}")
+                except OSError as e:
+                    print(f"Error writing {path}: {e}")
+            case "5":
+                instruments.reset()
+                print("✅ Statement statistics reset.")
+            case _:
+                print("Invalid choice. Try again.")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prepared Meal Inventory Manager")
+    add_backend_arguments(parser, config, pool=True)
+    parser.add_argument("--reset", action="store_true",
+                        help="drop everything and reload init.sql, data.sql and all migrations")
+    parser.add_argument("--stats-json", default=None,
+                        help="write per-statement timing statistics to this JSON file on exit")
+    return parser.parse_args(argv)
 
-        print(f"Executing data.sql...")
-        with open(data_file, "r") as f:
-            sql_script = f.read()
-        for statement in sql_script.split(";"):
-            stmt = statement.strip()
-            if stmt:
-                cursor.execute(stmt + ";")
-        print("✅ data.sql executed successfully.")
+def main(argv=None):
+    args = parse_args(argv)
+    with create_backend(args.backend, config, args.db) as raw:
+        backend = InstrumentedBackend(raw)
+        pool = ConnectionPool(backend, size=args.pool_size)
+        with pool.cursor() as (_, cursor):
+            bootstrap(backend, cursor, reset=args.reset)
 
         while True:
-            print("\nSelect role: [1] Manufacturer [2] Supplier [3] General (Viewer) [4] View Queries [0] Exit")
+            print("\nSelect role: [1] Manufacturer [2] Supplier [3] General (Viewer) [4] View Queries [5] Diagnostics [0] Exit")
             role_choice = input("Enter choice: ").strip()
             if role_choice == "0":
                 print("Exiting...")
-                cursor.close()
-                connection.close()
+                pool.close()
+                if args.stats_json:
+                    instruments.dump(args.stats_json)
                 sys.exit()
             elif role_choice == "1":
-                manufacturer_actions(connection, cursor)
+                manufacturer_actions(pool)
             elif role_choice == "2":
-                supplier_actions(connection, cursor)
+                supplier_actions(pool)
             elif role_choice == "3":
-                viewer_actions(cursor)
+                viewer_actions(pool)
             elif role_choice == "4":
-                view_queries(cursor)
+                view_queries(pool)
+            elif role_choice == "5":
+                diagnostics(args.stats_json)
             else:
                 print("Invalid choice. Try again.")
 
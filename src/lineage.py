@@ -0,0 +1,221 @@
+"""
+Recall lineage index.
+
+Holds the lot graph in memory:
+
+    supplier -> ingredient lot -> product lot
+    compound -> atomic ingredient (FormulationIngredient, per supplier)
+
+and each manufacturer's on-hand Inventory, so a recall seeded from any mix
+of suppliers, ingredients and ingredient lots is traced in one call. An
+atomic ingredient seed also pulls in the lots of every compound whose
+supplier's formulation contains it. Like the FEFO index it loads once and
+is updated by the role actions after each successful write; a failed write
+resets it.
+
+Usage:
+    python src/lineage.py --backend sqlite --db pmim.db --lots seeds.txt --out recall.json
+    python src/lineage.py --supplier 20 --ingredient 104
+    python src/lineage.py --backward 100-MFG001-B0901
+"""
+import sys
+import json
+import argparse
+import threading
+from contextlib import redirect_stdout
+from collections import defaultdict
+
+from backend import add_backend_arguments, create_backend, load_config
+from migrations import bootstrap
+
+
+class LineageIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def reset(self):
+        with self._lock:
+            self.loaded = False
+
+    def ensure_loaded(self, cursor):
+        with self._lock:
+            if self.loaded:
+                return self
+            # Ingredient lot -> (I_ID, S_ID); supplier and ingredient -> lots
+            self.lot_info = {}
+            self.lots_by_supplier = defaultdict(set)
+            self.lots_by_ingredient = defaultdict(set)
+            cursor.execute("SELECT Ingredient_Lot_Number, I_ID, S_ID FROM IngredientBatch")
+            for lotno, iid, sid in cursor.fetchall():
+                self._add_lot(lotno, iid, sid)
+
+            # Atomic ingredient -> {(compound, supplier)} whose formulation uses it
+            self.used_in = defaultdict(set)
+            cursor.execute("""
+                SELECT DISTINCT fi.AI_ID, f.CI_ID, f.S_ID
+                FROM FormulationIngredient fi
+                JOIN Formulation f ON f.F_ID = fi.F_ID
+            """)
+            for ai, ci, sid in cursor.fetchall():
+                self.used_in[ai].add((ci, sid))
+
+            # Product lots and the ingredient lots they consumed, both directions
+            self.product_info = {}
+            cursor.execute("""
+                SELECT Product_Lot_Number, P_ID, M_ID, Quantity, Production_Date, Expiration_Date
+                FROM ProductBatch
+            """)
+            for plot, pid, mid, qty, prod_date, exp in cursor.fetchall():
+                self.product_info[plot] = (pid, mid, qty, prod_date, exp)
+            self.consumers = defaultdict(dict)   # ingredient lot -> {product lot: qty}
+            self.consumed = defaultdict(dict)    # product lot -> {ingredient lot: qty}
+            cursor.execute("SELECT Product_Lot_Number, Ingredient_Lot_Number, Quantity_Used FROM ProductIngredientBatch")
+            for plot, lotno, qty in cursor.fetchall():
+                self.consumers[lotno][plot] = qty
+                self.consumed[plot][lotno] = qty
+
+            # Ingredient lot -> {M_ID: on-hand quantity}
+            self.on_hand = defaultdict(dict)
+            cursor.execute("SELECT Ingredient_Lot_Number, M_ID, Quantity FROM Inventory")
+            for lotno, mid, qty in cursor.fetchall():
+                self.on_hand[lotno][mid] = qty
+
+            self.loaded = True
+            return self
+
+    def _add_lot(self, lotno, iid, sid):
+        self.lot_info[lotno] = (iid, sid)
+        self.lots_by_supplier[sid].add(lotno)
+        self.lots_by_ingredient[iid].add(lotno)
+
+    # --- traces ---
+
+    def seed_lots(self, lots=(), suppliers=(), ingredients=()):
+        """Every ingredient lot implicated by the seeds, compounds of atomic seeds included."""
+        with self._lock:
+            result = {lotno for lotno in lots if lotno in self.lot_info}
+            for sid in suppliers:
+                result |= self.lots_by_supplier.get(sid, set())
+            for iid in ingredients:
+                result |= self.lots_by_ingredient.get(iid, set())
+                for ci, sid in self.used_in.get(iid, ()):
+                    result |= {l for l in self.lots_by_ingredient.get(ci, ()) if self.lot_info[l][1] == sid}
+            return result
+
+    def trace_forward(self, lots=(), suppliers=(), ingredients=()):
+        """
+        Follows the seeds down to every product lot. Returns a dict with the
+        affected ingredient lots, the product lots with the quantity of each
+        affected lot they used, and the exposure per manufacturer: on-hand
+        quantity of affected ingredient lots plus units of affected product lots.
+        """
+        with self._lock:
+            affected = self.seed_lots(lots, suppliers, ingredients)
+            product_lots = {}
+            exposure = defaultdict(lambda: {"ingredient_lots": 0, "ingredient_on_hand": 0,
+                                            "product_lots": 0, "product_units": 0})
+            for lotno in sorted(affected):
+                for mid, qty in self.on_hand.get(lotno, {}).items():
+                    exposure[mid]["ingredient_lots"] += 1
+                    exposure[mid]["ingredient_on_hand"] += qty
+                for plot, qty in self.consumers.get(lotno, {}).items():
+                    if plot not in product_lots:
+                        pid, mid, units, prod_date, exp = self.product_info[plot]
+                        product_lots[plot] = {"P_ID": pid, "M_ID": mid, "Quantity": units,
+                                              "Production_Date": prod_date, "Expiration_Date": exp,
+                                              "used": {}}
+                        exposure[mid]["product_lots"] += 1
+                        exposure[mid]["product_units"] += units
+                    product_lots[plot]["used"][lotno] = qty
+            return {
+                "ingredient_lots": {l: dict(zip(("I_ID", "S_ID"), self.lot_info[l])) for l in sorted(affected)},
+                "product_lots": product_lots,
+                "exposure": dict(exposure),
+            }
+
+    def trace_backward(self, product_lots):
+        """{product lot: [(ingredient lot, I_ID, S_ID, quantity used)]} for the given product lots."""
+        with self._lock:
+            return {
+                plot: [(lotno, *self.lot_info[lotno], qty) for lotno, qty in sorted(self.consumed.get(plot, {}).items())]
+                for plot in product_lots
+            }
+
+    # --- incremental maintenance, called after a successful commit ---
+
+    def record_new_batch(self, iid, sid, lotno):
+        with self._lock:
+            if self.loaded:
+                self._add_lot(lotno, iid, sid)
+
+    def record_receipt(self, mid, lotno, qty):
+        with self._lock:
+            if self.loaded:
+                held = self.on_hand[lotno]
+                held[mid] = held.get(mid, 0) + qty
+
+    def record_consumption(self, plot, pid, mid, quantity, prod_date, exp_date, plan):
+        """plan rows are (I_ID, lot, qty, exp) as produced by allocation.plan_allocation."""
+        with self._lock:
+            if self.loaded:
+                self.product_info[plot] = (pid, mid, quantity, prod_date, exp_date)
+                for _, lotno, qty, _ in plan:
+                    self.consumers[lotno][plot] = qty
+                    self.consumed[plot][lotno] = qty
+                    held = self.on_hand[lotno]
+                    held[mid] = held.get(mid, 0) - qty
+
+
+# Reset with fefo_index when a receipt or allocation fails, and after every
+# formulation write, since compound edges are not patched in place.
+lineage_index = LineageIndex()
+
+
+def read_seed_file(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Trace a recall through the lot lineage")
+    add_backend_arguments(parser, config)
+    parser.add_argument("--lots", default=None, help="file with one ingredient lot number per line")
+    parser.add_argument("--lot", action="append", default=[], help="ingredient lot number (repeatable)")
+    parser.add_argument("--supplier", action="append", default=[], help="supplier ID (repeatable)")
+    parser.add_argument("--ingredient", action="append", type=int, default=[], help="ingredient ID (repeatable)")
+    parser.add_argument("--backward", action="append", default=[], help="product lot number to trace back (repeatable)")
+    parser.add_argument("--out", default=None, help="JSON result file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    lots = args.lot + (read_seed_file(args.lots) if args.lots else [])
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            # Keep stdout clean for the JSON result.
+            with redirect_stdout(sys.stderr):
+                bootstrap(backend, cursor)
+            index = lineage_index.ensure_loaded(cursor)
+        finally:
+            conn.close()
+
+    result = {}
+    if lots or args.supplier or args.ingredient:
+        result["forward"] = index.trace_forward(lots, args.supplier, args.ingredient)
+    if args.backward:
+        result["backward"] = index.trace_backward(args.backward)
+    text = json.dumps(result, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        forward = result.get("forward", {})
+        print(f"✅ {len(forward.get('product_lots', {}))} product lots affected; written to {args.out}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
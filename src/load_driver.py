@@ -0,0 +1,376 @@
+"""
+Multi-client load driver.
+
+Runs N concurrent sessions, each on its own pooled connection. Each
+session picks weighted operations from a mix:
+  - receipt:          a manufacturer receives part of a supplier lot into Inventory
+  - batch:            a manufacturer creates a product batch (FEFO consumption)
+  - ingredient_batch: a supplier creates a new IngredientBatch
+  - report:           a manufacturer runs the three reports
+
+All writes go through the same functions as the menus, so they meet in the
+Inventory and IngredientBatch rows the update_batch_on_inventory_* and
+update_inventory_on_consumption triggers adjust.
+
+Every committed write is tracked. The run reports throughput and latency
+per operation, and how many operations hit a deadlock or a lock timeout.
+A deadlocked receipt or ingredient batch is retried, up to --retries
+times, with the arguments it was first drawn with. Batches are not
+retried here: allocation.allocate_batch already retries them, so a batch
+counted as a deadlock is one that outlasted those retries.
+On MySQL it also reports InnoDB row lock waits. At the end it checks these
+invariants against the database:
+  - no Inventory, IngredientBatch or product lot balance is negative;
+  - no ingredient lot was allocated past what its holder had, which shows
+    up as negative Inventory;
+  - Inventory and IngredientBatch match their starting quantities plus the
+    committed receipts, new batches and consumption (no lost updates).
+
+Run it on a generated scratch database (see src/datagen.py).
+
+Usage:
+    python src/load_driver.py --backend sqlite --db bench.db --sessions 8 --duration 30
+    python src/load_driver.py --db bench.db --sessions 16 --mix receipt=4,batch=4,report=1 --hot-lots 20
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import date, timedelta
+from collections import defaultdict
+from contextlib import redirect_stdout
+
+from allocation import produce_batch
+from backend import add_backend_arguments, create_backend, load_config
+from benchmark import percentile
+from manufacturer import receive_ingredient
+from migrations import bootstrap
+from pool import ConnectionPool
+from reports import REPORTS
+from supplier import add_ingredient_batch
+
+OPERATIONS = ("receipt", "batch", "ingredient_batch", "report")
+OUTCOMES = ("ok", "shortage", "rejected", "deadlock", "lock_timeout", "error")
+# allocation.allocate_batch retries its own deadlocks, so sessions do not retry these again.
+RETRIED_INSIDE = {"batch"}
+
+
+def parse_mix(text):
+    """'receipt=3,batch=2' -> {'receipt': 3.0, 'batch': 2.0, ...}; unnamed operations get weight 0."""
+    mix = dict.fromkeys(OPERATIONS, 0.0)
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in mix:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}' (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one operation with a positive weight")
+    return mix
+
+
+def classify(error):
+    """Outcome name for a failed operation."""
+    code = error.args[0] if error.args and isinstance(error.args[0], int) else None
+    text = str(error).lower()
+    if code == 1213 or "deadlock" in text:
+        return "deadlock"
+    if code == 1205 or "lock wait timeout" in text or "database is locked" in text:
+        return "lock_timeout"
+    # ValueErrors come from validation; SIGNAL/RAISE messages from the triggers.
+    if isinstance(error, ValueError) or code == 1644 or "error:" in text or "constraint" in text:
+        return "rejected"
+    return "error"
+
+
+def lock_status(backend, cursor):
+    """InnoDB row lock counters on MySQL; None on SQLite, which has none to read."""
+    if backend.name != "mysql":
+        return None
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock%%'")
+    return {name: int(value) for name, value in cursor.fetchall()}
+
+
+class Workload:
+    """Choices for the sessions, plus what their committed writes should have changed."""
+
+    def __init__(self, cursor, hot_lots, seed):
+        rng = random.Random(seed)
+        cursor.execute("SELECT P_ID, M_ID FROM Product ORDER BY P_ID")
+        self.products = cursor.fetchall()
+        self.mids = sorted({mid for _, mid in self.products})
+        cursor.execute("SELECT S_ID, I_ID FROM SupplierSuppliesIngredient ORDER BY S_ID, I_ID")
+        self.supplied = cursor.fetchall()
+        cursor.execute("""
+            SELECT Ingredient_Lot_Number, I_ID, Expiration_Date FROM IngredientBatch
+            WHERE Quantity > 0 AND Expiration_Date >= %s ORDER BY Ingredient_Lot_Number
+        """, (date.today() + timedelta(days=90),))
+        self.lots = cursor.fetchall()
+        if hot_lots:
+            self.lots = rng.sample(self.lots, min(hot_lots, len(self.lots)))
+        cursor.execute("SELECT COUNT(*) FROM ProductBatch WHERE Batch_ID LIKE 'L%'")
+        self.first_batch = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM IngredientBatch WHERE Batch_ID LIKE 'N%'")
+        first_lot = cursor.fetchone()[0]
+        self._ids = {"L": self.first_batch, "N": first_lot}
+        self._lock = threading.Lock()
+        self.received = defaultdict(int)   # (lot, M_ID) -> units received
+        self.consumed = defaultdict(int)   # (lot, M_ID) -> units consumed
+        self.created = {}                  # new lot -> units
+
+    def next_id(self, prefix):
+        with self._lock:
+            self._ids[prefix] += 1
+            return f"{prefix}{self._ids[prefix]:09d}"
+
+    def committed(self, received=None, consumed=None, created=None):
+        with self._lock:
+            if received:
+                self.received[received[0]] += received[1]
+            for key, qty in consumed or ():
+                self.consumed[key] += qty
+            if created:
+                self.created[created[0]] = created[1]
+
+
+def draw_operation(kind, work, rng):
+    """The operation's arguments, drawn once so that a retry repeats the same operation."""
+    if kind == "receipt":
+        lotno, iid, exp = rng.choice(work.lots)
+        return rng.choice(work.mids), iid, lotno, rng.randint(1, 20), exp
+    if kind == "batch":
+        pid, mid = rng.choice(work.products)
+        return mid, pid, work.next_id("L"), 1, date.today() + timedelta(days=60)
+    if kind == "ingredient_batch":
+        sid, iid = rng.choice(work.supplied)
+        return (sid, iid, work.next_id("N"), rng.randint(100, 1000), round(rng.uniform(0.5, 20), 2),
+                date.today() + timedelta(days=rng.randint(120, 400)))
+    return (rng.choice(work.mids),)
+
+
+def run_operation(kind, conn, cursor, work, params):
+    """Runs one drawn operation; returns 'ok' or 'shortage', or raises."""
+    if kind == "receipt":
+        mid, iid, lotno, qty, exp = params
+        receive_ingredient(conn, cursor, mid, iid, lotno, qty, exp)
+        work.committed(received=((lotno, mid), qty))
+        return "ok"
+    if kind == "batch":
+        mid = params[0]
+        lot, plan, _ = produce_batch(conn, cursor, *params)
+        if lot is None:
+            return "shortage"
+        work.committed(consumed=[((lotno, mid), qty) for _, lotno, qty, _ in plan])
+        return "ok"
+    if kind == "ingredient_batch":
+        lot = add_ingredient_batch(conn, cursor, *params)
+        work.committed(created=(lot, params[3]))
+        return "ok"
+    mid, = params
+    for report in REPORTS:
+        report.fetch(cursor, mid)
+    return "ok"
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes = {kind: dict.fromkeys(OUTCOMES, 0) for kind in OPERATIONS}
+        self.latencies = {kind: [] for kind in OPERATIONS}
+        self.retries = 0
+
+    def record(self, kind, outcome, elapsed, retries):
+        with self._lock:
+            self.outcomes[kind][outcome] += 1
+            self.latencies[kind].append(elapsed * 1000)
+            self.retries += retries
+
+
+def session(n, pool, work, stats, mix, stop, operations, retries, seed):
+    rng = random.Random(seed * 1000 + n)
+    kinds = [k for k in OPERATIONS if mix[k] > 0]
+    weights = [mix[k] for k in kinds]
+    done = 0
+    with pool.cursor() as (conn, cursor):
+        while not stop.is_set() and (operations is None or done < operations):
+            kind = rng.choices(kinds, weights)[0]
+            params = draw_operation(kind, work, rng)
+            start = time.perf_counter()
+            attempt = 0
+            while True:
+                try:
+                    outcome = run_operation(kind, conn, cursor, work, params)
+                except Exception as e:
+                    outcome = classify(e)
+                    # A deadlock victim was rolled back; a real client retries it.
+                    if outcome == "deadlock" and kind not in RETRIED_INSIDE and attempt < retries:
+                        attempt += 1
+                        continue
+                break
+            stats.record(kind, outcome, time.perf_counter() - start, attempt)
+            done += 1
+
+
+def check_invariants(cursor, work, inventory_before, batches_before):
+    """Returns {invariant: [offending rows]} for everything that does not hold."""
+    violations = {}
+    cursor.execute("SELECT Ingredient_Lot_Number, M_ID, Quantity FROM Inventory WHERE Quantity < 0")
+    violations["negative_inventory"] = cursor.fetchall()
+    cursor.execute("SELECT Ingredient_Lot_Number, Quantity FROM IngredientBatch WHERE Quantity < 0")
+    violations["negative_ingredient_batch"] = cursor.fetchall()
+    cursor.execute("""
+        SELECT Product_Lot_Number, SUM(Quantity) FROM ProductStockMovement
+        GROUP BY Product_Lot_Number HAVING SUM(Quantity) < 0
+    """)
+    violations["negative_product_stock"] = cursor.fetchall()
+
+    # Consumption recorded in the database for this run's batches must match what the sessions committed.
+    cursor.execute("""
+        SELECT pib.Ingredient_Lot_Number, pb.M_ID, SUM(pib.Quantity_Used)
+        FROM ProductBatch pb
+        JOIN ProductIngredientBatch pib ON pib.Product_Lot_Number = pb.Product_Lot_Number
+        WHERE pb.Batch_ID LIKE 'L%%' AND pb.Batch_ID > %s
+        GROUP BY pib.Ingredient_Lot_Number, pb.M_ID
+    """, (f"L{work.first_batch:09d}",))
+    consumed = {(lot, mid): int(qty) for lot, mid, qty in cursor.fetchall()}
+    violations["consumption_mismatch"] = [
+        (lot, mid, work.consumed.get((lot, mid), 0), consumed.get((lot, mid), 0))
+        for lot, mid in sorted(set(consumed) | set(work.consumed))
+        if consumed.get((lot, mid), 0) != work.consumed.get((lot, mid), 0)
+    ]
+
+    cursor.execute("SELECT Ingredient_Lot_Number, M_ID, Quantity FROM Inventory")
+    inventory_after = {(lot, mid): qty for lot, mid, qty in cursor.fetchall()}
+    # Holding more than was ever available means two sessions allocated the same units.
+    violations["double_allocation"] = [
+        (lot, mid, inventory_before.get((lot, mid), 0) + work.received.get((lot, mid), 0), consumed[(lot, mid)])
+        for lot, mid in sorted(consumed)
+        if consumed[(lot, mid)] > inventory_before.get((lot, mid), 0) + work.received.get((lot, mid), 0)
+    ]
+    violations["inventory_lost_update"] = [
+        (lot, mid, expected, inventory_after.get((lot, mid), 0))
+        for (lot, mid) in sorted(set(inventory_after) | set(work.received) | set(consumed))
+        for expected in [inventory_before.get((lot, mid), 0) + work.received.get((lot, mid), 0) - consumed.get((lot, mid), 0)]
+        if expected != inventory_after.get((lot, mid), 0)
+    ]
+
+    received_by_lot = defaultdict(int)
+    for (lot, _), qty in work.received.items():
+        received_by_lot[lot] += qty
+    cursor.execute("SELECT Ingredient_Lot_Number, Quantity FROM IngredientBatch")
+    batches_after = dict(cursor.fetchall())
+    violations["ingredient_batch_lost_update"] = [
+        (lot, expected, batches_after.get(lot))
+        for lot in sorted(set(batches_after) | set(received_by_lot))
+        for expected in [batches_before.get(lot, work.created.get(lot, 0)) - received_by_lot.get(lot, 0)]
+        if expected != batches_after.get(lot)
+    ]
+    return {name: rows for name, rows in violations.items() if rows}
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Drive concurrent sessions against a database and check invariants")
+    add_backend_arguments(parser, config)
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions (default: 8)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run (default: 30)")
+    parser.add_argument("--operations", type=int, default=None, help="stop each session after this many operations")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("receipt=3,batch=3,ingredient_batch=1,report=2"),
+                        help="operation weights (default: receipt=3,batch=3,ingredient_batch=1,report=2)")
+    parser.add_argument("--hot-lots", type=int, default=None, help="receive from only this many lots, to force contention")
+    parser.add_argument("--retries", type=int, default=2, help="retries for a deadlocked receipt or ingredient batch (default: 2); "
+                             "batches retry inside allocation.allocate_batch")
+    parser.add_argument("--seed", type=int, default=540)
+    parser.add_argument("--results", default=None, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    with create_backend(args.backend, config, args.db) as backend:
+        sessions = args.sessions if backend.concurrent else 1
+        if sessions != args.sessions:
+            print("⚠ An in-memory SQLite database cannot take concurrent writers; running one session.", file=sys.stderr)
+        pool = ConnectionPool(backend, size=sessions + 1)
+        try:
+            with pool.cursor() as (_, cursor):
+                with redirect_stdout(sys.stderr):
+                    bootstrap(backend, cursor)
+                work = Workload(cursor, args.hot_lots, args.seed)
+                cursor.execute("SELECT Ingredient_Lot_Number, M_ID, Quantity FROM Inventory")
+                inventory_before = {(lot, mid): qty for lot, mid, qty in cursor.fetchall()}
+                cursor.execute("SELECT Ingredient_Lot_Number, Quantity FROM IngredientBatch")
+                batches_before = dict(cursor.fetchall())
+                locks_before = lock_status(backend, cursor)
+
+            stats = Stats()
+            stop = threading.Event()
+            threads = [
+                threading.Thread(target=session, args=(n, pool, work, stats, args.mix, stop,
+                                                       args.operations, args.retries, args.seed))
+                for n in range(sessions)
+            ]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            if args.operations is None:
+                stop.wait(args.duration)
+                stop.set()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+
+            with pool.cursor() as (_, cursor):
+                locks_after = lock_status(backend, cursor)
+                violations = check_invariants(cursor, work, inventory_before, batches_before)
+        finally:
+            pool.close()
+
+    total = sum(sum(o.values()) for o in stats.outcomes.values())
+    print(f"\n{'operation':<17}" + "".join(f"{o:>13}" for o in OUTCOMES) + f"{'p50 ms':>10}{'p95 ms':>10}")
+    for kind in OPERATIONS:
+        latencies = sorted(stats.latencies[kind])
+        if not latencies:
+            continue
+        print(f"{kind:<17}" + "".join(f"{stats.outcomes[kind][o]:>13}" for o in OUTCOMES)
+              + f"{percentile(latencies, 50):>10.2f}{percentile(latencies, 95):>10.2f}")
+    deadlocks = sum(o["deadlock"] for o in stats.outcomes.values())
+    timeouts = sum(o["lock_timeout"] for o in stats.outcomes.values())
+    print(f"\n{total} operations in {elapsed:.1f}s with {sessions} sessions: {total / elapsed:.1f} ops/s")
+    print(f"Deadlocks: {deadlocks} (receipts and ingredient batches retried {stats.retries} times)  "
+          f"Lock timeouts: {timeouts}")
+    lock_waits = None
+    if locks_before is not None and locks_after is not None:
+        lock_waits = {name: locks_after[name] - locks_before.get(name, 0)
+                      for name in ("Innodb_row_lock_waits", "Innodb_row_lock_time") if name in locks_after}
+        print(f"Row lock waits: {lock_waits.get('Innodb_row_lock_waits', 0)}  "
+              f"time waiting: {lock_waits.get('Innodb_row_lock_time', 0)} ms")
+    for name, rows in violations.items():
+        print(f"✗ {name}: {len(rows)} rows, e.g. {rows[:3]}")
+
+    if args.results:
+        with open(args.results, "w") as f:
+            json.dump({
+                "backend": args.backend,
+                "sessions": sessions,
+                "elapsed_s": round(elapsed, 3),
+                "operations": total,
+                "throughput_ops_s": round(total / elapsed, 2),
+                "outcomes": stats.outcomes,
+                "latency_ms": {
+                    kind: {"p50": percentile(sorted(l), 50), "p95": percentile(sorted(l), 95), "p99": percentile(sorted(l), 99)}
+                    for kind, l in stats.latencies.items() if l
+                },
+                "deadlock_retries": stats.retries,
+                "lock_waits": lock_waits,
+                "violations": {name: len(rows) for name, rows in violations.items()},
+            }, f, indent=2, default=str)
+
+    if violations:
+        print(f"✗ {len(violations)} invariant(s) violated", file=sys.stderr)
+        return 1
+    print("✅ All invariants hold.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
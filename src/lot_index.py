@@ -0,0 +1,147 @@
+"""
+In-memory FEFO index of ingredient lots.
+
+Two views are kept, both ordered by expiration date with one heap per key:
+  - inventory: lots a manufacturer holds, keyed by (M_ID, I_ID)
+  - batches:   supplier IngredientBatch lots, keyed by (None, I_ID)
+
+The index loads once (two queries) and is then updated by the role actions
+after each successful write. The database triggers stay authoritative: if a
+write fails, callers reset the index so the next lookup reloads it.
+"""
+import heapq
+import threading
+from datetime import date, datetime
+
+
+def as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+class LotHeaps:
+    """Lots grouped by key, each group a heap of (expiration, lot number)."""
+
+    def __init__(self):
+        self._heaps = {}
+        self._lots = {}   # (key, lot) -> [quantity, expiration, extra]
+
+    def add(self, key, lotno, qty, exp, extra=None):
+        entry = self._lots.get((key, lotno))
+        if entry is not None:
+            entry[0] += qty
+            return
+        exp = as_date(exp)
+        self._lots[(key, lotno)] = [qty, exp, extra]
+        heapq.heappush(self._heaps.setdefault(key, []), (exp, lotno))
+
+    def take(self, key, lotno, qty):
+        entry = self._lots.get((key, lotno))
+        if entry is not None:
+            entry[0] -= qty
+
+    def quantity(self, key, lotno):
+        entry = self._lots.get((key, lotno))
+        return entry[0] if entry else 0
+
+    def earliest(self, key, today=None):
+        """Earliest non-expired lot with stock: (lot, qty, exp, extra) or None."""
+        today = today or date.today()
+        heap = self._heaps.get(key)
+        while heap:
+            exp, lotno = heap[0]
+            qty, _, extra = self._lots[(key, lotno)]
+            if exp >= today and qty > 0:
+                return lotno, qty, exp, extra
+            # Expired lots never become usable again; an emptied lot that is
+            # restocked later is pushed again by add().
+            heapq.heappop(heap)
+            del self._lots[(key, lotno)]
+        return None
+
+    def lots(self, key, today=None):
+        """All non-expired lots with stock for the key, in FEFO order."""
+        today = today or date.today()
+        result = []
+        for exp, lotno in sorted(self._heaps.get(key, [])):
+            qty, _, extra = self._lots[(key, lotno)]
+            if exp >= today and qty > 0:
+                result.append((lotno, qty, exp, extra))
+        return result
+
+
+class FefoIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.inventory = LotHeaps()
+        self.batches = LotHeaps()
+
+    def reset(self):
+        with self._lock:
+            self.loaded = False
+            self.inventory = LotHeaps()
+            self.batches = LotHeaps()
+
+    def ensure_loaded(self, cursor):
+        with self._lock:
+            if self.loaded:
+                return self
+            cursor.execute("""
+                SELECT M_ID, I_ID, Ingredient_Lot_Number, Quantity, Expiration_Date
+                FROM Inventory
+                WHERE Quantity > 0
+            """)
+            for mid, iid, lotno, qty, exp in cursor.fetchall():
+                self.inventory.add((mid, iid), lotno, qty, exp)
+            cursor.execute("""
+                SELECT I_ID, Ingredient_Lot_Number, Quantity, Expiration_Date, S_ID
+                FROM IngredientBatch
+                WHERE Quantity > 0
+            """)
+            for iid, lotno, qty, exp, sid in cursor.fetchall():
+                self.batches.add((None, iid), lotno, qty, exp, sid)
+            self.loaded = True
+            return self
+
+    def inventory_lots(self, mid, iid, today=None):
+        with self._lock:
+            return self.inventory.lots((mid, iid), today)
+
+    def earliest_batch(self, iid, today=None):
+        with self._lock:
+            return self.batches.earliest((None, iid), today)
+
+    def batch_lots(self, iid, today=None):
+        with self._lock:
+            return self.batches.lots((None, iid), today)
+
+    # --- incremental maintenance, called after a successful commit ---
+
+    def record_new_batch(self, iid, sid, lotno, qty, exp):
+        with self._lock:
+            if self.loaded:
+                self.batches.add((None, iid), lotno, qty, exp, sid)
+
+    def record_receipt(self, mid, iid, lotno, qty, exp):
+        """A manufacturer moved qty from a supplier lot into its inventory."""
+        with self._lock:
+            if self.loaded:
+                self.batches.take((None, iid), lotno, qty)
+                self.inventory.add((mid, iid), lotno, qty, exp)
+
+    def record_consumption(self, mid, plan):
+        """plan rows are (I_ID, lot, qty, exp) as produced by allocation.plan_allocation."""
+        with self._lock:
+            if self.loaded:
+                for iid, lotno, qty, _ in plan:
+                    self.inventory.take((mid, iid), lotno, qty)
+
+
+# Entries change only after a commit. A failed receipt or batch allocation
+# resets the index anyway, as the failure may mean it disagrees with the
+# triggers; a failed IngredientBatch insert leaves it as it was.
+fefo_index = FefoIndex()
@@ -1,16 +1,16 @@
 from datetime import date
 from collections import defaultdict
 
-def print_table(rows, headers):
-    if not rows:
-        print("No results.")
-        return
-    col_widths = [max(len(str(cell)) for cell in [h] + [row[i] for row in rows]) for i, h in enumerate(headers)]
-    header_line = " | ".join([h.ljust(col_widths[i]) for i, h in enumerate(headers)])
-    print(header_line)
-    print("-" * len(header_line))
-    for row in rows:
-        print(" | ".join([str(cell).ljust(col_widths[i]) for i, cell in enumerate(row)]))
+from allocation import allocate_batch, load_recipe_lots, plan_allocation
+from bom import bom_engine
+from conflicts import refresh_recipe_conflict
+from expiry import expiry_calendar
+from lineage import lineage_index
+from lot_index import fefo_index
+from query_cache import query_cache
+from render import render_table, show_rows
+from reports import BOM_REPORT, REPORTS, report_jobs, run_reports
+from stock import lot_movements, product_balances, record_movement
 
 def choose_from_list(options, prompt):
     for i, opt in enumerate(options, 1):
@@ -49,6 +49,7 @@ def define_update_product(conn, cursor, mid):
         pid = cursor.fetchone()[0]
         print(f"Product created: ID={pid}, Name={pname}")
         conn.commit()
+        query_cache.invalidate("Product")
     except Exception as e:
         print(f"Error in define/update product: {e}")
 
@@ -93,11 +94,41 @@ def define_update_recipe(conn, cursor, mid):
             again = input("Add another ingredient to this recipe? (y/n): ").strip().lower()
             if again != 'y':
                 break
-        print("Recipe updated.")
+        conflict = refresh_recipe_conflict(cursor, rid)
         conn.commit()
+        bom_engine.invalidate()
+        query_cache.invalidate("Recipe", "RecipeUsesIngredient")
+        if conflict:
+            print(f"Warning: ingredients {conflict[0]} and {conflict[1]} must not be combined; batches of this recipe will be rejected.")
+        print("Recipe updated.")
     except Exception as e:
         print(f"Error in define/update recipe: {e}")
 
+def receive_ingredient(conn, cursor, mid, iid, lotno, qty, exp):
+    """
+    Moves qty of a supplier lot into the manufacturer's inventory without
+    prompting. A lot the manufacturer already holds is topped up; the
+    update_batch_on_inventory_* triggers draw the supplier lot down.
+    """
+    conn.begin()
+    try:
+        cursor.execute(
+            "INSERT INTO Inventory (Ingredient_Lot_Number, I_ID, M_ID, Quantity, Expiration_Date) VALUES (%s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE Quantity = Quantity + VALUES(Quantity)",
+            (lotno, iid, mid, qty, exp)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        fefo_index.reset()
+        lineage_index.reset()
+        expiry_calendar.reset()
+        raise
+    fefo_index.record_receipt(mid, iid, lotno, qty, exp)
+    lineage_index.record_receipt(mid, lotno, qty)
+    expiry_calendar.record_receipt(mid, lotno, qty, exp)
+    query_cache.invalidate("Inventory")
+
 def record_ingredient_receipt(conn, cursor, mid):
     print("=== Record Ingredient Receipt ===")
     try:
@@ -117,32 +148,17 @@ def record_ingredient_receipt(conn, cursor, mid):
         cursor.execute("SELECT I_ID FROM Ingredient WHERE I_Name=%s", (ing_name,))
         iid = cursor.fetchone()[0]
 
+        index = fefo_index.ensure_loaded(cursor)
         if use_fefo:
             #Select from earliest expiry
-            cursor.execute("""
-                SELECT Ingredient_Lot_Number, Quantity, Expiration_Date, S_ID 
-                FROM IngredientBatch 
-                WHERE I_ID=%s AND Expiration_Date>=CURDATE()
-                AND Quantity>0
-                ORDER BY Expiration_Date ASC LIMIT 1""", (iid,))
-            lot = cursor.fetchone()
+            lot = index.earliest_batch(iid)
             if not lot:
                 print("No eligible lots found.")
                 return
             print(f"Auto-selected Lot: {lot[0]} (Qty: {lot[1]}, Exp: {lot[2]}, Supplier: {lot[3]})")
-            qty_receive = int(input("Enter quantity to record as received: ").strip())
-            cursor.execute(
-                "INSERT INTO Inventory (Ingredient_Lot_Number, M_ID, Quantity, Expiration_Date) VALUES (%s, %s, %s, %s)",
-                (lot[0], mid, qty_receive, lot[2])
-            )
         else:
             #Manual lot selection
-            cursor.execute("""
-                SELECT Ingredient_Lot_Number, Quantity, Expiration_Date, S_ID 
-                FROM IngredientBatch 
-                WHERE I_ID=%s AND Expiration_Date>=CURDATE()
-                AND Quantity>0""", (iid,))
-            lots = cursor.fetchall()
+            lots = index.batch_lots(iid)
             if not lots:
                 print("No available lots for this ingredient.")
                 return
@@ -152,13 +168,9 @@ def record_ingredient_receipt(conn, cursor, mid):
             if lidx is None:
                 return
             lot = lots[lidx]
-            qty_receive = int(input("Enter quantity to record as received: ").strip())
-            cursor.execute(
-                "INSERT INTO Inventory (Ingredient_Lot_Number, M_ID, Quantity, Expiration_Date) VALUES (%s, %s, %s, %s)",
-                (lot[0], mid, qty_receive, lot[2])
-            )
+        qty_receive = int(input("Enter quantity to record as received: ").strip())
+        receive_ingredient(conn, cursor, mid, iid, lot[0], qty_receive, lot[2])
         print("Ingredient receipt recorded.")
-        conn.commit()
     except Exception as e:
         print(f"Error in recording ingredient receipt: {e}")
 
@@ -191,109 +203,100 @@ def create_product_batch(conn, cursor, mid):
 
         prod_date = date.today()
         exp_date = input("Enter Expiration Date for batch (YYYY-MM-DD): ").strip()
-        #insert ProductBatch
-        cursor.execute(
-            "INSERT INTO ProductBatch (P_ID, M_ID, Batch_ID, R_ID, Quantity, Production_Date, Expiration_Date) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-            (pid, mid, bid, rid, quantity, prod_date, exp_date)
-        )
-        cursor.execute("SELECT LAST_INSERT_ID()")
-        batch_id = cursor.fetchone()[0]
-
-        #Consume ingredients
-        cursor.execute(
-            "SELECT I_ID, Quantity FROM RecipeUsesIngredient WHERE R_ID=%s", (rid,)
-        )
-        ingredients = cursor.fetchall()
-        for iid, total_needed in ingredients:
-            qty_needed = total_needed * mul
-            print(f"\nConsuming {qty_needed} of ingredient ID {iid} for product batch.")
-            use_fefo = input("Auto-select lots by FEFO? (y/n): ").strip().lower() == 'y'
-            remaining = qty_needed
-            while remaining > 0:
-                if use_fefo:
-                    cursor.execute(
-                        "SELECT Ingredient_Lot_Number, Quantity, Expiration_Date FROM Inventory WHERE I_ID=%s AND M_ID=%s AND Quantity>0 ORDER BY Expiration_Date ASC LIMIT 1", (iid, mid)
-                    )
-                else:
-                    cursor.execute(
-                        "SELECT Ingredient_Lot_Number, Quantity, Expiration_Date FROM Inventory WHERE I_ID=%s AND M_ID=%s AND Quantity>0", (iid, mid)
-                    )
-                avail = cursor.fetchone()
-                if not avail:
-                    print("Not enough inventory for this ingredient!")
-                    break
-                lotno, avail_qty, lot_exp = avail
-                consume = min(avail_qty, remaining)
-                cursor.execute(
-                    "UPDATE Inventory SET Quantity = Quantity - %s WHERE Ingredient_Lot_Number=%s AND M_ID=%s",
-                    (consume, lotno, mid)
-                )
-                cursor.execute(
-                    "INSERT INTO ProductIngredientBatch (Product_Lot_Number, Ingredient_Lot_Number, Quantity_Used) VALUES ((SELECT Product_Lot_Number FROM ProductBatch WHERE Batch_ID=%s AND P_ID=%s), %s, %s)",
-                    (batch_id, pid, lotno, consume)
-                )
-                print(f"Consumed {consume} from lot {lotno}.")
-                remaining -= consume
 
-        print("Product batch created and inventory updated.")
-        conn.commit()
+        #Plan consumption for the whole recipe before writing anything
+        requirements, lots = load_recipe_lots(cursor, mid, rid)
+        use_fefo = input("Auto-select lots by FEFO? (y/n): ").strip().lower() == 'y'
+        explicit_lots = {}
+        if not use_fefo:
+            for iid in requirements:
+                candidates = lots.get(iid, [])
+                if not candidates:
+                    continue
+                print(f"\nSelect the first lot to consume for ingredient ID {iid} (remainder is FEFO):")
+                lidx = choose_from_list([f"{l[0]} (Qty: {l[1]}, Exp: {l[2]})" for l in candidates], "Enter lot number: ")
+                if lidx is not None:
+                    explicit_lots[iid] = [candidates[lidx][0]]
+        preview, shortages = plan_allocation(requirements, lots, mul, explicit_lots)
+        if not shortages:
+            # Re-planned against locked lots; another session may have taken some of the preview.
+            lot, plan, shortages = allocate_batch(conn, cursor, pid, mid, bid, rid, quantity, mul, prod_date, exp_date,
+                                                  requirements, explicit_lots, [l for _, l, _, _ in preview])
+        if shortages:
+            print("Not enough inventory for this batch:")
+            render_table(shortages, ["Ingredient ID", "Needed", "Available"])
+            return
+        render_table(plan, ["Ingredient ID", "Lot#", "Consume", "Expires"])
+        print(f"Product batch {lot} created and inventory updated.")
     except Exception as e:
         print(f"Error in creating product batch: {e}")
 
-def report_on_hand(cursor, mid):
-    print("=== On Hand Inventory ===")
+def record_stock_movement(conn, cursor, mid):
+    print("=== Record Stock Movement ===")
     try:
-        cursor.execute("SELECT Ingredient_Lot_Number, Quantity, Expiration_Date FROM Inventory WHERE M_ID=%s", (mid,))
-        rows = cursor.fetchall()
-        print_table(rows, ["Lot#", "Qty", "Expires"])
+        render_table(product_balances(cursor, mid), ["Product ID", "Name", "OnHand", "StdBatchSize"])
+        lot = input("Enter Product Lot Number: ").strip()
+        render_table(lot_movements(cursor, lot), ["#", "Type", "Qty", "When", "Note"])
+        kinds = ["shipped", "written_off", "adjusted"]
+        kidx = choose_from_list(kinds, "Select movement type: ")
+        if kidx is None:
+            return
+        prompt = "Enter quantity (+/- for adjustments): " if kinds[kidx] == "adjusted" else "Enter quantity: "
+        qty = int(input(prompt).strip())
+        note = input("Note (optional): ").strip() or None
+        balance = record_movement(conn, cursor, mid, lot, kinds[kidx], qty, note)
+        print(f"Movement recorded. Lot {lot} now has {balance} units on hand.")
     except Exception as e:
-        print(f"Error fetching on-hand inventory: {e}")
+        print(f"Error in recording stock movement: {e}")
 
-def report_nearly_oos(cursor, mid):
-    print("=== Nearly Out Of Stock Products ===")
+def browse_report(cursor, mid):
+    """One report streamed from an unbuffered cursor: printed, paged, or exported as it is read."""
+    print("=== Browse/Export Report ===")
     try:
-        cursor.execute("""
-            SELECT p.P_ID, p.P_Name, IFNULL(SUM(pb.Quantity),0) as OnHand, p.Standard_Batch_Size
-            FROM Product p LEFT JOIN ProductBatch pb ON p.P_ID = pb.P_ID
-            WHERE p.M_ID=%s
-            GROUP BY p.P_ID, p.P_Name, p.Standard_Batch_Size
-            HAVING OnHand < p.Standard_Batch_Size
-        """, (mid,))
-        rows = cursor.fetchall()
-        print_table(rows, ["Product ID", "Name", "OnHand", "StdBatchSize"])
+        reports = REPORTS + [BOM_REPORT]
+        ridx = choose_from_list([r.title for r in reports], "Select report: ")
+        if ridx is None:
+            return
+        report = reports[ridx]
+        show_rows(report.stream(cursor, mid), report.headers, report.widths)
     except Exception as e:
-        print(f"Error fetching nearly out of stock products: {e}")
+        print(f"Error in browsing report: {e}")
 
-def report_almost_expired(cursor, mid):
-    print("=== Inventory Expiring Soon (<10 days) ===")
-    try:
-        cursor.execute("""
-            SELECT Ingredient_Lot_Number, Quantity, Expiration_Date
-            FROM Inventory
-            WHERE M_ID=%s AND DATEDIFF(Expiration_Date, CURDATE()) <= 10
-        """, (mid,))
-        rows = cursor.fetchall()
-        print_table(rows, ["Lot#", "Qty", "Expires"])
-    except Exception as e:
-        print(f"Error fetching almost expired inventory: {e}")
+def print_report(job, rows, elapsed, error):
+    print(f"=== {job.report.title} === ({elapsed * 1000:.0f} ms)")
+    if error is not None:
+        print(f"Error fetching {job.report.title.lower()}: {error}")
+    else:
+        render_table(rows, job.report.headers, job.report.widths)
 
-def view_report(cursor, mid):
+def view_report(pool, mid):
+    """Runs the reports concurrently on pooled connections, printing each as it finishes."""
     print("--- Reports ---")
-    report_on_hand(cursor, mid)
-    report_nearly_oos(cursor, mid)
-    report_almost_expired(cursor, mid)
+    elapsed = run_reports(pool, report_jobs([mid]), print_report)
+    print(f"Reports finished in {elapsed * 1000:.0f} ms.")
+
+def split_list(text):
+    return [item.strip() for item in text.split(",") if item.strip()]
 
 def recall_traceability(cursor, mid):
-    print("=== Recall/Traceability by Ingredient Lot ===")
+    print("=== Recall/Traceability ===")
     try:
-        lotnum = input("Enter Ingredient Lot Number for recall: ").strip()
-        cursor.execute("""
-            SELECT pib.Product_Lot_Number, pb.P_ID, pb.Production_Date, pb.Expiration_Date, pib.Quantity_Used
-            FROM ProductIngredientBatch pib
-            JOIN ProductBatch pb ON pib.Product_Lot_Number = pb.Product_Lot_Number
-            WHERE pib.Ingredient_Lot_Number=%s
-        """, (lotnum,))
-        rows = cursor.fetchall()
-        print_table(rows, ["Product Lot#", "Product ID", "Prod Date", "Expires", "Qty Used"])
+        print("Seed the recall with any mix of the following (comma-separated, blank to skip):")
+        lots = split_list(input("Enter Ingredient Lot Number(s) for recall: "))
+        suppliers = split_list(input("Enter Supplier ID(s): "))
+        ingredients = [int(i) for i in split_list(input("Enter Ingredient ID(s): "))]
+        result = lineage_index.ensure_loaded(cursor).trace_forward(lots, suppliers, ingredients)
+        print(f"{len(result['ingredient_lots'])} ingredient lot(s) implicated.")
+        rows = [
+            (plot, info["P_ID"], info["Production_Date"], info["Expiration_Date"], sum(info["used"].values()))
+            for plot, info in sorted(result["product_lots"].items())
+        ]
+        render_table(rows, ["Product Lot#", "Product ID", "Prod Date", "Expires", "Qty Used"])
+        print("Exposure by manufacturer:")
+        rows = [
+            (m, e["ingredient_lots"], e["ingredient_on_hand"], e["product_lots"], e["product_units"])
+            for m, e in sorted(result["exposure"].items())
+        ]
+        render_table(rows, ["Manufacturer", "Ingredient Lots", "On Hand", "Product Lots", "Product Units"])
     except Exception as e:
         print(f"Error in recall/traceability: {e}")
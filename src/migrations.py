@@ -0,0 +1,134 @@
+import os
+import hashlib
+from datetime import datetime
+
+from backend import data_file
+
+# Scripts applied to a database are recorded here with the checksum of the
+# file that was run, so a warm start only has to read this table.
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS SchemaVersion (
+    Script VARCHAR(255) PRIMARY KEY,
+    Checksum CHAR(64) NOT NULL,
+    Applied_At DATETIME NOT NULL
+)
+"""
+
+
+def file_checksum(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def list_migrations(backend):
+    """Returns (name, path) for each migration of the backend, in file-name order."""
+    folder = backend.migrations_folder
+    if not os.path.isdir(folder):
+        return []
+    return [
+        (f"migrations/{name}", os.path.join(folder, name))
+        for name in sorted(os.listdir(folder))
+        if name.endswith(".sql")
+    ]
+
+
+def base_scripts(backend):
+    return [
+        (os.path.basename(backend.init_file), backend.init_file),
+        (os.path.basename(data_file), data_file),
+    ]
+
+
+def read_applied(backend, cursor):
+    """Returns {script: checksum}, or None if the database was never bootstrapped."""
+    try:
+        cursor.execute("SELECT Script, Checksum FROM SchemaVersion")
+        return dict(cursor.fetchall())
+    except backend.Error:
+        return None
+
+
+def has_tables(backend, cursor):
+    try:
+        cursor.execute("SELECT 1 FROM Manufacturer LIMIT 1")
+        cursor.fetchall()
+        return True
+    except backend.Error:
+        return False
+
+
+def record(cursor, scripts):
+    cursor.execute(SCHEMA_VERSION_DDL)
+    now = datetime.now().replace(microsecond=0)
+    for name, path in scripts:
+        cursor.execute(
+            "REPLACE INTO SchemaVersion (Script, Checksum, Applied_At) VALUES (%s, %s, %s)",
+            (name, file_checksum(path), now)
+        )
+
+
+def full_reload(backend, cursor, data=True):
+    """
+    Drops and recreates every table from init.sql, data.sql and all
+    migrations. With data=False the tables are left empty, for generated data.
+    """
+    scripts = base_scripts(backend) if data else base_scripts(backend)[:1]
+    backend.set_foreign_key_checks(cursor, False)
+    try:
+        print(f"Executing {os.path.basename(backend.init_file)}...")
+        backend.load_schema(cursor)
+        if data:
+            print(f"Executing {os.path.basename(data_file)}...")
+            backend.load_data(cursor)
+        migrations = list_migrations(backend)
+        for name, path in migrations:
+            print(f"Applying {name}...")
+            backend.run_script(cursor, path)
+    finally:
+        backend.set_foreign_key_checks(cursor, True)
+    cursor.execute("DROP TABLE IF EXISTS SchemaVersion")
+    record(cursor, scripts + migrations)
+    print("✅ Schema and data loaded." if data else "✅ Schema loaded.")
+
+
+def bootstrap(backend, cursor, reset=False):
+    """
+    Brings the database schema up to date. A full reload only happens on
+    reset or on an empty database; otherwise only new migrations are run.
+    """
+    if reset:
+        full_reload(backend, cursor)
+        return
+
+    applied = read_applied(backend, cursor)
+    if applied is None:
+        if not has_tables(backend, cursor):
+            full_reload(backend, cursor)
+            return
+        # A database loaded before versioning existed: keep its data and
+        # adopt the current base scripts as applied.
+        print("Existing schema found without version info; recording it as the baseline.")
+        record(cursor, base_scripts(backend))
+        applied = read_applied(backend, cursor)
+
+    for name, path in base_scripts(backend):
+        # data.sql is absent from databases filled by the data generator.
+        if name in applied and applied[name] != file_checksum(path):
+            print(f"⚠ {name} has changed since it was loaded. Run with --reset to reload it (this wipes data).")
+
+    pending = []
+    for name, path in list_migrations(backend):
+        if name not in applied:
+            pending.append((name, path))
+        elif applied[name] != file_checksum(path):
+            print(f"⚠ {name} was edited after it was applied; add a new migration instead.")
+
+    for name, path in pending:
+        print(f"Applying {name}...")
+        backend.run_script(cursor, path)
+        record(cursor, [(name, path)])
+
+    if pending:
+        print(f"✅ Applied {len(pending)} migration(s).")
+    else:
+        print("✅ Schema is up to date.")
@@ -0,0 +1,119 @@
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of connections from a backend. Idle connections are
+    pinged before reuse; dead ones are replaced, re-opening the backend
+    (the SSH tunnel for MySQL) if a fresh connection cannot be made.
+    """
+
+    def __init__(self, backend, size=4, ping_interval=30.0, timeout=30.0):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.backend = backend
+        self.size = size
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all = set()
+        self._closed = False
+
+    def _connect(self):
+        try:
+            conn = self.backend.connect()
+        except Exception:
+            # The tunnel (or the database behind it) went away; bring it back once.
+            self.backend.reconnect()
+            conn = self.backend.connect()
+        with self._lock:
+            self._all.add(conn)
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._all.discard(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _alive(self, conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        if self._closed:
+            raise PoolExhausted("Connection pool is closed")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhausted(f"No connection available after {self.timeout}s (pool size {self.size})")
+        try:
+            while True:
+                try:
+                    conn, released_at = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - released_at < self.ping_interval or self._alive(conn):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        try:
+            if broken and not self._alive(conn):
+                self._discard(conn)
+            elif self._closed:
+                self._discard(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = True
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            self.release(conn, broken)
+
+    @contextmanager
+    def cursor(self):
+        """Borrows a connection and yields (connection, cursor) for one unit of work."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield conn, cursor
+            finally:
+                cursor.close()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
@@ -0,0 +1,147 @@
+"""
+Headless production-order runner.
+
+Reads a production plan (CSV or JSONL) with one order per row:
+
+    M_ID, P_ID, Batch_ID, Multiplier, Expiration_Date[, Lots]
+
+Lots is optional: a JSON list (or ';'-separated in CSV) of ingredient lot
+numbers to consume first; the rest of each need is covered FEFO. Orders go
+through the same planning and consumption path as Create Product Batch and
+one JSON result line is written per order. Different manufacturers' orders
+run in parallel; each manufacturer's orders run in file order. With
+--interleave every order runs in parallel. Allocation locks the lots
+each batch consumes (see allocation.allocate_batch), so orders competing
+for the same lots are still never over-consumed, but which order gets
+the earliest lots is no longer the file order.
+
+Usage:
+    python src/production_runner.py --backend sqlite --db pmim.db plan.jsonl --results results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from contextlib import redirect_stdout
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from allocation import produce_batch
+from backend import add_backend_arguments, create_backend, load_config
+from bulk_import import READERS
+from migrations import bootstrap
+from pool import ConnectionPool
+
+
+def read_plan(path):
+    ext = os.path.splitext(path)[1]
+    if ext not in READERS:
+        raise ValueError(f"Unsupported plan format '{ext}' (use .csv or .jsonl)")
+    for line_no, row in enumerate(READERS[ext](path), 1):
+        lots = row.get("Lots") or []
+        if isinstance(lots, str):
+            lots = [l.strip() for l in lots.split(";") if l.strip()]
+        yield {
+            "line": line_no,
+            "M_ID": row["M_ID"],
+            "P_ID": int(row["P_ID"]),
+            "Batch_ID": row["Batch_ID"],
+            "Multiplier": float(row["Multiplier"]),
+            "Expiration_Date": row["Expiration_Date"],
+            "Lots": lots,
+        }
+
+
+def run_order(conn, cursor, order):
+    result = {k: order[k] for k in ("line", "M_ID", "P_ID", "Batch_ID")}
+    start = time.perf_counter()
+    try:
+        lot, plan, shortages = produce_batch(
+            conn, cursor, order["M_ID"], order["P_ID"], order["Batch_ID"],
+            order["Multiplier"], order["Expiration_Date"], order["Lots"]
+        )
+        if lot:
+            result["status"] = "created"
+            result["Product_Lot_Number"] = lot
+            result["allocations"] = [
+                {"I_ID": iid, "Ingredient_Lot_Number": lotno, "Quantity_Used": qty}
+                for iid, lotno, qty, _ in plan
+            ]
+        else:
+            result["status"] = "shortage"
+            result["shortages"] = [
+                {"I_ID": iid, "needed": needed, "available": available}
+                for iid, needed, available in shortages
+            ]
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def run_plan(pool, orders, out, workers, interleave=False):
+    """Runs orders grouped by manufacturer (or one per group if interleave); returns {status: count}."""
+    by_manufacturer = OrderedDict()
+    for order in orders:
+        key = order["line"] if interleave else order["M_ID"]
+        by_manufacturer.setdefault(key, []).append(order)
+
+    lock = threading.Lock()
+    counts = {}
+
+    def run_group(group):
+        with pool.cursor() as (conn, cursor):
+            for order in group:
+                result = run_order(conn, cursor, order)
+                with lock:
+                    out.write(json.dumps(result, default=str) + "\n")
+                    out.flush()
+                    counts[result["status"]] = counts.get(result["status"], 0) + 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(run_group, by_manufacturer.values()))
+    return counts
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Create product batches from a production plan file")
+    add_backend_arguments(parser, config, pool=True)
+    parser.add_argument("plan", help="production plan (.csv or .jsonl)")
+    parser.add_argument("--results", default=None, help="JSONL result file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="manufacturers processed in parallel (default: pool size)")
+    parser.add_argument("--interleave", action="store_true",
+                        help="run orders in parallel regardless of manufacturer instead of in file order")
+    args = parser.parse_args(argv)
+
+    orders = list(read_plan(args.plan))
+    with create_backend(args.backend, config, args.db) as backend:
+        workers = args.workers or args.pool_size
+        if not backend.concurrent:
+            workers = 1
+        pool = ConnectionPool(backend, size=max(workers, 1))
+        # Keep stdout clean for the JSONL results.
+        with pool.cursor() as (_, cursor), redirect_stdout(sys.stderr):
+            bootstrap(backend, cursor)
+
+        out = open(args.results, "w") if args.results else sys.stdout
+        start = time.perf_counter()
+        try:
+            counts = run_plan(pool, orders, out, workers, args.interleave)
+        finally:
+            if args.results:
+                out.close()
+            pool.close()
+        elapsed = time.perf_counter() - start
+
+    summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+    print(f"✅ {len(orders)} orders in {elapsed:.2f}s ({summary})", file=sys.stderr)
+    return 0 if counts.get("error", 0) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
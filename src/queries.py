@@ -1,5 +1,10 @@
+from costs import lot_cost, supplier_spending
+from expiry import expiry_calendar
+from query_cache import query_cache
+from render import render_table
+
 def manufacturers_not_supplied_by(cursor):    
-    cursor.execute("""
+    results = query_cache.fetchall(cursor, """
     SELECT m.M_ID, m.M_Name
     FROM Manufacturer m
     WHERE m.M_ID NOT IN (
@@ -13,15 +18,13 @@ def manufacturers_not_supplied_by(cursor):
     )
     ORDER BY m.M_ID;
     """)
-    
-    results = cursor.fetchall()
+
     
     print(f"\nManufacturers not supplied by supplier 21:")
-    for mid, mname in results:
-        print(f"  - {mid}: {mname}")
+    render_table(results, ["M_ID", "Manufacturer"])
 
 def conflicting_ingredients_for_batch(cursor):    
-    cursor.execute("""
+    results = query_cache.fetchall(cursor, """
     WITH batch_ingredients AS (
         SELECT i.I_ID
         FROM ProductIngredientBatch pib
@@ -36,59 +39,28 @@ def conflicting_ingredients_for_batch(cursor):
         OR (i.I_ID = d.I_ID2 AND d.I_ID1 IN (SELECT I_ID FROM batch_ingredients));
     """)
     
-    results = cursor.fetchall()
     print(f"\nIngredients that cannot be included in batch 100-MFG001-B0901:")
-    for (name,) in results:
-        print(f"  - {name}")
+    render_table(results, ["Ingredient"])
 
-def product_unit_cost(cursor):    
-    cursor.execute("""
-    SELECT 
-        pb.Product_Lot_Number,
-        pb.Quantity AS Produced_Units,
-        SUM(pib.Quantity_Used * ib.Cost) AS Total_Cost,
-        (SUM(pib.Quantity_Used * ib.Cost) / pb.Quantity) AS Unit_Cost
-    FROM ProductBatch pb
-    JOIN ProductIngredientBatch pib
-        ON pb.Product_Lot_Number = pib.Product_Lot_Number
-    JOIN IngredientBatch ib
-        ON pib.Ingredient_Lot_Number = ib.Ingredient_Lot_Number
-    WHERE pb.Product_Lot_Number = '100-MFG001-B0901'
-    GROUP BY pb.Product_Lot_Number, pb.Quantity;
-    """)
-    
-    result = cursor.fetchone()
-    lot, produced, total_cost, unit_cost = result
+def product_unit_cost(cursor, lot="100-MFG001-B0901"):
+    result = lot_cost(cursor, lot)
+    if result is None:
+        print(f"\nNo cost recorded for batch {lot}.")
+        return
+    lot, _, _, _, produced, total_cost, unit_cost = result
     print(f"\nBatch: {lot}")
     print(f"Produced Units: {produced}")
     print(f"Total Cost: ${total_cost:.2f}")
     print(f"Unit Cost: ${unit_cost:.2f}")
 
-def manufacturer_supplier_spending(cursor):
-    cursor.execute("""
-    SELECT 
-        s.S_Name,
-        SUM(pib.Quantity_Used * ib.Cost) AS Total_Spent
-    FROM ProductBatch pb
-    JOIN ProductIngredientBatch pib 
-        ON pb.Product_Lot_Number = pib.Product_Lot_Number
-    JOIN IngredientBatch ib 
-        ON pib.Ingredient_Lot_Number = ib.Ingredient_Lot_Number
-    JOIN Supplier s 
-        ON ib.S_ID = s.S_ID
-    WHERE pb.M_ID = 'MFG002'
-    GROUP BY s.S_ID, s.S_Name
-    ORDER BY Total_Spent DESC;
-    """)
-    
-    results = cursor.fetchall()
-    print(f"\nSuppliers for manufacturer MFG002:")
-    for supplier, total in results:
-        print(f"  - {supplier}: ${total:.2f}")
+def manufacturer_supplier_spending(cursor, mid="MFG002"):
+    results = supplier_spending(cursor, mid)
+    print(f"\nSuppliers for manufacturer {mid}:")
+    render_table(((supplier, f"${total:.2f}") for supplier, total in results), ["Supplier", "Total Spent"])
 
 
 def last_batch_ingredients(cursor):
-    cursor.execute("""
+    results = query_cache.fetchall(cursor, """
         SELECT i.I_Name, ib.Ingredient_Lot_Number, pb.Product_Lot_Number
         FROM ProductBatch pb
         JOIN ProductIngredientBatch pib ON pb.Product_Lot_Number = pib.Product_Lot_Number
@@ -102,11 +74,24 @@ def last_batch_ingredients(cursor):
           )
     """)
 
-    results = cursor.fetchall()
-
     # Extract product lot number from the first row
     product_lot = results[0][2]
 
     print(f"\nIngredients used in the last batch of product ID 100 (Product Lot: {product_lot}):")
-    for name, ingredient_lot, _ in results:
-        print(f"  - {name} (Ingredient Lot: {ingredient_lot})")
\ No newline at end of file
+    render_table(((name, ingredient_lot) for name, ingredient_lot, _ in results), ["Ingredient", "Ingredient Lot"])
+
+def expiring_soon(cursor):
+    days = int(input("Horizon in days (default 10): ").strip() or 10)
+    # Already-expired lots included, like the manufacturer's almost-expired report.
+    rows = expiry_calendar.ensure_loaded(cursor).expiring(days, include_expired=True)
+    print(f"\nLots expiring within {days} days (including lots already expired):")
+    render_table(
+        ((exp, kind.replace("_", " "), lotno, owner, qty) for exp, kind, lotno, owner, qty in rows),
+        ["Expires", "Kind", "Lot#", "Held By", "Qty"], empty="None."
+    )
+
+def cache_statistics(cursor):
+    stats = query_cache.stats()
+    print(f"\nQuery cache: {stats['entries']} entries, {stats['bytes'] / 1024:.1f} KiB")
+    print(f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {stats['hit_rate']:.0%}")
+    print(f"Evictions: {stats['evictions']}  Invalidations: {stats['invalidations']}")
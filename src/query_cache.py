@@ -0,0 +1,149 @@
+"""
+Result cache for the read-only queries and reports.
+
+Entries are keyed by statement and parameters and tagged with the tables
+the statement reads (FROM/JOIN targets unless given explicitly). The cache
+is LRU with a limit on both entries and estimated memory. Role actions
+call invalidate() with the tables they wrote after each commit, which
+drops only the entries reading those tables, including tables the schema
+triggers change as a side effect. max_age bounds how long an entry can
+miss writes made by other processes.
+"""
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)", re.IGNORECASE)
+
+# Tables a write also changes through triggers (one hop; invalidate() follows chains).
+TRIGGER_EFFECTS = {
+    "Ingredient": {"AtomicIngredient", "CompoundIngredient"},
+    "Inventory": {"IngredientBatch"},
+    "ProductIngredientBatch": {"Inventory", "ProductLotCost", "ProductLotSupplierCost"},
+    "ProductBatch": {"RecipeConflictCache", "ProductLotCost", "HealthRiskLog", "ProductStockMovement"},
+    "Recipe": {"ProductBOMFreshness"},
+    "RecipeUsesIngredient": {"RecipeConflictCache", "ProductBOMFreshness"},
+    "DoNotCombine": {"RecipeConflictCache"},
+    "Formulation": {"RecipeConflictCache", "ProductBOMFreshness"},
+    "FormulationIngredient": {"RecipeConflictCache", "ProductBOMFreshness"},
+}
+
+
+def tables_in(sql):
+    return frozenset(_TABLE_REF.findall(sql))
+
+
+def _size(rows):
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(cell) for cell in row)
+    return size
+
+
+class QueryCache:
+    def __init__(self, max_entries=512, max_bytes=16 * 1024 * 1024, max_age=30.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (rows, size, tables, stored_at)
+        self._by_table = {}             # table -> set of keys
+        self._generation = {}           # table -> invalidation count
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def fetchall(self, cursor, sql, args=None, tables=None):
+        """cursor.execute(sql, args).fetchall(), served from the cache when possible."""
+        key = (sql, tuple(args) if args is not None else None)
+        tables = tables_in(sql) if tables is None else frozenset(tables)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[3] <= self.max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generations = [self._generation.get(t, 0) for t in tables]
+
+        cursor.execute(sql, args)
+        rows = tuple(cursor.fetchall())
+
+        with self._lock:
+            # Skip storing if one of the tables was written while we ran.
+            if generations == [self._generation.get(t, 0) for t in tables]:
+                self._store(key, rows, tables)
+        return rows
+
+    def fetchone(self, cursor, sql, args=None, tables=None):
+        rows = self.fetchall(cursor, sql, args, tables)
+        return rows[0] if rows else None
+
+    def _store(self, key, rows, tables):
+        size = _size(rows)
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        self._entries[key] = (rows, size, tables, time.monotonic())
+        self.bytes += size
+        for table in tables:
+            self._by_table.setdefault(table, set()).add(key)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry[1]
+        for table in entry[2]:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+        return True
+
+    def invalidate(self, *tables):
+        """Drops every entry that reads one of the written tables or a table their triggers change."""
+        pending = list(tables)
+        seen = set()
+        with self._lock:
+            while pending:
+                table = pending.pop()
+                if table in seen:
+                    continue
+                seen.add(table)
+                pending.extend(TRIGGER_EFFECTS.get(table, ()))
+                self._generation[table] = self._generation.get(table, 0) + 1
+                for key in list(self._by_table.get(table, ())):
+                    if self._drop(key):
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Writers invalidate the tables they touched after their commit; a failed
+# write changed nothing, so it invalidates nothing.
+query_cache = QueryCache()
@@ -0,0 +1,123 @@
+"""
+Streaming table rendering and export.
+
+Rows can come from any iterable: a list, a generator or an unbuffered
+cursor (see stream_rows). Each cell is converted to text once, and rows
+are printed or written as they arrive. Column widths come from the widths
+the caller declares, or from the first SAMPLE_ROWS rows. Only that sample
+is ever held in memory. A later cell wider than its column is printed in
+full and pushes the rest of its line over rather than being cut.
+"""
+import os
+import csv
+import json
+from itertools import chain
+
+from backend import streaming_cursor
+
+# Rows buffered to size columns that have no declared width.
+SAMPLE_ROWS = 200
+
+EXPORT_FORMATS = (".csv", ".jsonl")
+
+
+def stream_rows(cursor, sql, args=None):
+    """Runs sql on an unbuffered cursor beside `cursor` and yields its rows, closing it when done."""
+    rows = streaming_cursor(cursor.connection)
+    try:
+        rows.execute(sql, args)
+        yield from rows
+    finally:
+        rows.close()
+
+
+def _text(cell):
+    return "" if cell is None else str(cell)
+
+
+def table_lines(rows, headers, widths=None, sample=SAMPLE_ROWS):
+    """Yields the header, its rule, then one line per row. Yields nothing for no rows."""
+    rows = iter(rows)
+    buffered = []
+    if widths is None or None in widths:
+        for row in rows:
+            buffered.append([_text(cell) for cell in row])
+            if len(buffered) >= sample:
+                break
+    if not buffered and widths is None:
+        return
+    sizes = [len(h) for h in headers]
+    for i in range(len(headers)):
+        if widths is not None and widths[i] is not None:
+            sizes[i] = max(sizes[i], widths[i])
+        else:
+            sizes[i] = max([sizes[i]] + [len(row[i]) for row in buffered])
+
+    started = False
+    for row in chain(buffered, ([_text(cell) for cell in row] for row in rows)):
+        if not started:
+            header = " | ".join(h.ljust(sizes[i]) for i, h in enumerate(headers))
+            yield header
+            yield "-" * len(header)
+            started = True
+        yield " | ".join(cell.ljust(sizes[i]) for i, cell in enumerate(row)).rstrip()
+
+
+def page_lines(lines, page_size=None):
+    """Prints lines, pausing after every page_size lines. Returns the number printed."""
+    count = 0
+    for line in lines:
+        print(line)
+        count += 1
+        if page_size and count % page_size == 0:
+            if input("-- Enter for more, q to stop -- ").strip().lower() == "q":
+                break
+    return count
+
+
+def render_table(rows, headers, widths=None, page_size=None, empty="No results."):
+    """Prints rows as an aligned table, paging if page_size is set. Returns the number of lines printed."""
+    count = page_lines(table_lines(rows, headers, widths), page_size)
+    if not count and empty:
+        print(empty)
+    return count
+
+
+def export_lines(lines, path):
+    count = 0
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(line + "\n")
+            count += 1
+    return count
+
+
+def export_rows(rows, headers, path):
+    """Writes rows to a .csv or .jsonl file as they arrive. Returns the row count."""
+    ext = os.path.splitext(path)[1]
+    if ext not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{ext}' (use .csv or .jsonl)")
+    count = 0
+    with open(path, "w", newline="") as f:
+        if ext == ".csv":
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(headers, row)), default=str) + "\n")
+                count += 1
+    return count
+
+
+def show_rows(rows, headers, widths=None, page_size=20):
+    """Asks whether to print all rows, page through them or export them, then does it."""
+    mode = input("Show [a]ll, [p]aged, or [e]xport to file (.csv or .jsonl)? ").strip().lower()
+    if mode == "e":
+        path = input("Export file name: ").strip()
+        count = export_rows(rows, headers, path)
+        print(f"✅ Wrote {count} rows to {path}")
+        return count
+    return render_table(rows, headers, widths, page_size if mode == "p" else None)
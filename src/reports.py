@@ -0,0 +1,162 @@
+"""
+Manufacturer report queries and a concurrent report runner.
+
+Each report is a fetch function returning rows. run_reports runs a list of
+(manufacturer, report) jobs on separate pooled connections and hands each
+result to a render callback as soon as it completes, with its timing, so
+the slowest query no longer holds up the others. The same runner sweeps
+every manufacturer at once.
+
+Usage:
+    python src/reports.py --backend sqlite --db pmim.db --results reports.jsonl
+    python src/reports.py --manufacturer MFG001 --manufacturer MFG002
+"""
+import sys
+import json
+import time
+import argparse
+from datetime import date, timedelta
+from collections import namedtuple
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from backend import add_backend_arguments, create_backend, load_config
+from flat_bom import BOM_HEADERS, manufacturer_bom_rows
+from migrations import bootstrap
+from pool import ConnectionPool
+from query_cache import query_cache
+from render import stream_rows
+from stock import products_below_batch_size
+
+
+ON_HAND_QUERY = "SELECT Ingredient_Lot_Number, Quantity, Expiration_Date FROM Inventory WHERE M_ID=%s"
+
+# A plain range on Expiration_Date can use idx_inventory_mfg_expiry.
+ALMOST_EXPIRED_QUERY = """
+    SELECT Ingredient_Lot_Number, Quantity, Expiration_Date
+    FROM Inventory
+    WHERE M_ID=%s AND Expiration_Date <= %s
+"""
+
+
+def fetch_on_hand(cursor, mid):
+    return query_cache.fetchall(cursor, ON_HAND_QUERY, (mid,))
+
+
+def stream_on_hand(cursor, mid):
+    return stream_rows(cursor, ON_HAND_QUERY, (mid,))
+
+
+def fetch_nearly_oos(cursor, mid):
+    # Snapshot plus recent movements from the stock ledger, one row per product.
+    return products_below_batch_size(cursor, mid)
+
+
+def fetch_almost_expired(cursor, mid, days=10):
+    return query_cache.fetchall(cursor, ALMOST_EXPIRED_QUERY, (mid, date.today() + timedelta(days=days)))
+
+
+def stream_almost_expired(cursor, mid, days=10):
+    return stream_rows(cursor, ALMOST_EXPIRED_QUERY, (mid, date.today() + timedelta(days=days)))
+
+
+# fetch returns the rows (cached); stream yields them from an unbuffered
+# cursor for reports too large to hold. widths are declared column widths
+# for the renderer; None sizes a column from the first rows.
+Report = namedtuple("Report", "name title fetch stream headers widths")
+ReportJob = namedtuple("ReportJob", "mid report")
+
+LOT_WIDTHS = [20, 8, 10]
+
+REPORTS = [
+    Report("on_hand", "On Hand Inventory", fetch_on_hand, stream_on_hand,
+           ["Lot#", "Qty", "Expires"], LOT_WIDTHS),
+    Report("nearly_oos", "Nearly Out Of Stock Products", fetch_nearly_oos, fetch_nearly_oos,
+           ["Product ID", "Name", "OnHand", "StdBatchSize"], None),
+    Report("almost_expired", "Inventory Expiring Soon (<10 days)", fetch_almost_expired, stream_almost_expired,
+           ["Lot#", "Qty", "Expires"], LOT_WIDTHS),
+]
+
+# Browsable on its own rather than part of every report sweep: reading it
+# refreshes the stale products' rows first.
+BOM_REPORT = Report("bom", "Flattened BOM (per standard batch, all recipe versions)", manufacturer_bom_rows,
+                    manufacturer_bom_rows, BOM_HEADERS, None)
+
+
+def report_jobs(mids, reports=REPORTS):
+    return [ReportJob(mid, report) for mid in mids for report in reports]
+
+
+def run_reports(pool, jobs, render, workers=None):
+    """
+    Runs every job on its own pooled connection and calls
+    render(job, rows, elapsed, error) in completion order; error is None on
+    success. Returns the wall-clock time for all jobs.
+    """
+    workers = min(workers or len(jobs), pool.size)
+    if not pool.backend.concurrent:
+        workers = 1
+
+    def run(job):
+        start = time.perf_counter()
+        with pool.cursor() as (_, cursor):
+            rows = job.report.fetch(cursor, job.mid)
+        return rows, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(run, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                rows, elapsed = future.result()
+                render(futures[future], rows, elapsed, None)
+            except Exception as e:
+                render(futures[future], None, 0.0, e)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Run the manufacturer reports for many manufacturers at once")
+    add_backend_arguments(parser, config, pool=True)
+    parser.add_argument("--manufacturer", action="append", default=[],
+                        help="M_ID to report on (repeatable; default: every manufacturer)")
+    parser.add_argument("--results", default=None, help="JSONL result file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    with create_backend(args.backend, config, args.db) as backend:
+        pool = ConnectionPool(backend, size=args.pool_size)
+        # Keep stdout clean for the JSONL results.
+        with pool.cursor() as (_, cursor), redirect_stdout(sys.stderr):
+            bootstrap(backend, cursor)
+            cursor.execute("SELECT M_ID FROM Manufacturer ORDER BY M_ID")
+            mids = args.manufacturer or [row[0] for row in cursor.fetchall()]
+
+        out = open(args.results, "w") if args.results else sys.stdout
+        errors = 0
+
+        def render(job, rows, elapsed, error):
+            nonlocal errors
+            result = {"M_ID": job.mid, "report": job.report.name, "elapsed_ms": round(elapsed * 1000, 2)}
+            if error is None:
+                result["rows"] = [dict(zip(job.report.headers, row)) for row in rows]
+            else:
+                result["error"] = str(error)
+                errors += 1
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+
+        jobs = report_jobs(mids)
+        try:
+            elapsed = run_reports(pool, jobs, render)
+        finally:
+            if args.results:
+                out.close()
+            pool.close()
+
+    print(f"✅ {len(jobs)} reports for {len(mids)} manufacturers in {elapsed:.2f}s", file=sys.stderr)
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Product stock ledger (migration 005).
+
+ProductStockMovement is append-only: a batch adds a 'produced' movement
+through a trigger, and shipments, write-offs and adjustments are recorded
+here with a signed quantity. ProductStockSnapshot keeps one balance per
+product as of a movement id, so a product's on-hand is its snapshot plus
+the few movements after it, read through an index instead of summing every
+batch ever made. take_snapshot rolls the snapshots forward and is meant to
+run periodically (cron, or after a busy shift).
+
+Usage:
+    python src/stock.py --backend sqlite --db pmim.db --snapshot
+    python src/stock.py --rebuild
+"""
+import sys
+import argparse
+
+from backend import add_backend_arguments, create_backend, load_config
+from expiry import expiry_calendar
+from migrations import bootstrap
+from query_cache import query_cache
+
+MOVEMENT_TYPES = ("produced", "shipped", "written_off", "adjusted")
+
+# Sign applied to the quantity entered for each manual movement type;
+# adjustments are entered already signed.
+_SIGNS = {"shipped": -1, "written_off": -1, "adjusted": 1}
+
+_PENDING = """
+    FROM ProductStockMovement mv
+    LEFT JOIN ProductStockSnapshot s ON s.P_ID = mv.P_ID
+    WHERE mv.Movement_ID > COALESCE(s.Last_Movement_ID, 0)
+"""
+
+_BALANCES = """
+    SELECT p.P_ID, p.P_Name, COALESCE(s.On_Hand, 0) + COALESCE(SUM(mv.Quantity), 0) AS OnHand,
+           p.Standard_Batch_Size
+    FROM Product p
+    LEFT JOIN ProductStockSnapshot s ON s.P_ID = p.P_ID
+    LEFT JOIN ProductStockMovement mv
+        ON mv.P_ID = p.P_ID AND mv.Movement_ID > COALESCE(s.Last_Movement_ID, 0)
+    WHERE p.M_ID = %s
+    GROUP BY p.P_ID, p.P_Name, p.Standard_Batch_Size, s.On_Hand
+"""
+
+
+def product_balances(cursor, mid):
+    """[(P_ID, P_Name, on hand, standard batch size)] for a manufacturer's products."""
+    return query_cache.fetchall(cursor, _BALANCES + " ORDER BY p.P_ID", (mid,))
+
+
+def products_below_batch_size(cursor, mid):
+    """product_balances rows whose on-hand is below one standard batch."""
+    return query_cache.fetchall(cursor, _BALANCES + " HAVING OnHand < p.Standard_Batch_Size ORDER BY p.P_ID", (mid,))
+
+
+def lot_balance(cursor, lot):
+    cursor.execute(
+        "SELECT COALESCE(SUM(Quantity), 0) FROM ProductStockMovement WHERE Product_Lot_Number = %s", (lot,)
+    )
+    return int(cursor.fetchone()[0])
+
+
+def lot_movements(cursor, lot):
+    """[(Movement_ID, type, quantity, moved at, note)] for one product lot, oldest first."""
+    return query_cache.fetchall(cursor, """
+        SELECT Movement_ID, Movement_Type, Quantity, Moved_At, Note
+        FROM ProductStockMovement WHERE Product_Lot_Number = %s ORDER BY Movement_ID
+    """, (lot,))
+
+
+def record_movement(conn, cursor, mid, lot, movement_type, quantity, note=None):
+    """
+    Appends a shipped, written_off or adjusted movement for one of mid's
+    product lots and returns the lot's new balance. Shipments and
+    write-offs take a positive quantity; adjustments are signed. Raises
+    ValueError if the lot is unknown or the movement would take it below zero.
+    """
+    if movement_type not in _SIGNS:
+        raise ValueError(f"movement type must be one of {', '.join(_SIGNS)}")
+    delta = _SIGNS[movement_type] * int(quantity)
+    if delta == 0 or (movement_type != "adjusted" and delta > 0):
+        raise ValueError("quantity must be positive")
+
+    cursor.execute("SELECT P_ID FROM ProductBatch WHERE Product_Lot_Number = %s AND M_ID = %s", (lot, mid))
+    if cursor.fetchone() is None:
+        raise ValueError(f"no product lot {lot} for manufacturer {mid}")
+
+    conn.begin()
+    try:
+        # The balance check and the append are one statement, so two
+        # concurrent shipments cannot both pass the check.
+        cursor.execute("""
+            INSERT INTO ProductStockMovement (Product_Lot_Number, P_ID, M_ID, Movement_Type, Quantity, Note)
+            SELECT pb.Product_Lot_Number, pb.P_ID, pb.M_ID, %s, %s, %s
+            FROM ProductBatch pb
+            WHERE pb.Product_Lot_Number = %s
+              AND (SELECT COALESCE(SUM(mv.Quantity), 0) FROM ProductStockMovement mv
+                   WHERE mv.Product_Lot_Number = %s) + %s >= 0
+        """, (movement_type, delta, note, lot, lot, delta))
+        if cursor.rowcount == 0:
+            raise ValueError(f"lot {lot} has only {lot_balance(cursor, lot)} units on hand")
+        balance = lot_balance(cursor, lot)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    expiry_calendar.record_product_movement(lot, delta)
+    query_cache.invalidate("ProductStockMovement")
+    return balance
+
+
+def take_snapshot(conn, cursor, rebuild=False):
+    """
+    Folds the movements after each product's snapshot into a new snapshot.
+    Only products with new movements are rewritten. rebuild recomputes every
+    snapshot from the full history. Returns the number of products updated.
+    """
+    conn.begin()
+    try:
+        if rebuild:
+            cursor.execute("DELETE FROM ProductStockSnapshot")
+        cursor.execute("SELECT COUNT(DISTINCT mv.P_ID)" + _PENDING)
+        products = cursor.fetchone()[0]
+        # On MySQL the INSERT ... SELECT reads the movements with shared
+        # locks, so it waits for any movement still being committed instead
+        # of skipping past its id.
+        cursor.execute(f"""
+            REPLACE INTO ProductStockSnapshot (P_ID, On_Hand, Last_Movement_ID, Taken_At)
+            SELECT mv.P_ID, COALESCE(s.On_Hand, 0) + SUM(mv.Quantity), MAX(mv.Movement_ID), NOW()
+            {_PENDING}
+            GROUP BY mv.P_ID, s.On_Hand
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    query_cache.invalidate("ProductStockSnapshot")
+    return products
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Maintain the product stock ledger snapshots")
+    add_backend_arguments(parser, config)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--snapshot", action="store_true", help="roll product balances forward to the latest movement")
+    group.add_argument("--rebuild", action="store_true", help="recompute every balance from the full movement history")
+    args = parser.parse_args(argv)
+
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            bootstrap(backend, cursor)
+            products = take_snapshot(conn, cursor, rebuild=args.rebuild)
+            print(f"✅ Stock snapshot updated for {products} products.")
+        finally:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
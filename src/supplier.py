@@ -1,3 +1,11 @@
+from bom import bom_engine
+from expiry import expiry_calendar
+from formulation_index import formulation_index
+from lineage import lineage_index
+from lot_index import as_date, fefo_index
+from query_cache import query_cache
+from render import render_table, stream_rows
+
 def declare_ingredient_supplied(conn, cursor, sid):
     print("=== Declare Ingredient Supplied ===")
     try:
@@ -25,6 +33,8 @@ def declare_ingredient_supplied(conn, cursor, sid):
             (sid, iid)
         )
         conn.commit()
+        bom_engine.invalidate()
+        query_cache.invalidate("Ingredient", "SupplierSuppliesIngredient")
 
         print(f"Ingredient '{name}' now associated with supplier {sid} under ID {iid}.")
 
@@ -60,36 +70,26 @@ def maintain_formulations(conn, cursor, sid):
         ci_id = compounds[int(choice)-1][0]
         comp_name = compounds[int(choice)-1][1]
 
-        cursor.execute("""
-            SELECT F_ID, Version_No, Eff_Start_Date, Eff_End_Date, Unit_Price, Pack_Size
-            FROM Formulation
-            WHERE S_ID=%s AND CI_ID=%s
-            ORDER BY Version_No DESC
-        """, (sid, ci_id))
-
-        existing_forms = cursor.fetchall()
-
-        if existing_forms:
-            print(f"\nExisting Formulations for '{comp_name}':")
-            print("F_ID | Version | Start      | End        | Price | Pack Size")
-            print("-----+---------+------------+------------+-------+-------------")
-            for f in existing_forms:
-                print(f"{f[0]:>4} | {f[1]:>7} | {str(f[2]):<10} | {str(f[3]):<10} | {f[4]:>5} | {f[5]:>9}")
-        else:
-            print(f"\nNo existing formulations found for '{comp_name}'.")
-
-        cursor.execute("""
-            SELECT MAX(Version_No)
-            FROM Formulation
-            WHERE S_ID=%s AND CI_ID=%s
-        """, (sid, ci_id))
-        max_ver_row = cursor.fetchone()
-        max_version = max_ver_row[0] if max_ver_row and max_ver_row[0] is not None else 0
+        index = formulation_index.ensure_loaded(cursor)
+        existing_forms = [(f.F_ID, f.Version_No, f.start, f.end, f.Unit_Price, f.Pack_Size)
+                          for f in index.versions(ci_id, sid)]
 
+        print(f"\nExisting Formulations for '{comp_name}':")
+        render_table(existing_forms, ["F_ID", "Version", "Start", "End", "Price", "Pack Size"],
+                     [4, 7, 10, 10, 5, 9], empty=f"No existing formulations found for '{comp_name}'.")
 
-        version = max_version + 1
+        # Version_No is unique per compound across all suppliers.
+        version = index.next_version(ci_id)
         start_date = input("Enter Effective Start Date (YYYY-MM-DD). Must not overlap with existing formulation: ").strip()
         end_date = input("Enter Effective End Date (YYYY-MM-DD). Must not overlap with existing formulation: ").strip()
+        if as_date(end_date) < as_date(start_date):
+            print("Effective End Date must not be before the Start Date.")
+            return
+        clash = index.overlapping(ci_id, sid, start_date, end_date)
+        if clash is not None:
+            print(f"Dates overlap formulation F_ID {clash.F_ID} (version {clash.Version_No}, "
+                  f"{clash.start} to {clash.end}).")
+            return
         price = input("Enter Unit Price: ").strip()
         pack_size = input("Enter Pack Size (oz): ").strip()
         
@@ -135,11 +135,36 @@ def maintain_formulations(conn, cursor, sid):
                 print(f"    Error linking atomic ingredient: {inner_e}")
 
         conn.commit()
+        formulation_index.record_formulation(fid, ci_id, sid, version, start_date, end_date, price, pack_size)
+        bom_engine.invalidate()
+        lineage_index.reset()
+        query_cache.invalidate("Formulation", "FormulationIngredient")
         print("Formulation processing complete.")
 
     except Exception as e:
+        formulation_index.reset()
         print(f"Error in maintaining formulation: {e}")
 
+def add_ingredient_batch(conn, cursor, sid, iid, bid, qty, cost, expdate):
+    """Creates an ingredient batch without prompting. Returns its lot number."""
+    lot = f"{iid}-{sid}-{bid}"
+    conn.begin()
+    try:
+        cursor.execute(
+            "INSERT INTO IngredientBatch (I_ID, S_ID, Batch_ID, Quantity, Cost, Expiration_Date) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            (iid, sid, bid, qty, cost, expdate)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    fefo_index.record_new_batch(iid, sid, lot, qty, expdate)
+    lineage_index.record_new_batch(iid, sid, lot)
+    expiry_calendar.record_new_batch(sid, lot, qty, expdate)
+    query_cache.invalidate("IngredientBatch")
+    return lot
+
 def create_ingredient_batch(conn, cursor, sid):
     """Create ingredient batch - lot number is auto-generated"""
     print("=== Create Ingredient Batch ===")
@@ -164,19 +189,18 @@ def create_ingredient_batch(conn, cursor, sid):
         qty = input("Enter Quantity: ").strip()
         cost = input("Enter Cost: ").strip()
         expdate = input("Enter Expiration Date (YYYY-MM-DD, must be 90+ days from today): ").strip()
-        cursor.execute(
-            "INSERT INTO IngredientBatch (I_ID, S_ID, Batch_ID, Quantity, Cost, Expiration_Date) "
-            "VALUES (%s, %s, %s, %s, %s, %s)",
-            (iid, sid, bid, qty, cost, expdate)
-        )
-        print(f"Ingredient batch created. Lot Number: {iid}-{sid}-{bid}")
-        conn.commit()
+        lot = add_ingredient_batch(conn, cursor, sid, iid, bid, int(qty), cost, expdate)
+        print(f"Ingredient batch created. Lot Number: {lot}")
     except Exception as e:
         print(f"Error in creating ingredient batch: {e}")
 
 def view_active_formulations(conn, cursor, sid):
     print("\n=== Current Active Formulations ===")
     print(f"Supplier ID: {sid}\n")
+    as_of = input("As of date (YYYY-MM-DD, blank for today): ").strip()
+    if as_of:
+        view_formulations_as_of(cursor, sid, as_of)
+        return
     query = """
         SELECT Supplier_Name, Compound_Ingredient_Name, Ingredients, Unit_Price, Pack_Size, Version
         FROM ActiveSupplierFormulationsView
@@ -185,25 +209,37 @@ def view_active_formulations(conn, cursor, sid):
         )
         ORDER BY Compound_Ingredient_Name;
     """
-    cursor.execute(query, (sid,))
-    
-    rows = cursor.fetchall()
-    if not rows:
-        print(f"No active formulations found for supplier ID {sid}.")
-        return
-    
-    # Calculate max widths for neat printing
     headers = ["Supplier Name", "Compound Ingredient", "Ingredients", "Unit Price", "Pack Size", "Version"]
-    col_widths = [len(h) for h in headers]
-    
-    for row in rows:
-        for i, val in enumerate(row):
-            col_widths[i] = max(col_widths[i], len(str(val)))
-    
-    # Print header
-    print(" | ".join(headers[i].ljust(col_widths[i]) for i in range(len(headers))))
-    print("-+-".join("-" * w for w in col_widths))
-    
-    # Print rows
-    for row in rows:
-        print(" | ".join(str(val).ljust(col_widths[i]) for i, val in enumerate(row)))
\ No newline at end of file
+    # Streamed; the Ingredients column is sized from the first rows.
+    render_table(stream_rows(cursor, query, (sid,)), headers,
+                 empty=f"No active formulations found for supplier ID {sid}.")
+
+
+def view_formulations_as_of(cursor, sid, as_of):
+    """The supplier's formulations in effect on any date, past or future, found through formulation_index."""
+    try:
+        found = formulation_index.ensure_loaded(cursor).active_for(sid, as_of)
+        if not found:
+            print(f"No formulations in effect on {as_of} for supplier ID {sid}.")
+            return
+        cursor.execute("""
+            SELECT f.F_ID, ci.I_Name, ai.I_Name, fi.Quantity
+            FROM Formulation f
+            JOIN Ingredient ci ON ci.I_ID = f.CI_ID
+            LEFT JOIN FormulationIngredient fi ON fi.F_ID = f.F_ID
+            LEFT JOIN Ingredient ai ON ai.I_ID = fi.AI_ID
+            WHERE f.F_ID IN %s
+        """, (tuple(f.F_ID for f in found),))
+        names, ingredients = {}, {}
+        for fid, compound, atomic, qty in cursor.fetchall():
+            names[fid] = compound
+            if atomic is not None:
+                ingredients.setdefault(fid, []).append(f"{atomic} ({qty})")
+        rows = sorted(
+            (names.get(f.F_ID, f.CI_ID), ", ".join(ingredients.get(f.F_ID, [])), f.Unit_Price, f.Pack_Size,
+             f.Version_No, f.start, f.end)
+            for f in found
+        )
+        render_table(rows, ["Compound Ingredient", "Ingredients", "Unit Price", "Pack Size", "Version", "Start", "End"])
+    except Exception as e:
+        print(f"Error in viewing formulations as of {as_of}: {e}")
@@ -0,0 +1,157 @@
+"""
+Consumption trigger benchmark.
+
+Builds the same synthetic inventory twice in a scratch database: once with
+the migrations before 006, where the consumption triggers recover the
+manufacturer from the product lot (SUBSTRING_INDEX on MySQL, a ProductBatch
+lookup on SQLite), and once with every migration, where each consumption
+row carries its M_ID and the triggers go straight to the Inventory primary
+key. Then it times the ProductIngredientBatch inserts that fire those
+triggers.
+
+Every run reloads the schema, so only point it at a scratch database.
+
+Usage:
+    python src/trigger_benchmark.py --backend sqlite --lots 2000 --batches 500
+    python src/trigger_benchmark.py --backend mysql --reset
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import date, timedelta
+
+from backend import add_backend_arguments, create_backend, load_config, require_scratch
+from migrations import list_migrations
+
+# Last migration of the "before" schema.
+BEFORE = "005"
+
+
+def load_schema_until(backend, cursor, last=None):
+    """Reloads init.sql and the migrations up to and including `last` (all if None), without seed data."""
+    backend.set_foreign_key_checks(cursor, False)
+    try:
+        backend.load_schema(cursor)
+        for _, path in list_migrations(backend):
+            if last is not None and os.path.basename(path)[:3] > last:
+                break
+            backend.run_script(cursor, path)
+    finally:
+        backend.set_foreign_key_checks(cursor, True)
+
+
+def fill(conn, cursor, manufacturers, ingredients, lots):
+    """Synthetic inventory: every manufacturer holds every ingredient lot."""
+    mids = [f"MFG{m:03d}" for m in range(1, manufacturers + 1)]
+    exp = date.today() + timedelta(days=365)
+    conn.begin()
+    cursor.execute("INSERT INTO Category (Category_ID, Cat_Name) VALUES (1, 'Other')")
+    cursor.execute("INSERT INTO Supplier (S_ID, S_Name) VALUES ('SUP001', 'Bench Supplier')")
+    cursor.executemany("INSERT INTO Manufacturer (M_ID, M_Name) VALUES (%s, %s)", [(mid, mid) for mid in mids])
+    cursor.executemany(
+        "INSERT INTO Ingredient (I_ID, I_Name, I_Type) VALUES (%s, %s, 'Atomic')",
+        [(iid, f"Ingredient {iid}") for iid in range(1, ingredients + 1)]
+    )
+    batches = [(lot % ingredients + 1, f"B{lot:06d}") for lot in range(lots)]
+    cursor.executemany(
+        "INSERT INTO IngredientBatch (I_ID, S_ID, Batch_ID, Quantity, Cost, Expiration_Date) VALUES (%s, 'SUP001', %s, %s, 1.00, %s)",
+        [(iid, bid, 1000 * manufacturers, exp) for iid, bid in batches]
+    )
+    lot_numbers = [f"{iid}-SUP001-{bid}" for iid, bid in batches]
+    cursor.executemany(
+        "INSERT INTO Inventory (Ingredient_Lot_Number, M_ID, Quantity, Expiration_Date) VALUES (%s, %s, 1000, %s)",
+        [(lotno, mid, exp) for mid in mids for lotno in lot_numbers]
+    )
+    cursor.executemany(
+        "INSERT INTO Product (P_ID, P_Name, Category_ID, Standard_Batch_Size, M_ID) VALUES (%s, %s, 1, 10, %s)",
+        [(p, f"Product {p}", mid) for p, mid in enumerate(mids, 1)]
+    )
+    cursor.executemany(
+        "INSERT INTO Recipe (R_ID, P_ID, Creation_Date) VALUES (%s, %s, %s)",
+        [(p, p, date.today()) for p in range(1, len(mids) + 1)]
+    )
+    conn.commit()
+    return mids, lot_numbers
+
+
+def time_consumption(conn, cursor, mids, lot_numbers, batches, lines, keyed):
+    """Per-batch seconds spent inserting `lines` consumption rows, for `batches` product batches."""
+    timings = []
+    for b in range(batches):
+        p = b % len(mids) + 1
+        mid = mids[p - 1]
+        bid = f"T{b:06d}"
+        plot = f"{p}-{mid}-{bid}"
+        picks = [lot_numbers[(b * lines + i) % len(lot_numbers)] for i in range(lines)]
+        conn.begin()
+        cursor.execute(
+            "INSERT INTO ProductBatch (P_ID, M_ID, Batch_ID, R_ID, Quantity, Production_Date, Expiration_Date) VALUES (%s, %s, %s, %s, 10, %s, %s)",
+            (p, mid, bid, p, date.today(), date.today() + timedelta(days=30))
+        )
+        start = time.perf_counter()
+        if keyed:
+            cursor.executemany(
+                "INSERT INTO ProductIngredientBatch (Product_Lot_Number, M_ID, Ingredient_Lot_Number, Quantity_Used) VALUES (%s, %s, %s, 1)",
+                [(plot, mid, lotno) for lotno in picks]
+            )
+        else:
+            cursor.executemany(
+                "INSERT INTO ProductIngredientBatch (Product_Lot_Number, Ingredient_Lot_Number, Quantity_Used) VALUES (%s, %s, 1)",
+                [(plot, lotno) for lotno in picks]
+            )
+        timings.append(time.perf_counter() - start)
+        conn.commit()
+    return timings
+
+
+def summarize(label, timings, lines):
+    timings = sorted(timings)
+    rows = len(timings) * lines
+    total = sum(timings)
+    p50 = timings[len(timings) // 2]
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<28} {rows:>8} rows  {total * 1e6 / rows:>9.1f} us/row  "
+          f"batch p50 {p50 * 1000:.2f} ms  p95 {p95 * 1000:.2f} ms")
+    return total / rows
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Time the consumption triggers before and after structured lot keys")
+    add_backend_arguments(parser, config)
+    parser.add_argument("--manufacturers", type=int, default=4)
+    parser.add_argument("--ingredients", type=int, default=50)
+    parser.add_argument("--lots", type=int, default=2000, help="ingredient lots, each held by every manufacturer")
+    parser.add_argument("--batches", type=int, default=500, help="product batches to produce per run")
+    parser.add_argument("--lines", type=int, default=8, help="consumption rows per batch")
+    parser.add_argument("--reset", action="store_true",
+                        help="allow reloading the configured database (MySQL, or sqlite_path without --db)")
+    args = parser.parse_args(argv)
+
+    require_scratch(parser, args, config, "the benchmark reloads the schema")
+
+    runs = [
+        (f"before (migrations <= {BEFORE})", BEFORE, False),
+        ("after, M_ID supplied", None, True),
+        ("after, M_ID filled by trigger", None, False),
+    ]
+    with create_backend(args.backend, config, args.db) as backend:
+        conn = backend.connect()
+        try:
+            cursor = conn.cursor()
+            results = []
+            for label, last, keyed in runs:
+                load_schema_until(backend, cursor, last)
+                mids, lot_numbers = fill(conn, cursor, args.manufacturers, args.ingredients, args.lots)
+                timings = time_consumption(conn, cursor, mids, lot_numbers, args.batches, args.lines, keyed)
+                results.append(summarize(label, timings, args.lines))
+        finally:
+            conn.close()
+
+    print(f"✅ Keyed consumption rows cost {results[1] / results[0]:.0%} of the parsed-key baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,18 @@
-def get_flattened_ingredients(cursor, product_id):
-    """
-    Returns a set of all ingredient IDs for a given product, including nested ingredients
-    for compound ingredients (1 level deep).
-    """
-    ingredients_set = set()
+from contextlib import closing
 
-    # Get top-level ingredients
-    cursor.execute("""
-        SELECT i.I_ID, i.I_Type
-        FROM Recipe r
-        JOIN RecipeUsesIngredient rui ON rui.R_ID = r.R_ID
-        JOIN Ingredient i ON i.I_ID = rui.I_ID
-        WHERE r.P_ID = %s
-    """, (product_id,))
-    top_ingredients = cursor.fetchall()
+from bom import bom_engine
+from flat_bom import BOM_HEADERS, bom_rows
+from incompatibility import build_matrix, export_pairs
+from render import export_lines, page_lines, show_rows, stream_rows
 
-    for i_id, i_type in top_ingredients:
-        ingredients_set.add(i_id)
 
-        # If compound, get nested ingredients
-        if i_type == 'Compound':
-            cursor.execute("""
-                SELECT fi.AI_ID
-                FROM Formulation f
-                JOIN FormulationIngredient fi ON f.F_ID = fi.F_ID
-                WHERE f.CI_ID = %s
-            """, (i_id,))
-            nested_ids = [row[0] for row in cursor.fetchall()]
-            ingredients_set.update(nested_ids)
-
-    return ingredients_set
+def get_flattened_ingredients(cursor, product_id):
+    """
+    Returns a set of all ingredient IDs for a given product, over every
+    recipe version, including the ingredients of every formulation version
+    of its compounds at any depth.
+    """
+    return bom_engine.ensure_loaded(cursor).product_ingredients(product_id)
 
 
 def compare_products_for_incompatibilities(cursor, product_id1, product_id2):
@@ -37,27 +20,14 @@ def compare_products_for_incompatibilities(cursor, product_id1, product_id2):
     Compares two products for incompatibilities based on DoNotCombine table.
     Prints all offending ingredient pairs.
     """
-    # Flatten ingredients for both products
-    ingredients1 = get_flattened_ingredients(cursor, product_id1)
-    ingredients2 = get_flattened_ingredients(cursor, product_id2)
-
-    combined_ingredients = ingredients1.union(ingredients2)
-
-    # Check for offending pairs in DoNotCombine table
-    cursor.execute("""
-        SELECT d.I_ID1, d.I_ID2, i1.I_Name, i2.I_Name
-        FROM DoNotCombine d
-        JOIN Ingredient i1 ON d.I_ID1 = i1.I_ID
-        JOIN Ingredient i2 ON d.I_ID2 = i2.I_ID
-        WHERE d.I_ID1 IN %s AND d.I_ID2 IN %s
-    """, (tuple(combined_ingredients), tuple(combined_ingredients)))
-
-    conflicts = cursor.fetchall()
+    engine = bom_engine.ensure_loaded(cursor)
+    combined_ingredients = engine.product_ingredients(product_id1) | engine.product_ingredients(product_id2)
+    conflicts = engine.conflicts_within(combined_ingredients)
 
     if conflicts:
         print(f"\nFound {len(conflicts)} incompatibility(ies) between the products:")
-        for i1_id, i2_id, i1_name, i2_name in conflicts:
-            print(f"  - {i1_name} and {i2_name} should not be combined")
+        for i1_id, i2_id in conflicts:
+            print(f"  - {engine.names[i1_id]} and {engine.names[i2_id]} should not be combined")
     else:
         print("\nNo incompatibilities found between the products.")
 
@@ -105,69 +75,119 @@ def compare_products(cursor):
     print("\nChecking for incompatibilities...")
     compare_products_for_incompatibilities(cursor, product1_id, product2_id)
 
-def view_product_ingredient_list(cursor):
-    """
-    Prints products organized by Manufacturer -> Category -> Product
-    and lists nested ingredients (1 level deep) ordered by quantity.
-    """
-    # Query top-level products and ingredients
-    query = """
-    SELECT 
-        m.M_Name, 
-        c.Cat_Name, 
-        p.P_Name,
-        i.I_ID,
-        i.I_Name,
-        rui.Quantity,
-        i.I_Type
-    FROM Product p
-    JOIN Manufacturer m ON p.M_ID = m.M_ID
-    JOIN Category c ON p.Category_ID = c.Category_ID
-    JOIN Recipe r ON r.P_ID = p.P_ID
-    JOIN RecipeUsesIngredient rui ON rui.R_ID = r.R_ID
-    JOIN Ingredient i ON i.I_ID = rui.I_ID
-    ORDER BY m.M_Name, c.Cat_Name, p.P_Name, rui.Quantity DESC;
-    """
-    
-    cursor.execute(query)
-    results = cursor.fetchall()
-    if not results:
-        print("No products found.")
+def view_incompatibility_matrix(cursor):
+    """
+    Checks every pair of products for incompatibilities in one pass and
+    prints the conflicting pairs, optionally exporting them to a file.
+    """
+    matrix = build_matrix(cursor, bom_engine)
+    names = bom_engine.names
+    cursor.execute("SELECT P_ID, P_Name FROM Product")
+    product_names = dict(cursor.fetchall())
+
+    internal = matrix.internal_conflicts()
+    pairs = matrix.conflicting_pairs()
+    print(f"\nChecked {len(matrix.products)} products ({len(matrix.products) * (len(matrix.products) - 1) // 2} pairs).")
+    for pid, ingredient_pairs in internal:
+        offending = ", ".join(f"{names[i1]} + {names[i2]}" for i1, i2 in ingredient_pairs)
+        print(f"  - {product_names[pid]} conflicts with itself: {offending}")
+    if not pairs:
+        print("No incompatibilities found between products.")
         return
+    print(f"Found {len(pairs)} incompatible product pair(s):")
+    for p1, p2, ingredient_pairs in pairs:
+        offending = ", ".join(f"{names[i1]} + {names[i2]}" for i1, i2 in ingredient_pairs)
+        print(f"  - {product_names[p1]} and {product_names[p2]}: {offending}")
 
+    path = input("Export to file (.csv or .jsonl, blank to skip): ").strip()
+    if path:
+        count = export_pairs(pairs, names, path)
+        print(f"✅ Wrote {count} rows to {path}")
+
+def view_flattened_bom(cursor):
+    """
+    Prints the atomic ingredient totals per standard batch for one product
+    or every product, from the materialized ProductBOM table (see
+    src/flat_bom.py). Like the Product Ingredient List, it sums every
+    recipe version of a product.
+    """
+    scope = input("BOM for [o]ne product or [a]ll products? ").strip().lower()
+    pids = None
+    if scope == "o":
+        pid = select_product(cursor)
+        if pid is None:
+            return
+        pids = [pid]
+    print("Quantities per standard batch, summed over every recipe version of each product.")
+    show_rows(bom_rows(cursor, pids), BOM_HEADERS)
+
+# Every product's ingredients over all its recipe versions, summed per
+# ingredient as ProductBOMView does, in display order.
+CATALOG_QUERY = """
+SELECT m.M_Name, c.Cat_Name, p.P_ID, p.P_Name, rui.I_ID, SUM(rui.Quantity) AS Total_Quantity
+FROM Product p
+JOIN Manufacturer m ON p.M_ID = m.M_ID
+JOIN Category c ON p.Category_ID = c.Category_ID
+JOIN Recipe r ON r.P_ID = p.P_ID
+JOIN RecipeUsesIngredient rui ON rui.R_ID = r.R_ID
+GROUP BY m.M_Name, c.Cat_Name, p.P_ID, p.P_Name, rui.I_ID
+ORDER BY m.M_Name, c.Cat_Name, p.P_Name, p.P_ID, Total_Quantity DESC
+"""
+
+
+def ingredient_tree_lines(engine, nodes, depth=0):
+    for i_id, quantity, children in nodes:
+        marker = "*" if depth == 0 else "-"
+        yield f"{'  ' * (depth + 3)}{marker} {engine.names[i_id]} ({quantity})"
+        yield from ingredient_tree_lines(engine, children, depth + 1)
+
+
+def catalog_lines(engine, rows):
+    """
+    Renders catalog rows as they arrive, one output line at a time.
+    Compounds are expanded from the BOM engine, so no query runs per row.
+    """
     current_manufacturer = None
     current_category = None
     current_product = None
 
-    for manufacturer, category, product, i_id, ingredient, quantity, i_type in results:
+    for manufacturer, category, p_id, product, i_id, quantity in rows:
         if manufacturer != current_manufacturer:
             current_manufacturer = manufacturer
-            print(f"\nManufacturer: {manufacturer}")
+            yield f"\nManufacturer: {manufacturer}"
             current_category = None
             current_product = None
 
         if category != current_category:
             current_category = category
-            print(f"  Category: {category}")
+            yield f"  Category: {category}"
             current_product = None
 
-        if product != current_product:
-            current_product = product
-            print(f"    Product: {product}")
-
-        # Print top-level ingredient
-        print(f"      * {ingredient} ({quantity})")
-
-        # If compound, fetch nested ingredients (1 level)
-        if i_type == 'Compound':
-            cursor.execute("""
-                SELECT i.I_Name, fi.quantity
-                FROM Formulation f
-                JOIN FormulationIngredient fi ON f.F_ID = fi.F_ID
-                JOIN Ingredient i ON i.I_ID = fi.AI_ID
-                WHERE f.CI_ID = %s
-                ORDER BY fi.quantity DESC
-            """, (i_id,))
-            nested_ingredients = cursor.fetchall()
-            for nested_name, nested_qty in nested_ingredients:
-                print(f"        - {nested_name} ({nested_qty})")
+        if p_id != current_product:
+            current_product = p_id
+            yield f"    Product: {product}"
+
+        yield from ingredient_tree_lines(engine, [engine.tree(i_id, quantity)])
+
+
+def view_product_ingredient_list(cursor, page_size=20):
+    """
+    Prints products organized by Manufacturer -> Category -> Product and
+    lists their ingredients, summed over every recipe version, with
+    compounds expanded at any depth, ordered by quantity.
+
+    Recipe rows are streamed from an unbuffered cursor and rendered as they
+    arrive, so memory stays bounded by the formulations, not the catalog.
+    """
+    mode = input("Show [a]ll, [p]aged, or [e]xport to file? ").strip().lower()
+    path = input("Export file name: ").strip() if mode == "e" else None
+
+    engine = bom_engine.ensure_loaded(cursor, recipes=False)
+    # Closed explicitly so quitting a page releases the unbuffered cursor at once.
+    with closing(stream_rows(cursor, CATALOG_QUERY)) as rows:
+        lines = catalog_lines(engine, rows)
+        if path:
+            count = export_lines(lines, path)
+            print(f"✅ Wrote {count} lines to {path}")
+        elif not page_lines(lines, page_size if mode == "p" else None):
+            print("No products found.")